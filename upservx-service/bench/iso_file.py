@@ -0,0 +1,107 @@
+"""Benchmark parallel downloads served by FileRangeResponse.
+
+A test file is served by uvicorn once with main.FileRangeResponse and once
+with Starlette's FileResponse, and downloaded by several clients at the same
+time, with curl when it is installed. The wall time and the CPU time of the
+server process are printed for both.
+
+    python bench/iso_file.py [--size MIB] [--clients N]
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+import psutil
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def serve(mode: str, path: str, port: int) -> None:
+    import uvicorn
+    from starlette.applications import Starlette
+    from starlette.responses import FileResponse
+    from starlette.routing import Route
+
+    import main
+
+    async def download(request):
+        if mode == "range":
+            size = os.path.getsize(path)
+            return main.FileRangeResponse(path, 0, size, 200, {"Content-Length": str(size)})
+        return FileResponse(path)
+
+    app = Starlette(routes=[Route("/file", download)])
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
+
+
+async def download(url: str) -> int:
+    if shutil.which("curl"):
+        # curl keeps the client side cheap so the server is what is measured
+        process = await asyncio.create_subprocess_exec(
+            "curl", "-s", "-o", "/dev/null", "-w", "%{size_download}", url, stdout=asyncio.subprocess.PIPE
+        )
+        stdout, _ = await process.communicate()
+        return int(stdout)
+    received = 0
+    async with httpx.AsyncClient(timeout=None) as client:
+        async with client.stream("GET", url) as response:
+            async for chunk in response.aiter_raw(1024 * 1024):
+                received += len(chunk)
+    return received
+
+
+async def run(mode: str, path: str, clients: int) -> tuple[float, float]:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = subprocess.Popen([sys.executable, __file__, "--serve", mode, path, str(port)])
+    try:
+        url = f"http://127.0.0.1:{port}/file"
+        for _ in range(100):
+            try:
+                httpx.head(url)
+                break
+            except httpx.TransportError:
+                time.sleep(0.1)
+        process = psutil.Process(server.pid)
+        cpu = sum(process.cpu_times()[:2])
+        start = time.perf_counter()
+        sizes = await asyncio.gather(*(download(url) for _ in range(clients)))
+        wall = time.perf_counter() - start
+        cpu = sum(process.cpu_times()[:2]) - cpu
+        assert all(size == os.path.getsize(path) for size in sizes)
+        return wall, cpu
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=1024, help="file size in MiB")
+    parser.add_argument("--clients", type=int, default=4, help="parallel downloads")
+    parser.add_argument("--serve", nargs=3, metavar=("MODE", "PATH", "PORT"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve:
+        serve(args.serve[0], args.serve[1], int(args.serve[2]))
+        return
+    with tempfile.NamedTemporaryFile(suffix=".iso") as f:
+        block = os.urandom(1024 * 1024)
+        for _ in range(args.size):
+            f.write(block)
+        f.flush()
+        for mode in ("starlette", "range"):
+            wall, cpu = asyncio.run(run(mode, f.name, args.clients))
+            print(f"{mode:10} wall {wall:6.2f}s  server cpu {cpu:6.2f}s")
+
+
+if __name__ == "__main__":
+    main()
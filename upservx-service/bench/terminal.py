@@ -0,0 +1,74 @@
+"""Benchmark the throughput of the container terminal websocket.
+
+The terminal endpoint is driven through Starlette's test client with the
+container shell replaced by ``cat`` of a test file, so the PTY bridge is all
+that is measured. The number of frames, the time and the rate are printed.
+
+    python bench/terminal.py [--size MB]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from starlette.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+
+
+def bench(path: str) -> tuple[int, int, float]:
+    spawn_pty = main.spawn_pty
+
+    async def spawn_cat(cmd, env):
+        return await spawn_pty(["cat", path], env)
+
+    async def authenticate(websocket):
+        return "bench"
+
+    async def container_type(name):
+        return "docker"
+
+    main.spawn_pty = spawn_cat
+    main.authenticate_websocket = authenticate
+    main.find_container_type = container_type
+    main.shutil.which = lambda name: f"/usr/bin/{name}"
+
+    frames = received = 0
+    client = TestClient(main.app)
+    with client.websocket_connect("/containers/bench/terminal") as websocket:
+        websocket.receive_text()  # session id
+        start = time.perf_counter()
+        try:
+            while True:
+                message = websocket.receive()
+                if message["type"] == "websocket.close":
+                    break
+                data = message.get("bytes")
+                if data:
+                    frames += 1
+                    received += len(data)
+        except WebSocketDisconnect:
+            pass
+        elapsed = time.perf_counter() - start
+    return frames, received, elapsed
+
+
+def run() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=30, help="amount of output in MB")
+    args = parser.parse_args()
+    with tempfile.NamedTemporaryFile("w", suffix=".txt") as f:
+        line = "0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ\n"
+        f.write(line * (args.size * 1000 * 1000 // len(line)))
+        f.flush()
+        frames, received, elapsed = bench(f.name)
+    print(f"{frames} frames, {received / 1e6:.1f} MB in {elapsed:.2f}s, {received / 1e6 / elapsed:.1f} MB/s")
+
+
+if __name__ == "__main__":
+    run()
@@ -1,9 +1,18 @@
-from fastapi import FastAPI, HTTPException, WebSocket, UploadFile, File, Request
-from fastapi.responses import FileResponse, Response
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect, Request
+from fastapi.responses import Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 import base64
+import bisect
+import codecs
+import ctypes
+import email.utils
+import fcntl
+import gzip
+import hashlib
+import hmac
 import pam
 import secrets
+import select
 from pydantic import BaseModel
 import psutil
 import platform
@@ -11,34 +20,351 @@ import subprocess
 import json
 import time
 import os
+import re
+import shlex
 import shutil
+import signal
 import pty
-import urllib.request
+import tempfile
 import urllib.parse
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 from datetime import datetime
+from functools import lru_cache
 from typing import List, Any, Optional
 import pwd
 import grp
 import asyncio
 import socket
+import sqlite3
+import termios
+import struct
+import threading
+import zlib
+import httpx
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart before 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
 
 # Track last network counters for throughput calculation
 _prev_net_io = psutil.net_io_counters()
 _prev_net_time = time.time()
 
 
-def run_subprocess(cmd: list[str]) -> subprocess.CompletedProcess:
-    """Run a subprocess, logging the command and raising HTTPException on failure."""
+# Every external command runs as an asyncio subprocess through run_command so
+# a slow tool never occupies a threadpool worker. Invocations of the same tool
+# share a semaphore; tools that lock the same system files share one group.
+# Read-only subcommands listed in TOOL_READ_COMMANDS take a separate slot so
+# a long running change such as "zpool create" does not stall status reads.
+# Commands run without a timeout unless the caller passes one; queries and
+# quick changes use COMMAND_TIMEOUT, while pool creation, formatting and
+# installs run for as long as they take.
+COMMAND_TIMEOUT = 60.0
+COMMAND_CONCURRENCY = 8
+TOOL_CONCURRENCY = {
+    "virt-install": 2,
+    "qemu-img": 2,
+    "mkfs": 1,
+    "zpool": 1,
+    "passwd": 1,
+}
+TOOL_READ_COMMANDS = {
+    "zpool": {"list", "status", "get", "iostat", "history", "events"},
+}
+TOOL_GROUPS = {
+    "useradd": "passwd",
+    "usermod": "passwd",
+    "userdel": "passwd",
+    "chpasswd": "passwd",
+    "groupadd": "passwd",
+    "groupdel": "passwd",
+    "gpasswd": "passwd",
+}
+
+_command_limits: dict[str, asyncio.Semaphore] = {}
+
+
+def _command_semaphore(cmd: list[str]) -> asyncio.Semaphore:
+    tool = os.path.basename(cmd[0])
+    if tool.startswith("mkfs."):
+        tool = "mkfs"
+    tool = TOOL_GROUPS.get(tool, tool)
+    limit = TOOL_CONCURRENCY.get(tool, COMMAND_CONCURRENCY)
+    if len(cmd) > 1 and cmd[1] in TOOL_READ_COMMANDS.get(tool, ()):
+        tool, limit = f"{tool} (read)", COMMAND_CONCURRENCY
+    semaphore = _command_limits.get(tool)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(limit)
+        _command_limits[tool] = semaphore
+    return semaphore
+
+
+def _kill_process_group(process: asyncio.subprocess.Process) -> None:
+    # Kill the whole group so no child of the command keeps the pipes open
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def _kill_spawned(spawn: asyncio.Future) -> None:
+    if not spawn.cancelled() and spawn.exception() is None:
+        _kill_process_group(spawn.result())
+
+
+async def _communicate(
+    process: asyncio.subprocess.Process, input: str | None, on_output: Any
+) -> tuple[str, str]:
+    if on_output is None:
+        stdout, stderr = await process.communicate(input.encode() if input is not None else None)
+        return stdout.decode(errors="replace"), stderr.decode(errors="replace")
+    if input is not None:
+        process.stdin.write(input.encode())
+        await process.stdin.drain()
+        process.stdin.close()
+
+    async def pump(stream: asyncio.StreamReader, chunks: list[str]) -> None:
+        async for line in stream:
+            text = line.decode(errors="replace")
+            chunks.append(text)
+            on_output(text)
+
+    stdout: list[str] = []
+    stderr: list[str] = []
+    await asyncio.gather(pump(process.stdout, stdout), pump(process.stderr, stderr))
+    await process.wait()
+    return "".join(stdout), "".join(stderr)
+
+
+async def run_command(
+    cmd: list[str],
+    input: str | None = None,
+    timeout: float | None = None,
+    on_output: Any = None,
+) -> subprocess.CompletedProcess:
+    """Run a command without blocking the event loop.
+
+    ``on_output`` is called with every line the command writes to stdout or
+    stderr while it runs. The process is killed when ``timeout`` expires,
+    which raises HTTPException 504, or when the calling task is cancelled.
+    A missing executable yields return code 127 like it would in a shell.
+    """
+    async with _command_semaphore(cmd):
+        spawn = asyncio.ensure_future(
+            asyncio.create_subprocess_exec(
+                *cmd,
+                stdin=asyncio.subprocess.PIPE if input is not None else asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                limit=1024 * 1024,
+                start_new_session=True,
+            )
+        )
+        try:
+            # Cancelling a spawn in progress would leave the process running
+            process = await asyncio.shield(spawn)
+        except OSError as exc:
+            return subprocess.CompletedProcess(cmd, 127, "", str(exc))
+        except asyncio.CancelledError:
+            spawn.add_done_callback(_kill_spawned)
+            raise
+        # The timeout kills the process instead of wrapping the wait in
+        # asyncio.wait_for, which can swallow a cancellation arriving just
+        # as the command finishes.
+        expired = asyncio.Event()
+
+        def expire() -> None:
+            expired.set()
+            _kill_process_group(process)
+
+        timer = asyncio.get_running_loop().call_later(timeout, expire) if timeout is not None else None
+        try:
+            stdout, stderr = await _communicate(process, input, on_output)
+        finally:
+            if timer is not None:
+                timer.cancel()
+            if process.returncode is None:
+                _kill_process_group(process)
+                await process.wait()
+    if expired.is_set():
+        raise HTTPException(
+            status_code=504, detail=f"{' '.join(cmd)}\ntimed out after {timeout:g}s"
+        )
+    return subprocess.CompletedProcess(cmd, process.returncode, stdout, stderr)
+
+
+async def run_subprocess(cmd: list[str], **kwargs: Any) -> subprocess.CompletedProcess:
+    """Run a command, logging it and raising HTTPException on failure."""
     cmd_str = " ".join(cmd)
     print("Running command:", cmd_str)
-    result = subprocess.run(cmd, capture_output=True, text=True)
+    result = await run_command(cmd, **kwargs)
     if result.returncode != 0:
         msg = result.stderr.strip() or result.stdout.strip() or "failed"
         raise HTTPException(status_code=400, detail=f"{cmd_str}\n{msg}")
     return result
 
 
-app = FastAPI()
+# Long-running operations run as background jobs. The endpoints starting them
+# answer immediately with the job, whose progress and log are available from
+# /jobs/{id} and /jobs/{id}/stream. At most JOB_WORKERS jobs run at a time,
+# further jobs wait in state "queued".
+JOB_WORKERS = 4
+JOB_HISTORY_SIZE = 100
+JOB_LOG_SIZE = 500
+
+
+class Job:
+    def __init__(self, kind: str, description: str) -> None:
+        self.id = secrets.token_hex(8)
+        self.kind = kind
+        self.description = description
+        self.status = "queued"
+        self.progress: float | None = None
+        self.message = ""
+        self.log: deque[str] = deque(maxlen=JOB_LOG_SIZE)
+        # Number of log lines written so far, including dropped ones
+        self.log_total = 0
+        self.result: Any = None
+        self.error: str | None = None
+        self.created = time.time()
+        self.finished: float | None = None
+        self.task: asyncio.Task | None = None
+        self._changed = asyncio.Event()
+
+    @property
+    def done(self) -> bool:
+        return self.status in {"succeeded", "failed", "cancelled"}
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def update(self, progress: float | None = None, message: str | None = None) -> None:
+        if progress is not None:
+            self.progress = round(min(max(progress, 0.0), 100.0), 1)
+        if message is not None:
+            self.message = message
+        self._notify()
+
+    def write(self, line: str) -> None:
+        """Append a line of output to the job log."""
+        line = line.rstrip("\n")
+        if not line:
+            return
+        self.log.append(line)
+        self.log_total += 1
+        self._notify()
+
+    def finish(self, status: str, result: Any = None, error: str | None = None) -> None:
+        self.status = status
+        self.result = result
+        self.error = error
+        if status == "succeeded":
+            self.progress = 100.0
+        self.finished = time.time()
+        self._notify()
+
+    @property
+    def changed(self) -> asyncio.Event:
+        """Event that is set by the next change of the job."""
+        return self._changed
+
+    def to_dict(self, log_since: int = 0) -> dict:
+        """Return the job state with the log lines written after ``log_since``."""
+        skip = max(log_since - (self.log_total - len(self.log)), 0)
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "description": self.description,
+            "status": self.status,
+            "progress": self.progress,
+            "message": self.message,
+            "log": list(self.log)[skip:],
+            "log_total": self.log_total,
+            "result": self.result,
+            "error": self.error,
+            "created": self.created,
+            "finished": self.finished,
+        }
+
+
+_jobs: OrderedDict[str, Job] = OrderedDict()
+_job_slots: asyncio.Semaphore | None = None
+
+
+async def _run_job(job: Job, work: Any) -> None:
+    global _job_slots
+    if _job_slots is None:
+        _job_slots = asyncio.Semaphore(JOB_WORKERS)
+    try:
+        async with _job_slots:
+            job.status = "running"
+            job._notify()
+            result = await work(job)
+        job.finish("succeeded", result)
+    except asyncio.CancelledError:
+        job.finish("cancelled", error="cancelled")
+    except HTTPException as exc:
+        job.finish("failed", error=str(exc.detail))
+    except Exception as exc:
+        job.finish("failed", error=str(exc) or exc.__class__.__name__)
+
+
+def start_job(kind: str, description: str, work: Any) -> Job:
+    """Schedule ``work(job)`` as a background job and return the job.
+
+    The value returned by ``work`` becomes the job result, an exception
+    marks the job as failed with the exception message as error.
+    """
+    job = Job(kind, description)
+    _jobs[job.id] = job
+    finished = [j for j in _jobs.values() if j.done]
+    for old in finished[: max(len(finished) - JOB_HISTORY_SIZE, 0)]:
+        del _jobs[old.id]
+    job.task = asyncio.create_task(_run_job(job, work))
+    # A task cancelled before it started never runs _run_job
+    job.task.add_done_callback(lambda _: job.done or job.finish("cancelled", error="cancelled"))
+    return job
+
+
+def get_job(job_id: str) -> Job:
+    job = _jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="job not found")
+    return job
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    tasks = [
+        asyncio.create_task(metrics_sampler()),
+        asyncio.create_task(watch_docker_events()),
+        asyncio.create_task(watch_lxc_events()),
+        asyncio.create_task(watch_k8s_pods()),
+        asyncio.create_task(watch_vm_events()),
+        asyncio.create_task(index_logs_periodically()),
+    ]
+    try:
+        yield
+    finally:
+        _log_index_stop.set()
+        jobs = [job.task for job in _jobs.values() if job.task and not job.task.done()]
+        for task in [*tasks, *jobs]:
+            task.cancel()
+        await asyncio.gather(*tasks, *jobs, return_exceptions=True)
+        for terminal in list(_terminal_sessions.values()):
+            await terminal.close()
+        for client in (_docker_client, _lxd_client):
+            if client is not None:
+                await client.aclose()
+        if _virsh_process is not None and _virsh_process.returncode is None:
+            _virsh_process.kill()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -46,37 +372,181 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Log-Cursor", "X-Log-Reset"],
 )
-pam_auth = pam.pam()
+# Successful PAM logins are cached under a salted hash of the credentials so
+# repeated requests with the same Basic header skip the PAM conversation.
+AUTH_CACHE_TTL = 60.0
+AUTH_CACHE_SIZE = 256
+
+_auth_salt = secrets.token_bytes(16)
+_auth_cache: OrderedDict[bytes, tuple[str, float]] = OrderedDict()
+_auth_inflight: dict[bytes, asyncio.Future] = {}
+_auth_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="pam")
+
+
+def _pam_authenticate(username: str, password: str) -> bool:
+    # pam.pam() keeps per-conversation state, so use one instance per call
+    return pam.pam().authenticate(username, password)
+
+
+async def _check_basic(key: bytes, username: str, password: str) -> bool:
+    loop = asyncio.get_running_loop()
+    try:
+        ok = await loop.run_in_executor(_auth_executor, _pam_authenticate, username, password)
+    finally:
+        _auth_inflight.pop(key, None)
+    if ok:
+        _auth_cache[key] = (username, time.monotonic() + AUTH_CACHE_TTL)
+        _auth_cache.move_to_end(key)
+        while len(_auth_cache) > AUTH_CACHE_SIZE:
+            _auth_cache.popitem(last=False)
+    else:
+        _auth_cache.pop(key, None)
+    return ok
+
+
+async def _authenticate_basic(username: str, password: str) -> bool:
+    key = hmac.new(_auth_salt, f"{username}:{password}".encode(), hashlib.sha256).digest()
+    now = time.monotonic()
+    cached = _auth_cache.get(key)
+    if cached and cached[1] > now:
+        _auth_cache.move_to_end(key)
+        return True
+    # The PAM check runs in a task of its own that every concurrent request
+    # with the same credentials awaits, so a cancelled request cannot cancel
+    # it for the others
+    task = _auth_inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_check_basic(key, username, password))
+        _auth_inflight[key] = task
+    return await asyncio.shield(task)
+
+
+# Session tokens are issued by /auth/login and have the form
+# ``<base64url(user:expiry)>.<base64url(hmac)>``. They are verified without
+# any I/O. The signing key is kept next to the settings so tokens survive
+# restarts of the service.
+SESSION_TTL = 12 * 3600
+SESSION_KEY_FILE = os.path.join(os.path.dirname(__file__), "session.key")
+
+
+def _load_session_key() -> bytes:
+    try:
+        with open(SESSION_KEY_FILE, "rb") as f:
+            key = f.read()
+        if len(key) >= 32:
+            return key
+    except OSError:
+        pass
+    key = secrets.token_bytes(32)
+    try:
+        fd = os.open(SESSION_KEY_FILE, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(key)
+    except OSError:
+        pass
+    return key
+
+
+_session_key = _load_session_key()
 
 
-@app.middleware("http")
-async def pam_auth_middleware(request: Request, call_next):
-    if request.method == "OPTIONS":
-        return await call_next(request)
-    auth_header = request.headers.get("Authorization")
+def _b64url(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64url_decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def create_session_token(username: str, ttl: float = SESSION_TTL) -> tuple[str, int]:
+    """Return a signed session token for ``username`` and its expiry time."""
+    expires = int(time.time() + ttl)
+    payload = f"{username}:{expires}".encode()
+    signature = hmac.new(_session_key, payload, hashlib.sha256).digest()
+    return f"{_b64url(payload)}.{_b64url(signature)}", expires
+
+
+def verify_session_token(token: str) -> str | None:
+    """Return the user of a valid, unexpired session token or ``None``."""
+    try:
+        payload_b64, signature_b64 = token.split(".", 1)
+        payload = _b64url_decode(payload_b64)
+        expected = hmac.new(_session_key, payload, hashlib.sha256).digest()
+        if not hmac.compare_digest(expected, _b64url_decode(signature_b64)):
+            return None
+        username, expires = payload.decode().rsplit(":", 1)
+        if int(expires) < time.time():
+            return None
+        return username
+    except Exception:
+        return None
+
+
+async def authenticate(auth_header: str | None) -> str | None:
+    """Return the user for an ``Authorization`` header value or ``None``."""
     if not auth_header:
-        return Response(status_code=401, headers={"WWW-Authenticate": "Basic"})
+        return None
     try:
         scheme, credentials = auth_header.split(" ", 1)
         scheme = scheme.lower()
         if scheme == "basic":
             decoded = base64.b64decode(credentials).decode()
             username, password = decoded.split(":", 1)
-            if not pam_auth.authenticate(username, password):
-                return Response(status_code=401, headers={"WWW-Authenticate": "Basic"})
-            request.state.user = username
+            if await _authenticate_basic(username, password):
+                return username
+        elif scheme == "bearer" and "." in credentials:
+            return verify_session_token(credentials.strip())
         elif scheme == "bearer":
-            settings = load_settings()
-            if not settings.api_key or credentials.strip() != settings.api_key:
-                return Response(status_code=401, headers={"WWW-Authenticate": "Basic"})
-            request.state.user = "api-key"
-        else:
-            raise ValueError
+            api_key = read_settings_file().get("api_key")
+            if api_key and hmac.compare_digest(credentials.strip(), api_key):
+                return "api-key"
     except Exception:
-        return Response(status_code=401, headers={"WWW-Authenticate": "Basic"})
-    response = await call_next(request)
-    return response
+        pass
+    return None
+
+
+async def authenticate_websocket(websocket: WebSocket) -> str | None:
+    """Authenticate an accepted websocket connection.
+
+    Browsers cannot set headers on websocket connections, so they send the
+    header value as first text message. Tokens are kept out of the URL, where
+    proxies and access logs would record them.
+    """
+    auth_header = websocket.headers.get("Authorization")
+    if not auth_header:
+        try:
+            auth_header = await asyncio.wait_for(websocket.receive_text(), timeout=10)
+        except Exception:
+            return None
+    return await authenticate(auth_header)
+
+
+class PamAuthMiddleware:
+    """Reject HTTP requests without valid credentials.
+
+    This is plain ASGI middleware so streamed responses reach the server
+    untouched instead of passing through BaseHTTPMiddleware's queue.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+        user = await authenticate(Request(scope).headers.get("Authorization"))
+        if user is None:
+            response = Response(status_code=401, headers={"WWW-Authenticate": "Basic"})
+            await response(scope, receive, send)
+            return
+        scope.setdefault("state", {})["user"] = user
+        await self.app(scope, receive, send)
+
+
+app.add_middleware(PamAuthMiddleware)
 
 
 @app.get("/")
@@ -84,6 +554,20 @@ def read_root():
     return {"detail": "ok"}
 
 
+@app.post("/auth/login")
+def login(request: Request):
+    """Exchange the credentials of this request for a session token.
+
+    Only Basic credentials are accepted, so a token cannot renew itself and the
+    password is checked again for every new token.
+    """
+    scheme = (request.headers.get("Authorization") or "").split(" ", 1)[0]
+    if scheme.lower() != "basic":
+        raise HTTPException(status_code=401, detail="Login requires Basic credentials", headers={"WWW-Authenticate": "Basic"})
+    token, expires = create_session_token(request.state.user)
+    return {"token": token, "expires": expires, "user": request.state.user}
+
+
 class Container(BaseModel):
     id: int
     name: str
@@ -119,6 +603,9 @@ class ISOInfo(BaseModel):
     created: str
     used: bool
     path: str
+    sha256: str | None = None
+    label: str | None = None
+    references: int = 0
 
 
 class ContainerImageInfo(BaseModel):
@@ -155,6 +642,17 @@ class ZFSDeviceInfo(BaseModel):
     status: str
 
 
+class ZFSVdevInfo(BaseModel):
+    name: str
+    type: str
+    state: str
+    read: int = 0
+    write: int = 0
+    checksum: int = 0
+    note: str = ""
+    children: List["ZFSVdevInfo"] = []
+
+
 class ZFSPoolInfo(BaseModel):
     name: str
     type: str
@@ -163,6 +661,14 @@ class ZFSPoolInfo(BaseModel):
     available: float
     mountpoint: str
     devices: List[ZFSDeviceInfo]
+    state: str = ""
+    status: str = ""
+    errors: str = ""
+    scan: str = ""
+    vdevs: List[ZFSVdevInfo] = []
+    logs: List[ZFSVdevInfo] = []
+    cache: List[ZFSVdevInfo] = []
+    spares: List[ZFSVdevInfo] = []
 
 
 class NetworkInterfaceInfo(BaseModel):
@@ -225,14 +731,33 @@ def _system_ssh_port() -> int:
     return 22
 
 
+_settings_cache: tuple[tuple[int, int], dict[str, Any]] | None = None
+
+
+def read_settings_file() -> dict[str, Any]:
+    """Return the raw contents of the settings file.
+
+    The parsed data is cached and only re-read when the file changes.
+    """
+    global _settings_cache
+    try:
+        stat = os.stat(SETTINGS_FILE)
+    except OSError:
+        return {}
+    key = (stat.st_mtime_ns, stat.st_size)
+    if _settings_cache and _settings_cache[0] == key:
+        return _settings_cache[1]
+    try:
+        with open(SETTINGS_FILE) as f:
+            data = json.load(f)
+    except Exception:
+        data = {}
+    _settings_cache = (key, data)
+    return data
+
+
 def load_settings() -> SettingsModel:
-    data: dict[str, Any] = {}
-    if os.path.exists(SETTINGS_FILE):
-        try:
-            with open(SETTINGS_FILE) as f:
-                data = json.load(f)
-        except Exception:
-            data = {}
+    data = read_settings_file()
     return SettingsModel(
         hostname=_system_hostname(),
         timezone=data.get("timezone", "utc"),
@@ -244,8 +769,10 @@ def load_settings() -> SettingsModel:
 
 
 def save_settings(settings: SettingsModel) -> None:
+    global _settings_cache
     with open(SETTINGS_FILE, "w") as f:
         json.dump(settings.dict(), f)
+    _settings_cache = None
 
 
 def _system_nameservers() -> tuple[str, str]:
@@ -426,6 +953,7 @@ def format_uptime(seconds: float) -> str:
     return " ".join(parts) if parts else "0m"
 
 
+@lru_cache(maxsize=1)
 def get_cpu_model() -> str:
     model = platform.processor()
     if not model:
@@ -440,51 +968,169 @@ def get_cpu_model() -> str:
     return model or "unknown"
 
 
-def get_gpu_model() -> str:
+_gpu_model: asyncio.Task | None = None
+
+
+async def _probe_gpu_model() -> str:
+    # Try NVIDIA GPUs via nvidia-smi
+    result = await run_command(
+        ["nvidia-smi", "--query-gpu=name", "--format=csv,noheader"], timeout=COMMAND_TIMEOUT
+    )
+    output = result.stdout.strip()
+    if result.returncode == 0 and output:
+        return output.splitlines()[0]
+
+    # Fall back to lshw which lists all display adapters
+    result = await run_command(["lshw", "-C", "display"], timeout=COMMAND_TIMEOUT)
+    if result.returncode == 0:
+        for line in result.stdout.splitlines():
+            line = line.strip()
+            if line.lower().startswith("product:"):
+                return line.split(":", 1)[1].strip()
+    return "none"
+
+
+async def get_gpu_model() -> str:
     """Return the GPU model if available.
 
     The function first attempts to query NVIDIA GPUs using ``nvidia-smi``.  If no
     NVIDIA GPU is present or the command fails, it falls back to parsing the
     output of ``lshw -C display`` which works for a broader range of hardware
-    including Intel and AMD GPUs.
+    including Intel and AMD GPUs.  The result is cached as the hardware does
+    not change while the service is running; concurrent first callers share
+    one probe.
     """
 
-    # Try NVIDIA GPUs via nvidia-smi
+    global _gpu_model
+    if _gpu_model is None:
+        _gpu_model = asyncio.ensure_future(_probe_gpu_model())
+    task = _gpu_model
     try:
-        output = subprocess.check_output(
-            ["nvidia-smi", "--query-gpu=name", "--format=csv,noheader"],
-            stderr=subprocess.DEVNULL,
-        ).decode().strip()
-        if output:
-            return output.splitlines()[0]
-    except Exception:
-        pass
+        return await asyncio.shield(task)
+    except HTTPException:
+        # A timed out probe is retried by the next caller
+        if _gpu_model is task:
+            _gpu_model = None
+        return "none"
+
+
+# Running processes indexed by name, exe basename and argv[0] basename. The
+# index is refreshed at most every PROCESS_INDEX_TTL seconds by reading only
+# the pids that appeared since the last refresh. Lookups check the start time
+# of the pids they match, so a reused pid is read again, and re-read the
+# processes first seen within PROCESS_EXEC_WINDOW seconds to catch wrappers
+# that exec() the real program right after starting.
+PROCESS_INDEX_TTL = 2.0
+PROCESS_EXEC_WINDOW = 10.0
+
+_process_keys: dict[int, tuple[int, tuple[str, ...]]] = {}
+_process_young: dict[int, float] = {}
+_process_index: dict[str, set[int]] = {}
+_process_index_time = 0.0
+_process_index_lock = threading.Lock()
+
+
+def _process_start(pid: int) -> int | None:
+    """Return the start time of a process in clock ticks, None if it is gone."""
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # The command name may contain spaces and parentheses
+    fields = stat[stat.rfind(b")") + 2:].split()
+    try:
+        return int(fields[19])
+    except (IndexError, ValueError):
+        return None
 
-    # Fall back to lshw which lists all display adapters
+
+def _read_process_keys(pid: int) -> tuple[str, ...]:
+    keys: set[str] = set()
     try:
-        output = subprocess.check_output(
-            ["lshw", "-C", "display"],
-            stderr=subprocess.DEVNULL,
-        ).decode()
-        for line in output.splitlines():
-            line = line.strip()
-            if line.lower().startswith("product:"):
-                return line.split(":", 1)[1].strip()
-    except Exception:
+        proc = psutil.Process(pid)
+        with proc.oneshot():
+            keys.add(proc.name())
+            try:
+                exe = proc.exe()
+                if exe:
+                    keys.add(os.path.basename(exe))
+            except (psutil.AccessDenied, psutil.ZombieProcess):
+                pass
+            try:
+                cmdline = proc.cmdline()
+                if cmdline:
+                    keys.add(os.path.basename(cmdline[0]))
+            except (psutil.AccessDenied, psutil.ZombieProcess):
+                pass
+    except (psutil.NoSuchProcess, psutil.AccessDenied):
         pass
+    keys.discard("")
+    return tuple(keys)
 
-    return "none"
+
+def _forget_process(pid: int) -> None:
+    for key in _process_keys.pop(pid)[1]:
+        owners = _process_index.get(key)
+        if owners is not None:
+            owners.discard(pid)
+            if not owners:
+                del _process_index[key]
 
 
-def get_service_status(service: str) -> str:
+def _index_process(pid: int) -> None:
+    """(Re)read the start time and names of one process into the index."""
+    if pid in _process_keys:
+        _forget_process(pid)
+    start = _process_start(pid)
+    if start is None:
+        return
+    keys = _read_process_keys(pid)
+    _process_keys[pid] = (start, keys)
+    for key in keys:
+        _process_index.setdefault(key, set()).add(pid)
+
+
+def refresh_process_index() -> None:
+    """Apply process births and deaths since the last refresh to the index."""
+    global _process_index_time
+    with _process_index_lock:
+        now = time.monotonic()
+        if now - _process_index_time < PROCESS_INDEX_TTL:
+            return
+        pids = set(psutil.pids())
+        for pid in _process_keys.keys() - pids:
+            _forget_process(pid)
+        for pid in pids - _process_keys.keys():
+            _index_process(pid)
+            # Everything is new to the first refresh, not just started
+            if _process_index_time:
+                _process_young[pid] = now
+        for pid, seen in list(_process_young.items()):
+            if pid not in _process_keys or now - seen > PROCESS_EXEC_WINDOW:
+                del _process_young[pid]
+        _process_index_time = now
+
+
+def processes_named(name: str) -> set[int]:
+    """Return the pids of processes matching ``name``."""
+    refresh_process_index()
+    with _process_index_lock:
+        for pid in list(_process_index.get(name, ())):
+            if pid in _process_young or _process_start(pid) != _process_keys[pid][0]:
+                _index_process(pid)
+        if name not in _process_index:
+            # A young wrapper may have exec()ed the program by now
+            for pid in list(_process_young):
+                _index_process(pid)
+        return set(_process_index.get(name, ()))
+
+
+async def get_service_status(service: str) -> str:
     """Return 'running', 'stopped' or 'not found' for given service."""
     # Prefer systemctl if available
     if shutil.which("systemctl"):
-        result = subprocess.run(
-            ["systemctl", "is-active", service],
-            capture_output=True,
-            text=True,
-        )
+        result = await run_command(["systemctl", "is-active", service], timeout=COMMAND_TIMEOUT)
         if result.returncode == 0 and result.stdout.strip() == "active":
             return "running"
         if result.returncode == 4 or "could not be found" in result.stderr:
@@ -494,79 +1140,319 @@ def get_service_status(service: str) -> str:
     # Fallback: check if binary exists and whether a process is running
     if shutil.which(service) is None:
         return "not found"
-    for proc in psutil.process_iter(["name", "exe", "cmdline"]):
+    return "running" if await asyncio.to_thread(processes_named, service) else "stopped"
+
+
+# Unit states are fetched from systemd over D-Bus with busctl, which returns
+# every unit in a single round trip instead of one systemctl call per unit.
+SERVICES_CACHE_TTL = 5.0
+
+_services_cache: tuple[float, list[dict[str, Any]]] | None = None
+
+
+async def _systemd_call(method: str, signature: str, *args: str) -> Any:
+    """Call a method of the systemd manager and return its first result."""
+    result = await run_command(
+        [
+            "busctl",
+            "call",
+            "--json=short",
+            "org.freedesktop.systemd1",
+            "/org/freedesktop/systemd1",
+            "org.freedesktop.systemd1.Manager",
+            method,
+            signature,
+            *args,
+        ],
+        timeout=10,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip() or f"{method} failed")
+    return json.loads(result.stdout)["data"][0]
+
+
+def _unit_status(load_state: str, active_state: str) -> str:
+    if load_state == "not-found":
+        return "not found"
+    return "running" if active_state == "active" else "stopped"
+
+
+async def get_service_statuses(services: list[str]) -> dict[str, str]:
+    """Return the status of several services, resolving them in one call."""
+    if shutil.which("systemctl") and shutil.which("busctl"):
+        names = [s if "." in s else f"{s}.service" for s in services]
         try:
-            if (
-                proc.info.get("name") == service
-                or (proc.info.get("exe") and os.path.basename(proc.info["exe"]) == service)
-                or (
-                    proc.info.get("cmdline")
-                    and proc.info["cmdline"]
-                    and os.path.basename(proc.info["cmdline"][0]) == service
-                )
-            ):
-                return "running"
-        except (psutil.NoSuchProcess, psutil.AccessDenied):
-            continue
-    return "stopped"
+            units = await _systemd_call("ListUnitsByNames", "as", str(len(names)), *names)
+            # systemd answers in the order the names were given
+            return {
+                service: _unit_status(unit[2], unit[3])
+                for service, unit in zip(services, units)
+            }
+        except Exception:
+            pass
+    statuses = await asyncio.gather(*(get_service_status(s) for s in services))
+    return dict(zip(services, statuses))
+
+
+async def _list_services_dbus() -> list[dict[str, Any]]:
+    files, units = await asyncio.gather(
+        _systemd_call("ListUnitFilesByPatterns", "asas", "0", "1", "*.service"),
+        _systemd_call("ListUnitsByPatterns", "asas", "0", "1", "*.service"),
+    )
+    active = {unit[0]: unit[3] for unit in units}
+    return [
+        {
+            "name": os.path.basename(path),
+            "status": "running" if active.get(os.path.basename(path)) == "active" else "stopped",
+            "enabled": state.lower().startswith("enabled"),
+        }
+        for path, state in files
+    ]
+
+
+async def _list_services_systemctl() -> list[dict[str, Any]]:
+    files, units = await asyncio.gather(
+        run_command(
+            ["systemctl", "list-unit-files", "--type=service", "--no-legend"], timeout=COMMAND_TIMEOUT
+        ),
+        run_command(
+            ["systemctl", "list-units", "--type=service", "--all", "--no-legend", "--plain"], timeout=COMMAND_TIMEOUT
+        ),
+    )
+    active: dict[str, str] = {}
+    for line in units.stdout.splitlines():
+        parts = line.split()
+        if len(parts) >= 3:
+            active[parts[0]] = parts[2]
+    services: list[dict[str, Any]] = []
+    for line in files.stdout.splitlines():
+        parts = line.split()
+        if len(parts) >= 2:
+            services.append(
+                {
+                    "name": parts[0],
+                    "status": "running" if active.get(parts[0]) == "active" else "stopped",
+                    "enabled": parts[1].lower().startswith("enabled"),
+                }
+            )
+    return services
+
+
+def invalidate_services() -> None:
+    global _services_cache
+    _services_cache = None
 
 
-def list_systemd_services() -> list[dict[str, any]]:
-    """Return a list of systemd services with status and enabled state."""
-    services: list[dict[str, any]] = []
+async def list_systemd_services() -> list[dict[str, Any]]:
+    """Return a list of systemd services with status and enabled state.
+
+    The list is cached for SERVICES_CACHE_TTL seconds and invalidated when
+    a service is changed through the API.
+    """
+    global _services_cache
     if shutil.which("systemctl") is None:
-        return services
+        return []
+    if _services_cache and _services_cache[0] > time.monotonic():
+        return _services_cache[1]
+    services: list[dict[str, Any]] = []
     try:
-        result = subprocess.run(
-            ["systemctl", "list-unit-files", "--type=service", "--no-legend"],
-            capture_output=True,
-            text=True,
-        )
-        for line in result.stdout.splitlines():
-            parts = line.split()
-            if len(parts) >= 2:
-                name = parts[0]
-                enabled = parts[1].lower().startswith("enabled")
-                services.append(
-                    {
-                        "name": name,
-                        "status": get_service_status(name),
-                        "enabled": enabled,
-                    }
-                )
+        if shutil.which("busctl"):
+            try:
+                services = await _list_services_dbus()
+            except Exception:
+                services = await _list_services_systemctl()
+        else:
+            services = await _list_services_systemctl()
     except Exception:
         pass
+    services.sort(key=lambda s: s["name"])
+    _services_cache = (time.monotonic() + SERVICES_CACHE_TTL, services)
     return services
 
 
+_vms_cache: tuple[tuple[int, int], list[dict]] | None = None
+
+
 def load_vms() -> List[VirtualMachine]:
-    if os.path.exists(VM_FILE):
+    """Return the stored VMs, re-reading vms.json only when it changed."""
+    global _vms_cache
+    try:
+        stat = os.stat(VM_FILE)
+    except OSError:
+        return []
+    key = (stat.st_mtime_ns, stat.st_size)
+    if not _vms_cache or _vms_cache[0] != key:
         try:
             with open(VM_FILE) as f:
-                data = json.load(f)
-            return [VirtualMachine(**vm) for vm in data]
+                _vms_cache = (key, json.load(f))
         except Exception:
             return []
-    return []
+    try:
+        return [VirtualMachine(**vm) for vm in _vms_cache[1]]
+    except Exception:
+        return []
 
 
 def save_vms(vms: List[VirtualMachine]) -> None:
+    global _vms_cache
     with open(VM_FILE, "w") as f:
         json.dump([vm.dict() for vm in vms], f)
+    _vms_cache = None
+
+
+# All virsh commands are sent to one long-lived ``virsh`` shell so a burst of
+# VM actions shares a single libvirt connection. Each command is followed by
+# an ``echo`` of a marker which tells where its output ends. virsh does not
+# flush stdout when writing to a pipe, so the shell needs stdbuf; without it
+# every command runs as its own virsh process.
+VIRSH_TIMEOUT = 120.0
+_VIRSH_MARKER = "__upservx_virsh_done__"
+_VIRSH_PROMPT = re.compile(r"^(virsh # )+")
+
+_virsh_process: asyncio.subprocess.Process | None = None
+_virsh_lock = asyncio.Lock()
+
+
+async def _virsh_shell() -> asyncio.subprocess.Process:
+    global _virsh_process
+    if _virsh_process is None or _virsh_process.returncode is not None:
+        _virsh_process = await asyncio.create_subprocess_exec(
+            "stdbuf", "-oL", "virsh", "-q",
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+        )
+    return _virsh_process
+
+
+async def _virsh_exchange(process: asyncio.subprocess.Process, line: str) -> list[str]:
+    process.stdin.write(f"{line}\necho {_VIRSH_MARKER}\n".encode())
+    await process.stdin.drain()
+    output: list[str] = []
+    while True:
+        raw = await process.stdout.readline()
+        if not raw:
+            raise RuntimeError("virsh exited")
+        text = _VIRSH_PROMPT.sub("", raw.decode(errors="replace").rstrip("\n"))
+        if text == _VIRSH_MARKER:
+            return output
+        output.append(text)
+
+
+async def virsh(*args: str) -> subprocess.CompletedProcess:
+    """Run a virsh command in the shared virsh shell.
+
+    Lines starting with ``error:`` mark the command as failed; they are
+    returned as stderr like a separate virsh process would report them.
+    """
+    global _virsh_process
+    if shutil.which("stdbuf") is None:
+        return await run_command(["virsh", *args], timeout=VIRSH_TIMEOUT)
+    async with _virsh_lock:
+        process = await _virsh_shell()
+        try:
+            output = await asyncio.wait_for(
+                _virsh_exchange(process, shlex.join(args)), VIRSH_TIMEOUT
+            )
+        except (Exception, asyncio.TimeoutError):
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+            _virsh_process = None
+            raise HTTPException(status_code=400, detail=f"virsh {args[0]} failed")
+    errors = [line for line in output if line.startswith("error:")]
+    stdout = "\n".join(line for line in output if not line.startswith("error:"))
+    return subprocess.CompletedProcess(
+        ["virsh", *args], 1 if errors else 0, stdout, "\n".join(errors)
+    )
 
 
-def parse_virsh_list() -> dict[str, str]:
+def _parse_virsh_list(output: str) -> dict[str, str]:
     statuses: dict[str, str] = {}
+    for line in output.splitlines():
+        parts = line.split(None, 2)
+        if len(parts) >= 3 and (parts[0].isdigit() or parts[0] == "-"):
+            statuses[parts[1]] = parts[2].strip()
+    return statuses
+
+
+async def parse_virsh_list() -> dict[str, str]:
     if shutil.which("virsh") is None:
-        return statuses
-    result = subprocess.run(["virsh", "list", "--all"], capture_output=True, text=True)
+        return {}
+    result = await virsh("list", "--all")
     if result.returncode != 0:
-        return statuses
-    for line in result.stdout.splitlines()[2:]:
-        parts = line.split()
-        if len(parts) >= 3:
-            statuses[parts[1]] = parts[2]
-    return statuses
+        return {}
+    return _parse_virsh_list(result.stdout)
+
+
+# Domain states as shown by ``virsh list``, kept current from libvirt
+# lifecycle events. ``None`` while no event stream is running.
+_vm_states: dict[str, str] | None = None
+
+# virsh prints the domain name quoted but unescaped, so it may itself contain
+# quotes or colons; the event name follows the last "': " on the line
+_VM_EVENT = re.compile(r"for domain '(.*)': (\w+)")
+_VM_EVENT_STATES = {
+    "Started": "running",
+    "Resumed": "running",
+    "Suspended": "paused",
+    "PMSuspended": "pmsuspended",
+    "Stopped": "shut off",
+    "Crashed": "crashed",
+}
+
+
+async def vm_states() -> dict[str, str]:
+    if _vm_states is not None:
+        return _vm_states
+    return await parse_virsh_list()
+
+
+def _handle_vm_event(line: str) -> None:
+    match = _VM_EVENT.search(line)
+    if not match or _vm_states is None:
+        return
+    name, event = match.groups()
+    if event == "Undefined":
+        _vm_states.pop(name, None)
+    elif event == "Defined":
+        _vm_states.setdefault(name, "shut off")
+    elif event in _VM_EVENT_STATES:
+        _vm_states[name] = _VM_EVENT_STATES[event]
+
+
+async def watch_vm_events() -> None:
+    """Follow libvirt lifecycle events to keep the domain state cache.
+
+    Without stdbuf the events would sit in virsh's output buffer, so the
+    states are then read with ``virsh list`` on every request instead.
+    """
+    global _vm_states
+    cmd = ["stdbuf", "-oL", "virsh", "-q", "event", "--all", "--loop", "--event", "lifecycle"]
+    while shutil.which("virsh") and shutil.which("stdbuf"):
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL,
+            )
+        except Exception:
+            return
+        try:
+            # Events are only missed before the stream is registered
+            await asyncio.sleep(1)
+            if process.returncode is None:
+                _vm_states = await parse_virsh_list()
+                async for raw in process.stdout:
+                    _handle_vm_event(raw.decode(errors="replace"))
+        except HTTPException:
+            pass
+        finally:
+            _vm_states = None
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+        await asyncio.sleep(10)
 
 
 def _parse_ports(port_str: str) -> List[str]:
@@ -576,194 +1462,685 @@ def _parse_ports(port_str: str) -> List[str]:
     return [p.strip() for p in port_str.split(',') if p.strip()]
 
 
-def get_docker_containers() -> List[Container]:
-    """Return running Docker containers using the docker CLI."""
-    if shutil.which("docker") is None:
+# Docker is driven through the Engine API on its unix socket instead of the
+# docker CLI. A single pooled client is shared by all requests; the socket
+# path can be overridden to point the service at another daemon.
+DOCKER_SOCKET = os.environ.get("DOCKER_SOCKET", "/var/run/docker.sock")
+# Registry credentials stored by "docker login", used for pulls
+DOCKER_CONFIG = os.path.join(
+    os.environ.get("DOCKER_CONFIG", os.path.expanduser("~/.docker")), "config.json"
+)
+DOCKER_HUB_AUTH_KEY = "https://index.docker.io/v1/"
+
+_docker_client: httpx.AsyncClient | None = None
+
+
+def docker_available() -> bool:
+    return os.path.exists(DOCKER_SOCKET)
+
+
+def docker_client() -> httpx.AsyncClient:
+    global _docker_client
+    if _docker_client is None:
+        _docker_client = httpx.AsyncClient(
+            transport=httpx.AsyncHTTPTransport(uds=DOCKER_SOCKET),
+            base_url="http://docker",
+            timeout=httpx.Timeout(60.0),
+        )
+    return _docker_client
+
+
+async def docker_request(method: str, path: str, **kwargs: Any) -> httpx.Response:
+    """Send a request to the Docker Engine API.
+
+    Errors reported by the daemon are raised as HTTPException with the
+    daemon's message as detail.
+    """
+    try:
+        response = await docker_client().request(method, path, **kwargs)
+    except httpx.HTTPError as exc:
+        raise HTTPException(status_code=503, detail=f"docker unavailable: {exc}")
+    if response.status_code >= 400:
+        try:
+            message = response.json().get("message", "")
+        except Exception:
+            message = response.text
+        status = 404 if response.status_code == 404 else 400
+        raise HTTPException(status_code=status, detail=message.strip() or "docker request failed")
+    return response
+
+
+def _format_since(timestamp: float) -> str:
+    """Return a relative time such as ``3 hours ago`` like the docker CLI."""
+    seconds = max(int(time.time() - timestamp), 0)
+    for unit, length in (
+        ("year", 365 * 86400),
+        ("month", 30 * 86400),
+        ("week", 7 * 86400),
+        ("day", 86400),
+        ("hour", 3600),
+        ("minute", 60),
+        ("second", 1),
+    ):
+        if seconds >= length:
+            count = seconds // length
+            return f"{count} {unit}{'s' if count != 1 else ''} ago"
+    return "Less than a second ago"
+
+
+def _format_docker_ports(ports: list[dict]) -> List[str]:
+    formatted: List[str] = []
+    for port in ports:
+        private = f"{port.get('PrivatePort')}/{port.get('Type', 'tcp')}"
+        if port.get("PublicPort"):
+            entry = f"{port.get('IP', '')}:{port['PublicPort']}->{private}"
+        else:
+            entry = private
+        if entry not in formatted:
+            formatted.append(entry)
+    return formatted
+
+
+def _split_image_ref(image: str) -> tuple[str, str]:
+    """Split an image reference into repository and tag (or digest)."""
+    if "@" in image:
+        repo, digest = image.split("@", 1)
+        return repo, digest
+    repo, sep, tag = image.rpartition(":")
+    if not sep or "/" in tag:
+        return image, "latest"
+    return repo, tag
+
+
+async def get_docker_containers() -> List[Container]:
+    """Return all Docker containers from the Engine API."""
+    if not docker_available():
         return []
     try:
-        output = subprocess.check_output(
-            [
-                "docker",
-                "ps",
-                "-a",
-                "--format",
-                "{{.Names}}||{{.Image}}||{{.Status}}||{{.Ports}}||{{.RunningFor}}",
-            ],
-            text=True,
-        ).strip()
+        response = await docker_request("GET", "/containers/json", params={"all": "1"})
+        data = response.json()
     except Exception:
         return []
 
     containers_list = []
-    for line in output.splitlines():
-        parts = line.split("||")
-        if len(parts) != 5:
-            continue
-        name, image, status, ports, running_for = parts
+    for item in data:
+        names = item.get("Names") or [""]
         containers_list.append(
             Container(
                 id=0,
-                name=name,
+                name=names[0].lstrip("/"),
                 type="Docker",
-                status="running" if status.lower().startswith("up") else "stopped",
-                image=image,
-                ports=_parse_ports(ports),
+                status="running" if item.get("State") == "running" else "stopped",
+                image=item.get("Image", ""),
+                ports=_format_docker_ports(item.get("Ports") or []),
                 mounts=[],
                 envs=[],
                 cpu=0.0,
                 memory=0,
-                created=running_for,
+                created=_format_since(item.get("Created", 0)),
             )
         )
     return containers_list
 
 
-def get_lxc_containers() -> List[Container]:
-    """Return LXC/LXD containers using the lxc CLI if available."""
-    if shutil.which("lxc") is None:
-        return []
+def _registry_host(repo: str) -> str:
+    """Return the key "docker login" stores the credentials of ``repo`` under."""
+    first, sep, _ = repo.partition("/")
+    if sep and ("." in first or ":" in first or first == "localhost"):
+        return first
+    return DOCKER_HUB_AUTH_KEY
+
+
+def _read_docker_config() -> dict:
     try:
-        output = subprocess.check_output(
-            ["lxc", "list", "--format", "json"], text=True
-        ).strip()
-        data = json.loads(output)
-    except Exception:
-        return []
+        with open(DOCKER_CONFIG) as f:
+            config = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return config if isinstance(config, dict) else {}
 
-    containers_list = []
-    for item in data:
-        config = item.get("config", {})
-        os_name = config.get("image.os", "")
-        release = config.get("image.release", "")
-        image = f"{os_name} {release}".strip()
-        containers_list.append(
-            Container(
-                id=0,
-                name=item.get("name", ""),
-                type="LXC",
-                status=item.get("status", "").lower(),
-                image=image,
-                ports=[],
-                mounts=[],
-                envs=[],
-                cpu=0.0,
-                memory=0,
-                created=item.get("created_at", ""),
+
+async def _registry_auth(repo: str) -> str | None:
+    """Return the X-Registry-Auth header for pulling ``repo``.
+
+    Credentials come from a credential helper when the Docker config names
+    one, otherwise from its ``auths`` section. None means anonymous.
+    """
+    config = await asyncio.to_thread(_read_docker_config)
+    host = _registry_host(repo)
+    helper = (config.get("credHelpers") or {}).get(host) or config.get("credsStore")
+    auth: dict | None = None
+    if helper:
+        result = await run_command([f"docker-credential-{helper}", "get"], input=host, timeout=30)
+        if result.returncode == 0:
+            try:
+                creds = json.loads(result.stdout)
+            except ValueError:
+                creds = {}
+            if creds.get("Username") == "<token>":
+                auth = {"identitytoken": creds.get("Secret", "")}
+            elif creds.get("Username"):
+                auth = {"username": creds["Username"], "password": creds.get("Secret", "")}
+    if auth is None:
+        entry = (config.get("auths") or {}).get(host)
+        if host == DOCKER_HUB_AUTH_KEY and entry is None:
+            entry = (config.get("auths") or {}).get("docker.io")
+        if not entry:
+            return None
+        if entry.get("identitytoken"):
+            auth = {"identitytoken": entry["identitytoken"]}
+        elif entry.get("auth"):
+            try:
+                username, _, password = base64.b64decode(entry["auth"]).decode().partition(":")
+            except ValueError:
+                return None
+            auth = {"username": username, "password": password}
+        else:
+            return None
+    auth["serveraddress"] = host
+    return base64.urlsafe_b64encode(json.dumps(auth).encode()).decode()
+
+
+async def docker_pull(image: str, progress: Any = None) -> None:
+    """Pull an image, passing each progress message to ``progress``.
+
+    The daemon reports pull failures inside the progress stream, so the
+    stream is consumed completely and checked for errors. Private registries
+    get the credentials "docker login" stored for them.
+    """
+    repo, tag = _split_image_ref(image)
+    auth = await _registry_auth(repo)
+    try:
+        async with docker_client().stream(
+            "POST",
+            "/images/create",
+            params={"fromImage": repo, "tag": tag},
+            headers={"X-Registry-Auth": auth} if auth else None,
+            timeout=httpx.Timeout(60.0, read=None),
+        ) as response:
+            if response.status_code >= 400:
+                await response.aread()
+                try:
+                    message = response.json().get("message", "")
+                except Exception:
+                    message = response.text
+                raise HTTPException(status_code=400, detail=message.strip() or "failed to pull")
+            async for line in response.aiter_lines():
+                if not line.strip():
+                    continue
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    continue
+                if message.get("error"):
+                    raise HTTPException(status_code=400, detail=message["error"])
+                if progress:
+                    progress(message)
+    except httpx.HTTPError as exc:
+        raise HTTPException(status_code=503, detail=f"docker unavailable: {exc}")
+
+
+def _docker_port_bindings(ports: List[str]) -> tuple[dict, dict]:
+    """Translate ``[ip:]host:container[/proto]`` specs for the Engine API."""
+    exposed: dict[str, dict] = {}
+    bindings: dict[str, list[dict]] = {}
+    for spec in ports:
+        spec, _, proto = spec.partition("/")
+        parts = spec.split(":")
+        key = f"{parts[-1]}/{proto or 'tcp'}"
+        exposed[key] = {}
+        if len(parts) > 1:
+            bindings.setdefault(key, []).append(
+                {
+                    "HostIp": parts[-3] if len(parts) > 2 else "",
+                    "HostPort": parts[-2],
+                }
             )
+    return exposed, bindings
+
+
+async def docker_run(payload: "ContainerCreate") -> None:
+    """Create and start a container, pulling its image if necessary."""
+    exposed, bindings = _docker_port_bindings(payload.ports)
+    body = {
+        "Image": payload.image,
+        "Env": payload.envs,
+        "ExposedPorts": exposed,
+        "HostConfig": {"PortBindings": bindings, "Binds": payload.mounts},
+    }
+    params = {"name": payload.name}
+    try:
+        response = await docker_request("POST", "/containers/create", params=params, json=body)
+    except HTTPException as exc:
+        if exc.status_code != 404:
+            raise
+        await docker_pull(payload.image)
+        response = await docker_request("POST", "/containers/create", params=params, json=body)
+    container_id = response.json()["Id"]
+    await docker_request("POST", f"/containers/{container_id}/start")
+
+
+# LXD is driven through its REST API on the local unix socket. Long running
+# actions are LXD operations which are awaited asynchronously instead of
+# blocking a worker thread.
+LXD_SOCKETS = ["/var/snap/lxd/common/lxd/unix.socket", "/var/lib/lxd/unix.socket"]
+LXD_OPERATION_POLL = 30
+
+# Image servers behind the default remotes of the lxc CLI
+LXD_REMOTES = {
+    "images": "https://images.lxd.canonical.com",
+    "ubuntu": "https://cloud-images.ubuntu.com/releases",
+    "ubuntu-daily": "https://cloud-images.ubuntu.com/daily",
+}
+
+_lxd_client: httpx.AsyncClient | None = None
+
+
+def lxd_socket() -> str:
+    path = os.environ.get("LXD_SOCKET")
+    if path:
+        return path
+    return next((p for p in LXD_SOCKETS if os.path.exists(p)), LXD_SOCKETS[-1])
+
+
+def lxd_available() -> bool:
+    return os.path.exists(lxd_socket())
+
+
+def lxd_client() -> httpx.AsyncClient:
+    global _lxd_client
+    if _lxd_client is None:
+        _lxd_client = httpx.AsyncClient(
+            transport=httpx.AsyncHTTPTransport(uds=lxd_socket()),
+            base_url="http://lxd",
+            timeout=httpx.Timeout(LXD_OPERATION_POLL + 30.0),
         )
-    return containers_list
+    return _lxd_client
 
 
-def get_k8s_pods() -> List[Container]:
-    """Return Kubernetes pods using kubectl if available."""
-    if shutil.which("kubectl") is None:
+async def lxd_request(method: str, path: str, progress: Any = None, **kwargs: Any) -> Any:
+    """Send a request to the LXD API and return the response metadata.
+
+    Asynchronous LXD operations are awaited until they finish, see lxd_wait
+    for ``progress``. Errors are raised as HTTPException with the LXD error
+    message as detail.
+    """
+    try:
+        response = await lxd_client().request(method, path, **kwargs)
+        data = response.json()
+    except (httpx.HTTPError, ValueError) as exc:
+        raise HTTPException(status_code=503, detail=f"lxd unavailable: {exc}")
+    if data.get("type") == "error":
+        status = 404 if data.get("error_code") == 404 else 400
+        raise HTTPException(status_code=status, detail=data.get("error") or "lxd request failed")
+    if data.get("type") == "async":
+        return await lxd_wait(data["operation"], progress)
+    return data.get("metadata")
+
+
+async def lxd_wait(operation: str, progress: Any = None) -> dict:
+    """Wait for an LXD operation to finish and return its metadata.
+
+    While the operation runs, ``progress`` is called about once a second
+    with the operation's own metadata (e.g. ``download_progress``).
+    """
+    timeout = 1 if progress else LXD_OPERATION_POLL
+    while True:
+        metadata = await lxd_request("GET", f"{operation}/wait", params={"timeout": timeout})
+        # 1xx (Running, Cancelling, Pending, ...) are not final, keep waiting.
+        # Only 200 (Success), 400 (Failure) and 401 (Cancelled) end the wait.
+        status = metadata.get("status_code") or 0
+        if status < 200:
+            if progress and status == 103:
+                progress(metadata.get("metadata") or {})
+            continue
+        if status != 200:
+            raise HTTPException(status_code=400, detail=metadata.get("err") or "lxd operation failed")
+        return metadata
+
+
+def _lxd_image_source(image: str, remote: str | None = None) -> dict:
+    """Build an image source for ``[remote:]alias`` like the lxc CLI accepts."""
+    if remote is None and ":" in image:
+        remote, image = image.split(":", 1)
+    source: dict[str, Any] = {"type": "image", "alias": image}
+    if remote and remote != "local":
+        server = LXD_REMOTES.get(remote, remote)
+        if not server.startswith("https://"):
+            raise HTTPException(status_code=400, detail=f"unknown remote: {remote}")
+        source.update({"server": server, "protocol": "simplestreams", "mode": "pull"})
+    return source
+
+
+def _lxd_path(name: str) -> str:
+    return f"/1.0/instances/{urllib.parse.quote(name, safe='')}"
+
+
+async def lxd_set_state(name: str, action: str, force: bool = False) -> None:
+    await lxd_request(
+        "PUT", f"{_lxd_path(name)}/state", json={"action": action, "timeout": 30, "force": force}
+    )
+
+
+async def lxd_launch(image: str, name: str) -> None:
+    """Create an instance from an image and start it, like ``lxc launch``."""
+    await lxd_request("POST", "/1.0/instances", json={"name": name, "source": _lxd_image_source(image)})
+    await lxd_set_state(name, "start")
+
+
+async def lxd_delete(name: str) -> None:
+    """Stop an instance if needed and delete it, like ``lxc delete --force``."""
+    instance = await lxd_request("GET", _lxd_path(name))
+    if instance.get("status", "").lower() != "stopped":
+        await lxd_set_state(name, "stop", force=True)
+    await lxd_request("DELETE", _lxd_path(name))
+
+
+async def get_lxc_containers() -> List[Container]:
+    """Return LXC/LXD instances from the LXD API if available."""
+    if not lxd_available():
         return []
     try:
-        output = subprocess.check_output(
-            ["kubectl", "get", "pods", "-A", "-o", "json"], text=True
-        ).strip()
-        data = json.loads(output)
+        data = await lxd_request("GET", "/1.0/instances", params={"recursion": "1"})
     except Exception:
         return []
 
     containers_list = []
-    for item in data.get("items", []):
-        metadata = item.get("metadata", {})
-        status = item.get("status", {})
+    for item in data or []:
+        config = item.get("config", {})
+        os_name = config.get("image.os", "")
+        release = config.get("image.release", "")
+        image = f"{os_name} {release}".strip()
         containers_list.append(
             Container(
                 id=0,
-                name=metadata.get("name", ""),
-                type="Kubernetes",
-                status=status.get("phase", "").lower(),
-                image="",
+                name=item.get("name", ""),
+                type="LXC",
+                status=item.get("status", "").lower(),
+                image=image,
                 ports=[],
                 mounts=[],
                 envs=[],
                 cpu=0.0,
                 memory=0,
-                created=metadata.get("creationTimestamp", ""),
+                created=item.get("created_at", ""),
             )
         )
     return containers_list
 
 
-def get_docker_images() -> List[str]:
-    """Return available Docker images using the docker CLI."""
-    if shutil.which("docker") is None:
+# Kubernetes pods are kept in memory by an informer: one full list followed
+# by a watch from the returned resourceVersion. The API server is reached
+# through ``kubectl proxy`` on a private unix socket so kubectl's credentials
+# are reused, or directly at K8S_API_URL when that is set.
+K8S_API_URL = os.environ.get("K8S_API_URL")
+K8S_WATCH_TIMEOUT = 300
+# Failed connections are retried after K8S_RETRY_INTERVAL seconds, doubled
+# after every further failure up to K8S_RETRY_MAX, so hosts with kubectl
+# but no cluster do not respawn the proxy every few seconds
+K8S_RETRY_INTERVAL = 30
+K8S_RETRY_MAX = 3600
+
+_k8s_pods: dict[str, dict] = {}
+_k8s_names: dict[str, int] = {}
+_k8s_synced = False
+_k8s_pod_list: List[Container] | None = None
+
+
+def _pod_to_container(pod: dict) -> Container:
+    metadata = pod.get("metadata", {})
+    status = pod.get("status", {})
+    return Container(
+        id=0,
+        name=metadata.get("name", ""),
+        type="Kubernetes",
+        status=status.get("phase", "").lower(),
+        image="",
+        ports=[],
+        mounts=[],
+        envs=[],
+        cpu=0.0,
+        memory=0,
+        created=metadata.get("creationTimestamp", ""),
+    )
+
+
+def _pod_key(pod: dict) -> str:
+    metadata = pod.get("metadata", {})
+    return f"{metadata.get('namespace', '')}/{metadata.get('name', '')}"
+
+
+def _k8s_pods_changed() -> None:
+    global _k8s_pod_list, _container_pods_stale
+    _k8s_pod_list = None
+    # Only the pods in the container snapshot are replaced, on its next use;
+    # Docker and LXC are not queried again for a pod event
+    _container_pods_stale = True
+
+
+def _k8s_put(pod: dict) -> None:
+    key = _pod_key(pod)
+    if key not in _k8s_pods:
+        name = pod.get("metadata", {}).get("name", "")
+        _k8s_names[name] = _k8s_names.get(name, 0) + 1
+        _container_index.setdefault(name, "k8s")
+    _k8s_pods[key] = pod
+
+
+def _k8s_remove(pod: dict) -> None:
+    if _k8s_pods.pop(_pod_key(pod), None) is None:
+        return
+    name = pod.get("metadata", {}).get("name", "")
+    _k8s_names[name] -= 1
+    if not _k8s_names[name]:
+        del _k8s_names[name]
+        if _container_index.get(name) == "k8s":
+            del _container_index[name]
+
+
+def k8s_pod_exists(name: str) -> bool | None:
+    """Return whether a pod with this name exists, ``None`` if unknown."""
+    if not _k8s_synced:
+        return None
+    return name in _k8s_names
+
+
+async def _get_k8s_pods_cli() -> List[Container]:
+    if shutil.which("kubectl") is None:
         return []
+    result = await run_command(["kubectl", "get", "pods", "-A", "-o", "json"], timeout=COMMAND_TIMEOUT)
     try:
-        output = subprocess.check_output(
-            ["docker", "images", "--format", "{{.Repository}}:{{.Tag}}"],
-            text=True,
-        ).strip()
+        data = json.loads(result.stdout)
     except Exception:
         return []
-    images = [line for line in output.splitlines() if line and not line.startswith("<none>")]
-    return images
+    return [_pod_to_container(item) for item in data.get("items", [])]
 
 
-def _parse_docker_size(size: str) -> float:
-    size = size.lower().strip()
-    if size.endswith("gb"):
-        try:
-            return float(size[:-2].strip()) * 1000
-        except ValueError:
-            return 0.0
-    if size.endswith("mb"):
-        try:
-            return float(size[:-2].strip())
-        except ValueError:
-            return 0.0
-    return 0.0
+async def get_k8s_pods() -> List[Container]:
+    """Return Kubernetes pods from the informer cache.
 
+    Until the informer has completed its first list the pods are fetched
+    with kubectl as before.
+    """
+    global _k8s_pod_list
+    if not _k8s_synced:
+        return await _get_k8s_pods_cli()
+    if _k8s_pod_list is None:
+        _k8s_pod_list = [_pod_to_container(pod) for pod in _k8s_pods.values()]
+    return _k8s_pod_list
+
+
+async def _k8s_list(client: httpx.AsyncClient) -> str:
+    """Replace the pod cache with a full listing and return its resourceVersion."""
+    global _k8s_synced
+    pods: list[dict] = []
+    params: dict[str, Any] = {"limit": 500}
+    while True:
+        response = await client.get("/api/v1/pods", params=params)
+        response.raise_for_status()
+        data = response.json()
+        pods.extend(data.get("items", []))
+        token = data.get("metadata", {}).get("continue")
+        if not token:
+            break
+        params["continue"] = token
+    for name in _k8s_names:
+        if _container_index.get(name) == "k8s":
+            del _container_index[name]
+    _k8s_pods.clear()
+    _k8s_names.clear()
+    for pod in pods:
+        _k8s_put(pod)
+    _k8s_synced = True
+    _k8s_pods_changed()
+    return data.get("metadata", {}).get("resourceVersion", "")
+
+
+async def _k8s_watch(client: httpx.AsyncClient, resource_version: str) -> str | None:
+    """Apply watch events to the cache.
+
+    Returns the resourceVersion to resume from, or ``None`` when the
+    version has expired and a new list is required.
+    """
+    params = {
+        "watch": "1",
+        "resourceVersion": resource_version,
+        "allowWatchBookmarks": "true",
+        "timeoutSeconds": K8S_WATCH_TIMEOUT,
+    }
+    async with client.stream(
+        "GET", "/api/v1/pods", params=params, timeout=httpx.Timeout(30.0, read=K8S_WATCH_TIMEOUT + 30)
+    ) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if not line.strip():
+                continue
+            event = json.loads(line)
+            kind = event.get("type")
+            obj = event.get("object", {})
+            if kind == "ERROR":
+                # 410 Gone: the resourceVersion is too old to resume from
+                return None if obj.get("code") == 410 else resource_version
+            resource_version = obj.get("metadata", {}).get("resourceVersion", resource_version)
+            if kind == "BOOKMARK":
+                continue
+            if kind == "DELETED":
+                _k8s_remove(obj)
+            else:
+                _k8s_put(obj)
+            _k8s_pods_changed()
+    return resource_version
 
-def get_docker_image_details() -> List[ContainerImageInfo]:
-    if shutil.which("docker") is None:
+
+async def _start_kubectl_proxy(path: str) -> asyncio.subprocess.Process:
+    if os.path.exists(path):
+        os.remove(path)
+    process = await asyncio.create_subprocess_exec(
+        "kubectl", "proxy", f"--unix-socket={path}",
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.DEVNULL,
+    )
+    for _ in range(100):
+        if os.path.exists(path) or process.returncode is not None:
+            break
+        await asyncio.sleep(0.1)
+    return process
+
+
+async def watch_k8s_pods() -> None:
+    """Run the pod informer for the lifetime of the service."""
+    global _k8s_synced
+    if not K8S_API_URL and shutil.which("kubectl") is None:
+        return
+    proxy_dir = tempfile.mkdtemp(prefix="upservx-k8s-")
+    proxy_socket = os.path.join(proxy_dir, "proxy.sock")
+    process: asyncio.subprocess.Process | None = None
+    delay = K8S_RETRY_INTERVAL
+    try:
+        while True:
+            if K8S_API_URL:
+                client = httpx.AsyncClient(base_url=K8S_API_URL, timeout=30.0)
+            else:
+                if process is None or process.returncode is not None:
+                    process = await _start_kubectl_proxy(proxy_socket)
+                client = httpx.AsyncClient(
+                    transport=httpx.AsyncHTTPTransport(uds=proxy_socket),
+                    base_url="http://kubernetes",
+                    timeout=30.0,
+                )
+            try:
+                async with client:
+                    resource_version = await _k8s_list(client)
+                    delay = K8S_RETRY_INTERVAL
+                    while resource_version is not None:
+                        resource_version = await _k8s_watch(client, resource_version)
+                continue
+            except (httpx.HTTPError, ValueError):
+                _k8s_synced = False
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, K8S_RETRY_MAX)
+    finally:
+        if process is not None and process.returncode is None:
+            process.kill()
+            await process.wait()
+        shutil.rmtree(proxy_dir, ignore_errors=True)
+
+
+async def get_docker_images() -> List[str]:
+    """Return available Docker images from the Engine API."""
+    if not docker_available():
         return []
     try:
-        output = subprocess.check_output(
-            [
-                "docker",
-                "images",
-                "--format",
-                "{{.Repository}}||{{.Tag}}||{{.ID}}||{{.Size}}||{{.CreatedSince}}",
-            ],
-            text=True,
-        ).strip()
+        data = (await docker_request("GET", "/images/json")).json()
+    except Exception:
+        return []
+    return [
+        tag
+        for img in data
+        for tag in img.get("RepoTags") or []
+        if not tag.startswith("<none>")
+    ]
+
+
+async def get_docker_image_details() -> List[ContainerImageInfo]:
+    if not docker_available():
+        return []
+    try:
+        data = (await docker_request("GET", "/images/json")).json()
     except Exception:
         return []
     images: List[ContainerImageInfo] = []
-    for idx, line in enumerate(output.splitlines(), start=1):
-        parts = line.split("||")
-        if len(parts) != 5:
-            continue
-        repo, tag, image_id, size, created = parts
-        images.append(
-            ContainerImageInfo(
-                id=idx,
-                repository=repo,
-                tag=tag,
-                imageId=image_id,
-                size=_parse_docker_size(size),
-                created=created,
-                used=True,
-                pulls=0,
+    for img in data:
+        image_id = img.get("Id", "").split(":", 1)[-1][:12]
+        for ref in img.get("RepoTags") or ["<none>:<none>"]:
+            repo, _, tag = ref.rpartition(":")
+            images.append(
+                ContainerImageInfo(
+                    id=len(images) + 1,
+                    repository=repo,
+                    tag=tag,
+                    imageId=image_id,
+                    size=round(img.get("Size", 0) / 1000 ** 2, 1),
+                    created=_format_since(img.get("Created", 0)),
+                    used=True,
+                    pulls=0,
+                )
             )
-        )
     return images
 
 
-def get_lxc_image_details() -> List[ContainerImageInfo]:
-    if shutil.which("lxc") is None:
+async def _lxd_images() -> list[dict]:
+    if not lxd_available():
         return []
     try:
-        output = subprocess.check_output(["lxc", "image", "list", "--format", "json"], text=True).strip()
-        data = json.loads(output)
+        return await lxd_request("GET", "/1.0/images", params={"recursion": "1"}) or []
     except Exception:
         return []
+
+
+async def get_lxc_image_details() -> List[ContainerImageInfo]:
     images: List[ContainerImageInfo] = []
-    for idx, img in enumerate(data, start=1):
+    for idx, img in enumerate(await _lxd_images(), start=1):
         alias = ""
         aliases = img.get("aliases", [])
         if aliases:
@@ -787,18 +2164,10 @@ def get_lxc_image_details() -> List[ContainerImageInfo]:
     return images
 
 
-def get_lxc_images() -> List[str]:
-    """Return available LXC images using the lxc CLI."""
-    if shutil.which("lxc") is None:
-        return []
-    try:
-        output = subprocess.check_output(["lxc", "image", "list", "--format", "json"], text=True).strip()
-        data = json.loads(output)
-    except Exception:
-        return []
-
+async def get_lxc_images() -> List[str]:
+    """Return available LXC images from the LXD API."""
     images = []
-    for img in data:
+    for img in await _lxd_images():
         aliases = img.get("aliases", [])
         if aliases:
             images.append(aliases[0].get("name", ""))
@@ -815,37 +2184,193 @@ def guess_iso_info(filename: str) -> tuple[str, str, str]:
     return typ, version, arch
 
 
+# Metadata of the files in ISO_DIR is kept in isos.json. Entries are keyed by
+# file name and only trusted while the inode, mtime and size of the file still
+# match, so a listing reads only files that were added or changed. Checksums
+# of files that did not arrive through the API are computed by a background
+# thread and show up in a later listing.
+ISO_CATALOG_FILE = os.path.join(os.path.dirname(__file__), "isos.json")
+ISO_HASH_BLOCK = 4 * 1024 * 1024
+
+_iso_catalog: dict[str, dict] | None = None
+_iso_catalog_lock = threading.Lock()
+_iso_hash_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="iso-hash")
+_iso_hashing: set[str] = set()
+
+
+def read_iso_label(path: str) -> str | None:
+    """Return the volume identifier of the ISO9660 primary volume descriptor."""
+    try:
+        with open(path, "rb") as f:
+            f.seek(16 * 2048)
+            descriptor = f.read(2048)
+    except OSError:
+        return None
+    if descriptor[:6] != b"\x01CD001":
+        return None
+    return descriptor[40:72].decode("ascii", errors="replace").strip() or None
+
+
+def hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(ISO_HASH_BLOCK)
+            if not block:
+                break
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _stat_key(stat: os.stat_result) -> list[int]:
+    return [stat.st_ino, stat.st_mtime_ns, stat.st_size]
+
+
+def _load_iso_catalog() -> dict[str, dict]:
+    global _iso_catalog
+    if _iso_catalog is None:
+        try:
+            with open(ISO_CATALOG_FILE) as f:
+                _iso_catalog = json.load(f)
+        except Exception:
+            _iso_catalog = {}
+    return _iso_catalog
+
+
+def _save_iso_catalog() -> None:
+    tmp = ISO_CATALOG_FILE + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(_iso_catalog, f)
+    os.replace(tmp, ISO_CATALOG_FILE)
+
+
+def _iso_entry(catalog: dict[str, dict], name: str, stat: os.stat_result) -> tuple[dict, bool]:
+    """Return the catalog entry of ``name`` and whether it had to be rebuilt."""
+    key = _stat_key(stat)
+    entry = catalog.get(name)
+    if entry and entry["key"] == key:
+        return entry, False
+    # Hard links share the inode, so their metadata can be copied
+    entry = next((dict(e) for e in catalog.values() if e["key"] == key), None)
+    if entry is None:
+        entry = {"key": key, "label": read_iso_label(os.path.join(ISO_DIR, name)), "sha256": None}
+    catalog[name] = entry
+    return entry, True
+
+
+def _hash_iso(name: str, key: list[int]) -> None:
+    path = os.path.join(ISO_DIR, name)
+    try:
+        sha256 = hash_file(path)
+        current = _stat_key(os.stat(path))
+    except OSError:
+        sha256 = None
+    with _iso_catalog_lock:
+        _iso_hashing.discard(name)
+        entry = _load_iso_catalog().get(name)
+        # A file that changed while it was hashed is hashed again on the next listing
+        if sha256 and entry and entry["key"] == key == current:
+            entry["sha256"] = sha256
+            _save_iso_catalog()
+
+
+def _iso_references() -> dict[str, int]:
+    """Return how many VMs use each ISO."""
+    counts: dict[str, int] = {}
+    for vm in load_vms():
+        counts[vm.iso] = counts.get(vm.iso, 0) + 1
+    return counts
+
+
+def _iso_model(idx: int, name: str, stat: os.stat_result, entry: dict, references: int) -> ISOInfo:
+    typ, version, arch = guess_iso_info(name)
+    return ISOInfo(
+        id=idx,
+        name=name,
+        size=round(stat.st_size / (1024 ** 3), 1),
+        type=typ,
+        version=version,
+        architecture=arch,
+        created=datetime.fromtimestamp(stat.st_mtime).date().isoformat(),
+        used=references > 0,
+        path=os.path.join(ISO_DIR, name),
+        sha256=entry["sha256"],
+        label=entry["label"],
+        references=references,
+    )
+
+
 def get_iso_files() -> List[ISOInfo]:
     files: List[ISOInfo] = []
     if not os.path.isdir(ISO_DIR):
         return files
-    for idx, name in enumerate(sorted(os.listdir(ISO_DIR)), start=1):
-        if not name.lower().endswith(".iso"):
-            continue
-        path = os.path.join(ISO_DIR, name)
-        try:
-            stat = os.stat(path)
-        except FileNotFoundError:
-            continue
-        size = round(stat.st_size / (1024 ** 3), 1)
-        created = datetime.fromtimestamp(stat.st_mtime).date().isoformat()
-        typ, version, arch = guess_iso_info(name)
-        files.append(
-            ISOInfo(
-                id=idx,
-                name=name,
-                size=size,
-                type=typ,
-                version=version,
-                architecture=arch,
-                created=created,
-                used=False,
-                path=path,
-            )
-        )
+    references = _iso_references()
+    with _iso_catalog_lock:
+        catalog = _load_iso_catalog()
+        changed = False
+        seen: set[str] = set()
+        for idx, name in enumerate(sorted(os.listdir(ISO_DIR)), start=1):
+            if not name.lower().endswith(".iso"):
+                continue
+            try:
+                stat = os.stat(os.path.join(ISO_DIR, name))
+            except FileNotFoundError:
+                continue
+            entry, rebuilt = _iso_entry(catalog, name, stat)
+            changed |= rebuilt
+            seen.add(name)
+            if entry["sha256"] is None and name not in _iso_hashing:
+                _iso_hashing.add(name)
+                _iso_hash_executor.submit(_hash_iso, name, entry["key"])
+            files.append(_iso_model(idx, name, stat, entry, references.get(name, 0)))
+        for name in catalog.keys() - seen:
+            del catalog[name]
+            changed = True
+        if changed:
+            _save_iso_catalog()
     return files
 
 
+def install_iso(src: str, filename: str, sha256: str) -> dict:
+    """Move ``src`` into ISO_DIR as ``filename`` and add it to the catalog.
+
+    When the catalog already holds a file with the same content, ``filename``
+    becomes a hard link to that file and ``src`` is removed.
+    """
+    dest = os.path.join(ISO_DIR, filename)
+    size = os.stat(src).st_size
+    with _iso_catalog_lock:
+        catalog = _load_iso_catalog()
+        duplicate = None
+        for name, entry in catalog.items():
+            if entry["sha256"] != sha256 or entry["key"][2] != size:
+                continue
+            path = os.path.join(ISO_DIR, name)
+            try:
+                if _stat_key(os.stat(path)) == entry["key"]:
+                    duplicate = path
+                    break
+            except OSError:
+                continue
+        if duplicate:
+            print(f"{filename} duplicates {os.path.basename(duplicate)}, linking")
+            if not (os.path.exists(dest) and os.path.samefile(duplicate, dest)):
+                link = os.path.join(ISO_DIR, f".link-{secrets.token_hex(8)}")
+                os.link(duplicate, link)
+                os.replace(link, dest)
+            if src != dest:
+                os.remove(src)
+        else:
+            os.chmod(src, 0o644)
+            os.replace(src, dest)
+        stat = os.stat(dest)
+        entry = {"key": _stat_key(stat), "label": read_iso_label(dest), "sha256": sha256}
+        catalog[filename] = entry
+        _save_iso_catalog()
+    references = _iso_references().get(filename, 0)
+    return _iso_model(0, filename, stat, entry, references).dict()
+
+
 def _drive_type(dev: str) -> str:
     """Return the type for a device or partition."""
     name = os.path.basename(dev)
@@ -873,128 +2398,423 @@ def _drive_type(dev: str) -> str:
     return "HDD"
 
 
-def get_zfs_pools() -> List[ZFSPoolInfo]:
-    """Return a list of ZFS pools with their member devices and usage."""
+# Pool status is read from "zpool status -j" where OpenZFS supports JSON
+# output and from the text of "zpool status -P -p" otherwise. Both are
+# turned into the same vdev tree. The result is cached for ZFS_CACHE_TTL
+# seconds and invalidated when a pool is created through the API.
+ZFS_CACHE_TTL = 5.0
+# Vdev classes that "zpool status" lists after the pool's data vdevs. Special
+# and dedup vdevs hold pool data and are kept with the data vdevs.
+ZFS_VDEV_CLASSES = {
+    "logs": "logs",
+    "cache": "cache",
+    "l2cache": "cache",
+    "spares": "spares",
+    "special": "vdevs",
+    "dedup": "vdevs",
+}
+
+_zfs_cache: tuple[float, list[ZFSPoolInfo]] | None = None
+
+
+def invalidate_zfs() -> None:
+    global _zfs_cache
+    _zfs_cache = None
+
+
+def _vdev_type(name: str) -> str:
+    # dRAID distributed spares are named draid<parity>-<vdev>-<spare>
+    if re.match(r"draid\d-\d+-\d+$", name):
+        return "dspare"
+    match = re.match(r"(mirror|raidz\d?|draid\d?|replacing|spare|indirect)(?::\S*)?-\d+$", name)
+    if match:
+        return match.group(1)
+    # Leaves are shown by path with -P, missing ones by their GUID
+    return "file" if name.startswith("/") and not name.startswith("/dev/") else "disk"
+
+
+def _vdev_from_json(data: dict) -> dict:
+    children = data.get("vdevs") or {}
+    return {
+        "name": data.get("path") or data.get("name", ""),
+        "type": data.get("vdev_type", ""),
+        "state": data.get("state", ""),
+        "read": int(data.get("read_errors", 0)),
+        "write": int(data.get("write_errors", 0)),
+        "checksum": int(data.get("checksum_errors", 0)),
+        "note": "",
+        "children": [_vdev_from_json(child) for child in children.values()],
+    }
+
+
+def _zfs_time(value: Any) -> str:
+    # Not pinned down by a captured output: take epoch seconds or text as is
+    if isinstance(value, int) or str(value).isdigit():
+        return time.ctime(int(value))
+    return str(value)
+
+
+def _scan_from_json(stats: dict | None) -> str:
+    if not stats or stats.get("function") in (None, "NONE"):
+        return ""
+    function = str(stats["function"]).lower()
+    state = str(stats.get("state", "")).lower()
+    if state == "scanning":
+        total = int(stats.get("to_examine", 0) or 0)
+        done = int(stats.get("issued", 0) or stats.get("examined", 0) or 0)
+        percent = done * 100 / total if total else 0
+        text = f"{function} in progress"
+        if stats.get("start_time"):
+            text += f" since {_zfs_time(stats['start_time'])}"
+        return f"{text}, {percent:.2f}% done"
+    text = f"{function} {state} with {stats.get('errors', 0)} errors"
+    if stats.get("end_time"):
+        text += f" on {_zfs_time(stats['end_time'])}"
+    return text
+
+
+def parse_zpool_status_json(output: str) -> list[dict]:
+    """Parse the output of "zpool status -j --json-int" into pool dicts."""
+    pools: list[dict] = []
+    for name, data in (json.loads(output).get("pools") or {}).items():
+        root = (data.get("vdevs") or {}).get(name) or {}
+        pool = {
+            "name": name,
+            "state": data.get("state", ""),
+            "status": data.get("status", ""),
+            "errors": f"{data['error_count']} data errors" if int(data.get("error_count", 0)) else "No known data errors",
+            "scan": _scan_from_json(data.get("scan_stats")),
+            "vdevs": [_vdev_from_json(v) for v in (root.get("vdevs") or {}).values()],
+            "logs": [],
+            "cache": [],
+            "spares": [],
+        }
+        for key, section in ZFS_VDEV_CLASSES.items():
+            pool[section].extend(_vdev_from_json(v) for v in (data.get(key) or {}).values())
+        pools.append(pool)
+    return pools
+
+
+def parse_zpool_status(output: str) -> list[dict]:
+    """Parse the text of "zpool status -P -p" into pool dicts.
+
+    The vdev tree is rebuilt from the indentation of the config section,
+    two spaces per level below the pool (or class) line.
+    """
+    pools: list[dict] = []
+    pool: dict | None = None
+    field = ""
+    stack: list[tuple[int, list]] = []
+    for line in output.splitlines():
+        header = re.match(r"\s*(\w+): ?(.*)$", line) if not line.startswith("\t") else None
+        if header:
+            field, value = header.group(1), header.group(2).strip()
+            if field == "pool":
+                pool = {"name": value, "state": "", "status": "", "errors": "", "scan": "",
+                        "vdevs": [], "logs": [], "cache": [], "spares": []}
+                pools.append(pool)
+            elif pool is not None and field in ("state", "status", "errors", "scan"):
+                pool[field] = value
+            continue
+        if pool is None or not line.strip():
+            continue
+        if field != "config":
+            # Continuation of a multi-line status or scan message
+            if field in ("status", "scan"):
+                pool[field] = f"{pool[field]} {line.strip()}".strip()
+            continue
+        text = line.lstrip("\t")
+        parts = text.split()
+        if parts[0] == "NAME":
+            continue
+        depth = (len(text) - len(text.lstrip(" "))) // 2
+        if depth == 0:
+            section = ZFS_VDEV_CLASSES.get(parts[0], "vdevs")
+            stack = [(0, pool[section])]
+            continue
+        # Spares have no counters, and notes such as "was /dev/sdb1" or
+        # "(resilvering)" may follow
+        rest = parts[2:]
+        has_counters = len(rest) >= 3 and all(p.isdigit() for p in rest[:3])
+        counters = [int(p) for p in rest[:3]] if has_counters else [0, 0, 0]
+        vdev = {
+            "name": parts[0],
+            "type": _vdev_type(parts[0]),
+            "state": parts[1] if len(parts) > 1 else "",
+            "read": counters[0],
+            "write": counters[1],
+            "checksum": counters[2],
+            "note": " ".join(rest[3:] if has_counters else rest),
+            "children": [],
+        }
+        while stack and stack[-1][0] >= depth:
+            stack.pop()
+        if not stack:
+            continue
+        stack[-1][1].append(vdev)
+        stack.append((depth, vdev["children"]))
+    return pools
+
+
+def _zfs_leaves(vdevs: list[dict]) -> list[dict]:
+    leaves: list[dict] = []
+    for vdev in vdevs:
+        leaves.extend(_zfs_leaves(vdev["children"]) if vdev["children"] else [vdev])
+    return leaves
+
+
+async def get_zfs_pools() -> List[ZFSPoolInfo]:
+    """Return a list of ZFS pools with their vdev tree, health and usage."""
+    global _zfs_cache
     if shutil.which("zpool") is None:
         return []
+    if _zfs_cache and _zfs_cache[0] > time.monotonic():
+        return _zfs_cache[1]
+
+    usage, zfs_res, status = await asyncio.gather(
+        run_command(
+            ["zpool", "get", "-H", "-p", "-o", "name,property,value", "size,allocated,free"], timeout=COMMAND_TIMEOUT
+        ),
+        run_command(["zfs", "list", "-H", "-d", "0", "-o", "name,mountpoint"], timeout=COMMAND_TIMEOUT),
+        run_command(["zpool", "status", "-j", "--json-int", "-P"], timeout=COMMAND_TIMEOUT),
+    )
+    try:
+        parsed = parse_zpool_status_json(status.stdout) if status.returncode == 0 else None
+    except (ValueError, AttributeError):
+        parsed = None
+    if parsed is None:
+        # zpool without JSON output rejects -j
+        status = await run_command(["zpool", "status", "-P", "-p"], timeout=COMMAND_TIMEOUT)
+        if status.returncode != 0:
+            return []
+        parsed = parse_zpool_status(status.stdout)
 
     size_info: dict[str, dict[str, int]] = {}
-    result = subprocess.run(
-        ["zpool", "list", "-H", "-p", "-o", "name,size,alloc,free"],
-        capture_output=True,
-        text=True,
-    )
-    if result.returncode == 0:
-        for line in result.stdout.splitlines():
-            parts = line.split()
-            if len(parts) >= 4:
-                name, size, alloc, free = parts[:4]
-                size_info[name] = {
-                    "size": int(size),
-                    "used": int(alloc),
-                    "available": int(free),
-                }
+    if usage.returncode == 0:
+        for line in usage.stdout.splitlines():
+            parts = line.split("\t")
+            if len(parts) >= 3 and parts[2].isdigit():
+                size_info.setdefault(parts[0], {})[parts[1]] = int(parts[2])
 
     mountpoints: dict[str, str] = {}
-    zfs_res = subprocess.run(
-        ["zfs", "list", "-H", "-o", "name,mountpoint"],
-        capture_output=True,
-        text=True,
-    )
     if zfs_res.returncode == 0:
         for line in zfs_res.stdout.splitlines():
             try:
                 name, mnt = line.split("\t")
             except ValueError:
                 continue
-            if "/" not in name:
-                mountpoints[name] = mnt
-
-    status = subprocess.run(["zpool", "status"], capture_output=True, text=True)
-    if status.returncode != 0:
-        return []
+            mountpoints[name] = mnt
 
     pools: List[ZFSPoolInfo] = []
-    lines = status.stdout.splitlines()
-    pool: dict | None = None
-    in_config = False
-    for line in lines:
-        if line.startswith("  pool:"):
-            if pool:
-                pools.append(ZFSPoolInfo(**pool))
-            name = line.split()[1]
-            info = size_info.get(name, {"size": 0, "used": 0, "available": 0})
-            pool = {
-                "name": name,
-                "devices": [],
-                "type": "stripe",
-                "size": round(info["size"] / (1024 ** 3)),
-                "used": round(info["used"] / (1024 ** 3)),
-                "available": round(info["available"] / (1024 ** 3)),
-                "mountpoint": mountpoints.get(name, ""),
-            }
-            in_config = False
-        elif pool and line.startswith(" state:"):
-            pass
-        elif pool and line.startswith("config:"):
-            in_config = True
-        elif pool and in_config:
-            stripped = line.strip()
-            if not stripped or stripped.startswith("NAME"):
-                continue
-            parts = stripped.split()
-            token = parts[0]
-            state = parts[1] if len(parts) > 1 else ""
-            if token == pool["name"]:
-                continue
-            if token.startswith("mirror") or token.startswith("raidz"):
-                pool["type"] = token.split("-")[0]
-                continue
-            device = token
-            if not token.startswith("/"):
-                device = f"/dev/{token}"
-            pool["devices"].append({"path": device, "status": state})
-        if pool and line.startswith("errors:"):
-            pass
-    if pool:
-        pools.append(ZFSPoolInfo(**pool))
+    for pool in parsed:
+        info = size_info.get(pool["name"], {})
+        types = [v["type"] for v in pool["vdevs"] if v["children"]]
+        leaves = _zfs_leaves(pool["vdevs"] + pool["logs"] + pool["cache"] + pool["spares"])
+        pools.append(
+            ZFSPoolInfo(
+                **pool,
+                type=types[0] if types else "stripe",
+                size=round(info.get("size", 0) / (1024 ** 3)),
+                used=round(info.get("allocated", 0) / (1024 ** 3)),
+                available=round(info.get("free", 0) / (1024 ** 3)),
+                mountpoint=mountpoints.get(pool["name"], ""),
+                devices=[
+                    {"path": v["name"] if v["name"].startswith("/") else f"/dev/{v['name']}", "status": v["state"]}
+                    for v in leaves
+                ],
+            )
+        )
+    _zfs_cache = (time.monotonic() + ZFS_CACHE_TTL, pools)
     return pools
 
 
-def get_drives() -> List[DriveInfo]:
-    """Return information for all physical drives including unmounted ones."""
-    drives: List[DriveInfo] = []
+# The drive inventory is built from /sys/block, the udev database and
+# /proc/self/mountinfo without running any command. It is cached until the
+# kernel reports a block device uevent on a NETLINK_KOBJECT_UEVENT socket or
+# the mount table changes. udev updates its database shortly after the
+# kernel event, so the cache is dropped once more DRIVES_SETTLE_DELAY seconds
+# later. Without those notifications the cache expires after DRIVES_CACHE_TTL
+# seconds. Every invalidation bumps a generation counter, and a scan only
+# fills the cache if none happened while it ran.
+DRIVES_CACHE_TTL = 5.0
+DRIVES_SETTLE_DELAY = 2.0
+_NETLINK_KOBJECT_UEVENT = 15
+_SKIPPED_BLOCK_DEVICES = ("loop", "ram", "sr", "dm-", "md")
+
+_drives_cache: tuple[float, list[dict]] | None = None
+_drives_generation = 0
+_drive_watch: tuple[socket.socket, Any, int] | None = None
+
+
+def invalidate_drives() -> None:
+    global _drives_cache, _drives_generation
+    _drives_cache = None
+    _drives_generation += 1
+
+
+def _read_sysfs(path: str) -> str:
     try:
-        output = subprocess.check_output(
-            ["lsblk", "-b", "-J", "-o", "NAME,TYPE,SIZE,FSTYPE,MOUNTPOINT"],
-            text=True,
-        )
-        data = json.loads(output)
-    except Exception:
-        data = {"blockdevices": []}
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return ""
 
-    def add_device(node: dict) -> None:
-        if node.get("type") not in {"disk", "part"}:
-            for child in node.get("children", []):
-                add_device(child)
-            return
-        if node.get("type") == "disk" and node.get("children"):
-            for child in node.get("children", []):
-                add_device(child)
-            return
-        name = node.get("name")
-        if not name:
-            return
-        dev = f"/dev/{name}"
-        if dev.startswith("/dev/loop"):
-            return
-        mountpoint = node.get("mountpoint") or ""
+
+def _udev_properties(dev: str) -> dict[str, str] | None:
+    """Return the udev properties of a block device ("maj:min") or None."""
+    try:
+        with open(f"/run/udev/data/b{dev}") as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return None
+    return dict(line[2:].split("=", 1) for line in lines if line.startswith("E:") and "=" in line)
+
+
+def _unescape_mountinfo(value: str) -> str:
+    # Spaces and other special characters are octal escapes
+    return re.sub(r"\\([0-7]{3})", lambda m: chr(int(m.group(1), 8)), value)
+
+
+def _mount_table(
+    mountinfo: str = "/proc/self/mountinfo",
+) -> tuple[dict[str, tuple[str, str]], dict[str, tuple[str, str]]]:
+    """Return the first mountpoint and file system of every mounted "maj:min".
+
+    The first mapping is keyed by the device number mountinfo reports. Btrfs
+    and other file systems on anonymous devices report "0:NN" there, so the
+    second one is keyed by the device number of the /dev node the mount
+    source resolves to.
+    """
+    mounts: dict[str, tuple[str, str]] = {}
+    sources: dict[str, tuple[str, str]] = {}
+    try:
+        with open(mountinfo) as f:
+            for line in f:
+                fields, _, rest = line.partition(" - ")
+                parts = fields.split()
+                if len(parts) < 5:
+                    continue
+                fstype, _, source = rest.partition(" ")
+                mount = (_unescape_mountinfo(parts[4]), fstype)
+                mounts.setdefault(parts[2], mount)
+                source = _unescape_mountinfo(source.split(" ", 1)[0])
+                if source.startswith("/dev/"):
+                    name = os.path.basename(os.path.realpath(source))
+                    dev = _read_sysfs(f"/sys/class/block/{name}/dev")
+                    if dev:
+                        sources.setdefault(dev, mount)
+    except OSError:
+        pass
+    return mounts, sources
+
+
+def _scan_block_devices() -> list[dict]:
+    """Return whole disks without partitions and all partitions."""
+    mounts, sources = _mount_table()
+    devices: list[dict] = []
+    try:
+        disks = sorted(os.listdir("/sys/block"))
+    except OSError:
+        return devices
+    for disk in disks:
+        if disk.startswith(_SKIPPED_BLOCK_DEVICES):
+            continue
+        base = os.path.join("/sys/block", disk)
         try:
-            size = int(node.get("size", 0))
-        except Exception:
-            size = 0
-        if size <= 0:
-            return
+            partitions = sorted(
+                entry for entry in os.listdir(base) if os.path.exists(os.path.join(base, entry, "partition"))
+            )
+        except OSError:
+            continue
+        paths = [os.path.join(base, part) for part in partitions] or [base]
+        for path in paths:
+            name = os.path.basename(path)
+            dev = _read_sysfs(os.path.join(path, "dev"))
+            try:
+                size = int(_read_sysfs(os.path.join(path, "size"))) * 512
+            except ValueError:
+                size = 0
+            if not dev or size <= 0:
+                continue
+            udev = _udev_properties(dev)
+            mountpoint, mount_fstype = mounts.get(dev) or sources.get(dev) or ("", "")
+            devices.append(
+                {
+                    "device": f"/dev/{name}",
+                    "name": name,
+                    "type": _drive_type(f"/dev/{name}"),
+                    "size": size,
+                    "filesystem": (udev or {}).get("ID_FS_TYPE") or mount_fstype,
+                    "mountpoint": mountpoint,
+                    "probed": udev is not None,
+                }
+            )
+    return devices
+
+
+def _on_block_uevent() -> None:
+    try:
+        message = _drive_watch[0].recv(64 * 1024)
+    except OSError:
+        return
+    if b"\0SUBSYSTEM=block\0" in message:
+        invalidate_drives()
+        asyncio.get_running_loop().call_later(DRIVES_SETTLE_DELAY, invalidate_drives)
+
+
+def _on_mounts_changed() -> None:
+    _drive_watch[1].poll(0)
+    invalidate_drives()
+
+
+def _start_drive_watch() -> None:
+    """Invalidate the drive cache on block uevents and mount table changes."""
+    global _drive_watch
+    try:
+        uevents = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, _NETLINK_KOBJECT_UEVENT)
+        uevents.bind((0, 1))
+        uevents.setblocking(False)
+    except (OSError, AttributeError):
+        return
+    # mountinfo is always readable and signals changes with POLLPRI, so it is
+    # watched by an epoll instance of its own that becomes readable on them
+    try:
+        mountinfo = os.open("/proc/self/mountinfo", os.O_RDONLY | os.O_CLOEXEC)
+        mounts = select.epoll()
+        mounts.register(mountinfo, select.EPOLLPRI)
+    except OSError:
+        uevents.close()
+        return
+    _drive_watch = (uevents, mounts, mountinfo)
+    loop = asyncio.get_running_loop()
+    loop.add_reader(uevents.fileno(), _on_block_uevent)
+    loop.add_reader(mounts.fileno(), _on_mounts_changed)
+
+
+async def _drive_inventory() -> list[dict]:
+    global _drives_cache
+    if _drive_watch is None:
+        _start_drive_watch()
+    now = time.monotonic()
+    if _drives_cache and (_drive_watch is not None or _drives_cache[0] > now):
+        return _drives_cache[1]
+    generation = _drives_generation
+    devices = await asyncio.to_thread(_scan_block_devices)
+    zfs_members = {d["device"] for d in devices if d["filesystem"] == "zfs_member"}
+    if shutil.which("zpool") and not all(d["probed"] for d in devices):
+        # Without udev data ZFS members can only be told from the pools
+        for pool in await get_zfs_pools():
+            zfs_members.update(os.path.realpath(os.path.join("/dev", dev.path)) for dev in pool.devices)
+    devices = [d for d in devices if d["device"] not in zfs_members]
+    if generation == _drives_generation:
+        _drives_cache = (now + DRIVES_CACHE_TTL, devices)
+    return devices
+
+
+def _drive_infos(devices: list[dict]) -> List[DriveInfo]:
+    drives: List[DriveInfo] = []
+    for device in devices:
+        mountpoint = device["mountpoint"]
         usage = None
         if mountpoint:
             try:
@@ -1003,33 +2823,23 @@ def get_drives() -> List[DriveInfo]:
                 pass
         drives.append(
             DriveInfo(
-                device=dev,
-                name=name,
-                type=_drive_type(dev),
-                size=round(size / (1024 ** 3)),
+                device=device["device"],
+                name=device["name"],
+                type=device["type"],
+                size=round(device["size"] / (1024 ** 3)),
                 used=round((usage.used if usage else 0) / (1024 ** 3)),
                 available=round((usage.free if usage else 0) / (1024 ** 3)),
-                filesystem=node.get("fstype") or "",
+                filesystem=device["filesystem"],
                 mountpoint=mountpoint,
                 mounted=bool(mountpoint),
             )
         )
-        for child in node.get("children", []):
-            add_device(child)
-
-    for dev in data.get("blockdevices", []):
-        add_device(dev)
+    return drives
 
-    # Remove devices that are part of ZFS pools
-    for pool in get_zfs_pools():
-        for dev in pool.devices:
-            drives = [d for d in drives if d.device != dev.path]
 
-    unique = {}
-    for d in drives:
-        if d.device not in unique:
-            unique[d.device] = d
-    return list(unique.values())
+async def get_drives() -> List[DriveInfo]:
+    """Return information for all physical drives including unmounted ones."""
+    return await asyncio.to_thread(_drive_infos, await _drive_inventory())
 
 
 def _format_bytes(num: int) -> str:
@@ -1051,11 +2861,11 @@ def _infer_iface_type(name: str) -> str:
     return "Ethernet"
 
 
-def _default_gateways() -> dict[str, str]:
+async def _default_gateways() -> dict[str, str]:
     gateways: dict[str, str] = {}
     try:
-        output = subprocess.check_output(["ip", "route", "show", "default"], text=True)
-        for line in output.splitlines():
+        result = await run_command(["ip", "route", "show", "default"], timeout=COMMAND_TIMEOUT)
+        for line in result.stdout.splitlines():
             parts = line.split()
             if not parts or parts[0] != "default":
                 continue
@@ -1069,11 +2879,11 @@ def _default_gateways() -> dict[str, str]:
     return gateways
 
 
-def get_network_interfaces() -> List[NetworkInterfaceInfo]:
+async def get_network_interfaces() -> List[NetworkInterfaceInfo]:
     addrs = psutil.net_if_addrs()
     stats = psutil.net_if_stats()
     io_counters = psutil.net_io_counters(pernic=True)
-    gateways = _default_gateways()
+    gateways = await _default_gateways()
 
     interfaces: List[NetworkInterfaceInfo] = []
     for name, addr_list in addrs.items():
@@ -1110,24 +2920,166 @@ def get_network_interfaces() -> List[NetworkInterfaceInfo]:
     return interfaces
 
 
-def find_container_type(name: str) -> str | None:
-    """Detect which container backend knows a container by this name."""
-    for c in get_docker_containers():
-        if c.name == name:
+# Maps container names to the backend owning them ("docker", "lxc" or "k8s").
+# The index is rebuilt from every backend listing and kept current by the
+# Docker and LXC event streams. Names missing from it are resolved with a
+# single-object probe per backend.
+_container_index: dict[str, str] = {}
+
+
+def index_containers(found: List[Container]) -> None:
+    """Rebuild the name index from a full listing of all backends."""
+    global _container_index
+    backend_types = {"Docker": "docker", "LXC": "lxc", "Kubernetes": "k8s"}
+    index: dict[str, str] = {}
+    # Earlier backends win on name clashes, as in the original lookup order
+    for c in reversed(found):
+        ctype = backend_types.get(c.type)
+        if ctype:
+            index[c.name] = ctype
+    _container_index = index
+
+
+async def _probe_container_type(name: str) -> str | None:
+    """Ask each backend directly whether it knows a container by this name."""
+    if docker_available():
+        try:
+            await docker_request("GET", f"/containers/{urllib.parse.quote(name, safe='')}/json")
             return "docker"
-    for c in get_lxc_containers():
-        if c.name == name:
+        except HTTPException:
+            pass
+    if lxd_available():
+        try:
+            await lxd_request("GET", _lxd_path(name))
             return "lxc"
-    for c in get_k8s_pods():
-        if c.name == name:
-            return "k8s"
+        except HTTPException:
+            pass
+    exists = k8s_pod_exists(name)
+    if exists is not None:
+        return "k8s" if exists else None
+    if shutil.which("kubectl") is None:
+        return None
+    cmd = ["kubectl", "get", "pods", "-A", "--field-selector", f"metadata.name={name}", "-o", "name"]
+    try:
+        result = await run_command(cmd, timeout=COMMAND_TIMEOUT)
+    except HTTPException:
+        return None
+    if result.returncode == 0 and result.stdout.strip():
+        return "k8s"
+    return None
+
+
+async def find_container_type(name: str) -> str | None:
+    """Detect which container backend knows a container by this name."""
+    ctype = _container_index.get(name)
+    if ctype:
+        return ctype
     for c in containers:
         if c.name == name:
             return "api"
-    return None
+    ctype = await _probe_container_type(name)
+    if ctype:
+        _container_index[name] = ctype
+    return ctype
+
+
+async def _watch_events(cmd: list[str], handle: Any) -> None:
+    """Run a long-lived event command and pass each output line to ``handle``.
+
+    The command is restarted after a short delay whenever it exits.
+    """
+    while True:
+        if shutil.which(cmd[0]) is None:
+            return
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL,
+            )
+        except Exception:
+            return
+        try:
+            async for line in process.stdout:
+                try:
+                    handle(json.loads(line))
+                except Exception:
+                    continue
+        finally:
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+        await asyncio.sleep(10)
+
+
+def _handle_docker_event(event: dict) -> None:
+    action = event.get("Action") or event.get("status") or ""
+    attributes = event.get("Actor", {}).get("Attributes", {})
+    name = attributes.get("name")
+    if not name:
+        return
+    if action == "create":
+        _container_index.setdefault(name, "docker")
+    elif action == "destroy":
+        if _container_index.get(name) == "docker":
+            del _container_index[name]
+    elif action == "rename":
+        old = attributes.get("oldName", "").lstrip("/")
+        if _container_index.get(old) == "docker":
+            del _container_index[old]
+        _container_index.setdefault(name, "docker")
+    invalidate_containers()
+
+
+def _handle_lxc_event(event: dict) -> None:
+    metadata = event.get("metadata", {})
+    action = metadata.get("action", "")
+    if not action.startswith(("instance-", "container-")):
+        return
+    name = os.path.basename(metadata.get("source", ""))
+    if not name:
+        return
+    if action.endswith("-created"):
+        _container_index.setdefault(name, "lxc")
+    elif action.endswith("-deleted"):
+        if _container_index.get(name) == "lxc":
+            del _container_index[name]
+    elif action.endswith("-renamed"):
+        old = metadata.get("context", {}).get("old_name", "")
+        if _container_index.get(old) == "lxc":
+            del _container_index[old]
+        _container_index.setdefault(name, "lxc")
+    invalidate_containers()
+
+
+async def watch_docker_events() -> None:
+    """Follow the Engine API event stream, reconnecting when it drops."""
+    params = {"filters": json.dumps({"type": ["container"]})}
+    while True:
+        if docker_available():
+            try:
+                async with docker_client().stream(
+                    "GET", "/events", params=params, timeout=httpx.Timeout(60.0, read=None)
+                ) as response:
+                    async for line in response.aiter_lines():
+                        try:
+                            _handle_docker_event(json.loads(line))
+                        except Exception:
+                            continue
+            except httpx.HTTPError:
+                pass
+        await asyncio.sleep(10)
+
+
+async def watch_lxc_events() -> None:
+    await _watch_events(
+        ["lxc", "monitor", "--type", "lifecycle", "--format", "json"],
+        _handle_lxc_event,
+    )
 
 
-def collect_metrics() -> dict:
+def _host_metrics() -> dict:
+    """Collect the psutil and /proc based metrics, which block on file IO."""
     cpu_percent = psutil.cpu_percent(interval=None)
     cpu_count = psutil.cpu_count(logical=False) or psutil.cpu_count()
     virt = psutil.virtual_memory()
@@ -1144,24 +3096,6 @@ def collect_metrics() -> dict:
     _prev_net_io = net
     _prev_net_time = now
     uptime_seconds = time.time() - psutil.boot_time()
-
-    services_info = [
-        {"name": "Docker", "service": "docker", "port": 2376},
-        {"name": "Kubernetes", "service": "k3s", "port": 6443},
-        {"name": "LXC", "service": "lxd", "port": None},
-        {"name": "SSH", "service": "sshd", "port": _system_ssh_port()},
-        {"name": "ZFS", "service": "zfs", "port": None},
-    ]
-
-    services = [
-        {
-            "name": s["name"],
-            "status": get_service_status(s["service"]),
-            "port": s["port"],
-        }
-        for s in services_info
-    ]
-
     return {
         "cpu": {
             "usage": cpu_percent,
@@ -1182,45 +3116,229 @@ def collect_metrics() -> dict:
             "in": round(in_rate / (1024 ** 2), 2),
             "out": round(out_rate / (1024 ** 2), 2),
         },
-        "gpu": get_gpu_model(),
         "uptime": format_uptime(uptime_seconds),
         "kernel": platform.release(),
         "architecture": platform.machine(),
+        "ssh_port": _system_ssh_port(),
+    }
+
+
+async def collect_metrics() -> dict:
+    metrics = await asyncio.to_thread(_host_metrics)
+    services_info = [
+        {"name": "Docker", "service": "docker", "port": 2376},
+        {"name": "Kubernetes", "service": "k3s", "port": 6443},
+        {"name": "LXC", "service": "lxd", "port": None},
+        {"name": "SSH", "service": "sshd", "port": metrics.pop("ssh_port")},
+        {"name": "ZFS", "service": "zfs", "port": None},
+    ]
+
+    statuses = await get_service_statuses([s["service"] for s in services_info])
+    services = [
+        {
+            "name": s["name"],
+            "status": statuses[s["service"]],
+            "port": s["port"],
+        }
+        for s in services_info
+    ]
+
+    return {
+        "cpu": metrics["cpu"],
+        "memory": metrics["memory"],
+        "storage": metrics["storage"],
+        "network": metrics["network"],
+        "gpu": await get_gpu_model(),
+        "uptime": metrics["uptime"],
+        "kernel": metrics["kernel"],
+        "architecture": metrics["architecture"],
         "services": services,
     }
 
 
+# Interval in seconds between two metric samples and the number of samples
+# kept in memory (one hour at the default interval).
+METRICS_INTERVAL = 4.0
+METRICS_HISTORY_SIZE = 900
+
+_metrics_history: deque[dict] = deque(maxlen=METRICS_HISTORY_SIZE)
+# One single-slot queue per connected /metrics/stream client
+_metrics_subscribers: set[asyncio.Queue] = set()
+
+
+def publish_metrics(sample: dict) -> None:
+    """Hand a new sample to all stream subscribers, dropping stale ones."""
+    for queue in _metrics_subscribers:
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(sample)
+
+
+def metrics_delta(old: dict, new: dict) -> dict:
+    """Return the fields of ``new`` that differ from ``old``.
+
+    Nested dicts are compared recursively, all other values (including the
+    services list) are replaced as a whole.
+    """
+    delta: dict = {}
+    for key, value in new.items():
+        prev = old.get(key)
+        if isinstance(value, dict) and isinstance(prev, dict):
+            nested = metrics_delta(prev, value)
+            if nested:
+                delta[key] = nested
+        elif value != prev:
+            delta[key] = value
+    return delta
+
+
+async def metrics_sampler() -> None:
+    """Collect metrics periodically into the ring buffer.
+
+    All clients are served from the buffer so the cost of collecting metrics
+    does not grow with the number of open dashboards.
+    """
+    while True:
+        try:
+            sample = await collect_metrics()
+            sample["timestamp"] = time.time()
+            _metrics_history.append(sample)
+            publish_metrics(sample)
+        except Exception as exc:
+            print("Metrics sampling failed:", exc)
+        await asyncio.sleep(METRICS_INTERVAL)
+
+
+async def latest_metrics() -> dict:
+    """Return the most recent sample, collecting one if none exists yet."""
+    if _metrics_history:
+        return _metrics_history[-1]
+    sample = await collect_metrics()
+    sample["timestamp"] = time.time()
+    _metrics_history.append(sample)
+    return sample
+
+
+# Snapshot of the containers discovered from Docker, LXC and Kubernetes. It is
+# reused for CONTAINER_CACHE_TTL seconds and dropped whenever a container is
+# created, started, stopped or deleted through the API. Pod changes from the
+# informer only mark its Kubernetes part stale.
+CONTAINER_CACHE_TTL = 3.0
+
+_container_snapshot: tuple[float, List[Container]] | None = None
+_container_refresh: asyncio.Task | None = None
+_container_pods_stale = False
+
+
+def invalidate_containers() -> None:
+    global _container_snapshot, _container_refresh
+    _container_snapshot = None
+    _container_refresh = None
+
+
+async def _refresh_containers() -> List[Container]:
+    global _container_snapshot, _container_pods_stale
+    if _container_refresh is asyncio.current_task():
+        # Pod changes from here on are applied after this refresh
+        _container_pods_stale = False
+    results = await asyncio.gather(
+        get_docker_containers(),
+        get_lxc_containers(),
+        get_k8s_pods(),
+    )
+    found = [c for backend in results for c in backend]
+    if _container_refresh is asyncio.current_task():
+        _container_snapshot = (time.monotonic() + CONTAINER_CACHE_TTL, found)
+        index_containers(found)
+    return found
+
+
+async def discover_containers() -> List[Container]:
+    """Return containers from all backends, querying them concurrently.
+
+    Concurrent callers share a single refresh so a burst of requests costs
+    one round of CLI calls.
+    """
+    global _container_refresh, _container_snapshot, _container_pods_stale
+    if _container_snapshot and _container_snapshot[0] > time.monotonic():
+        if _container_pods_stale:
+            _container_pods_stale = False
+            expires, found = _container_snapshot
+            found = [c for c in found if c.type != "Kubernetes"] + await get_k8s_pods()
+            _container_snapshot = (expires, found)
+        return _container_snapshot[1]
+    if _container_refresh is None or _container_refresh.done():
+        _container_refresh = asyncio.create_task(_refresh_containers())
+    return await asyncio.shield(_container_refresh)
+
+
 @app.get("/containers")
-def list_containers():
-    all_containers: List[Container] = []
-    all_containers.extend(get_docker_containers())
-    all_containers.extend(get_lxc_containers())
-    all_containers.extend(get_k8s_pods())
-    all_containers.extend(containers)
+async def list_containers():
+    all_containers: List[Container] = [*await discover_containers(), *containers]
 
     # Assign stable sequential ids for the response
-    for idx, c in enumerate(all_containers, start=1):
-        c.id = idx
-    return [c.dict() for c in all_containers]
+    return [{**c.dict(), "id": idx} for idx, c in enumerate(all_containers, start=1)]
 
 
 @app.get("/images")
-def list_images(type: str, full: bool = False):
+async def list_images(type: str, full: bool = False):
     """Return available container images for the given type."""
     type_lower = type.lower()
     if full:
         if type_lower in {"docker", "kubernetes"}:
-            return {"images": [img.dict() for img in get_docker_image_details()]}
+            return {"images": [img.dict() for img in await get_docker_image_details()]}
         if type_lower == "lxc":
-            return {"images": [img.dict() for img in get_lxc_image_details()]}
+            return {"images": [img.dict() for img in await get_lxc_image_details()]}
     else:
         if type_lower in {"docker", "kubernetes"}:
-            return {"images": get_docker_images()}
+            return {"images": await get_docker_images()}
         if type_lower == "lxc":
-            return {"images": get_lxc_images()}
+            return {"images": await get_lxc_images()}
     raise HTTPException(status_code=400, detail="unknown container type")
 
 
+@app.get("/jobs")
+async def list_jobs():
+    return {"jobs": [job.to_dict() for job in reversed(_jobs.values())]}
+
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str, log_since: int = 0):
+    return get_job(job_id).to_dict(log_since)
+
+
+@app.get("/jobs/{job_id}/stream")
+async def job_stream(job_id: str, log_since: int = 0):
+    """Stream the job as newline-delimited JSON until it has finished.
+
+    Every line carries the job state and the log lines written since the
+    previous line. Updates arriving in quick succession are coalesced.
+    """
+    job = get_job(job_id)
+
+    async def events():
+        seen = log_since
+        while True:
+            changed = job.changed
+            state = job.to_dict(seen)
+            seen = state["log_total"]
+            yield json.dumps(state) + "\n"
+            if job.done:
+                return
+            await changed.wait()
+            await asyncio.sleep(0.2)
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
+@app.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    job = get_job(job_id)
+    if job.task and not job.done:
+        job.task.cancel()
+    return {"detail": "cancelling"}
+
+
 @app.get("/isos")
 def list_isos():
     return {"isos": [iso.dict() for iso in get_iso_files()]}
@@ -1231,65 +3349,339 @@ class ISODownloadRequest(BaseModel):
     name: str | None = None
 
 
-@app.post("/isos/download")
-def download_iso(payload: ISODownloadRequest):
-    """Download an ISO file from a URL and store it."""
+# ISO downloads fetch up to ISO_DOWNLOAD_SEGMENTS byte ranges in parallel into
+# a preallocated "<name>.part" file. The position of every segment is kept in
+# "<name>.part.json", so downloading the same URL again after a failure or
+# restart continues where it stopped. Received data is collected into blocks
+# of ISO_DOWNLOAD_BLOCK bytes per segment, which are written by worker
+# threads so disk IO never blocks the event loop.
+ISO_DOWNLOAD_SEGMENTS = 4
+ISO_DOWNLOAD_MIN_SEGMENT = 16 * 1024 * 1024
+ISO_DOWNLOAD_RETRIES = 5
+ISO_DOWNLOAD_CHUNK = 1024 * 1024
+ISO_DOWNLOAD_BLOCK = 4 * 1024 * 1024
+
+
+async def _probe_download(client: httpx.AsyncClient, url: str) -> tuple[int, bool, str]:
+    """Return the size of ``url``, whether it supports ranges and a validator."""
+    async with client.stream("GET", url, headers={"Range": "bytes=0-0"}) as resp:
+        resp.raise_for_status()
+        # If-Range only accepts strong validators
+        etag = resp.headers.get("etag", "")
+        validator = etag if etag and not etag.startswith("W/") else resp.headers.get("last-modified", "")
+        if resp.status_code == 206:
+            total = resp.headers.get("content-range", "").rpartition("/")[2]
+            if total.isdigit():
+                return int(total), True, validator
+        return int(resp.headers.get("content-length") or 0), False, validator
+
+
+def _plan_segments(size: int) -> list[list[int]]:
+    """Split ``size`` bytes into [start, end, position] segments."""
+    count = max(1, min(ISO_DOWNLOAD_SEGMENTS, size // ISO_DOWNLOAD_MIN_SEGMENT))
+    step = -(-size // count)
+    return [[start, min(start + step, size), start] for start in range(0, size, step)]
+
+
+def _load_download_state(path: str, url: str, size: int, validator: str) -> list[list[int]] | None:
+    try:
+        with open(path) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if (state.get("url"), state.get("size"), state.get("validator")) != (url, size, validator):
+        return None
+    return state.get("segments")
+
+
+def _save_download_state(path: str, url: str, size: int, validator: str, segments: list[list[int]]) -> None:
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({"url": url, "size": size, "validator": validator, "segments": segments}, f)
+    os.replace(tmp, path)
+
+
+def _pwrite_all(fd: int, data: bytearray, offset: int) -> None:
+    view = memoryview(data)
+    while view:
+        written = os.pwrite(fd, view, offset)
+        view = view[written:]
+        offset += written
+
+
+async def _write_block(fd: int, segment: list[int], block: bytearray, received: Any) -> None:
+    """Write ``block`` at the segment's position and advance the segment."""
+    await asyncio.to_thread(_pwrite_all, fd, block, segment[2])
+    segment[2] += len(block)
+    received(len(block))
+    block.clear()
+
+
+async def _fetch_segment(
+    client: httpx.AsyncClient, url: str, validator: str, fd: int, segment: list[int], received: Any
+) -> None:
+    """Download one segment, retrying from its current position on network errors."""
+    attempt = 0
+    end = segment[1]
+    block = bytearray()
+    while segment[2] < end:
+        headers = {"Range": f"bytes={segment[2]}-{end - 1}"}
+        if validator:
+            headers["If-Range"] = validator
+        try:
+            async with client.stream("GET", url, headers=headers) as resp:
+                resp.raise_for_status()
+                if resp.status_code != 206:
+                    raise HTTPException(status_code=400, detail="remote file changed during download")
+                async for chunk in resp.aiter_bytes(ISO_DOWNLOAD_CHUNK):
+                    block += chunk[: end - segment[2] - len(block)]
+                    if len(block) >= ISO_DOWNLOAD_BLOCK:
+                        await _write_block(fd, segment, block, received)
+                        attempt = 0
+        except httpx.TransportError:
+            attempt += 1
+            if attempt > ISO_DOWNLOAD_RETRIES:
+                raise
+            await asyncio.sleep(min(2 ** attempt, 30))
+        finally:
+            # Keep what was received before an error so a retry or a later
+            # attempt resumes after it
+            if block:
+                await _write_block(fd, segment, block, received)
+
+
+async def _fetch_stream(client: httpx.AsyncClient, url: str, fd: int, received: Any) -> None:
+    """Download ``url`` sequentially for servers without range support."""
+    position = [0, 0, 0]
+    block = bytearray()
+    async with client.stream("GET", url) as resp:
+        resp.raise_for_status()
+        async for chunk in resp.aiter_bytes(ISO_DOWNLOAD_CHUNK):
+            block += chunk
+            if len(block) >= ISO_DOWNLOAD_BLOCK:
+                await _write_block(fd, position, block, received)
+    if block:
+        await _write_block(fd, position, block, received)
+
+
+def _preallocate(fd: int, size: int) -> None:
+    # Without native support glibc emulates fallocate by writing every block
+    try:
+        os.posix_fallocate(fd, 0, size)
+    except (AttributeError, OSError):
+        os.ftruncate(fd, size)
+
+
+async def _download_iso(job: Job, url: str, dest: str) -> None:
+    """Download ``url`` to ``dest`` in parallel segments, resuming a previous attempt."""
+    part = f"{dest}.part"
+    state_path = f"{part}.json"
+    segments: list[list[int]] | None = None
+    size = 0
+    validator = ""
+    saving: asyncio.Future | None = None
+    try:
+        async with httpx.AsyncClient(
+            follow_redirects=True, timeout=httpx.Timeout(30.0, read=60.0)
+        ) as client:
+            size, ranged, validator = await _probe_download(client, url)
+            if ranged and size:
+                if os.path.exists(part):
+                    segments = _load_download_state(state_path, url, size, validator)
+                if segments is None:
+                    segments = _plan_segments(size)
+            done = sum(s[2] - s[0] for s in segments) if segments else 0
+            if done:
+                job.write(f"Resuming at {_format_bytes(done)}")
+            last_save = time.monotonic()
+
+            def received(count: int) -> None:
+                nonlocal done, last_save, saving
+                done += count
+                job.update(
+                    done * 100 / size if size else None,
+                    f"{_format_bytes(done)} of {_format_bytes(size)}" if size else f"{_format_bytes(done)} received",
+                )
+                if segments and time.monotonic() - last_save > 1 and (saving is None or saving.done()):
+                    # Snapshot the positions here, the file is written in a thread
+                    snapshot = [list(s) for s in segments]
+                    saving = asyncio.ensure_future(
+                        asyncio.to_thread(_save_download_state, state_path, url, size, validator, snapshot)
+                    )
+                    last_save = time.monotonic()
+
+            fd = os.open(part, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                if segments is None:
+                    os.ftruncate(fd, 0)
+                    await _fetch_stream(client, url, fd, received)
+                else:
+                    if os.fstat(fd).st_size != size:
+                        await asyncio.to_thread(_preallocate, fd, size)
+                    job.write(f"Downloading {len([s for s in segments if s[2] < s[1]])} segments")
+                    tasks = [
+                        asyncio.create_task(_fetch_segment(client, url, validator, fd, s, received))
+                        for s in segments
+                        if s[2] < s[1]
+                    ]
+                    try:
+                        await asyncio.gather(*tasks)
+                    finally:
+                        for task in tasks:
+                            task.cancel()
+                        await asyncio.gather(*tasks, return_exceptions=True)
+                await asyncio.to_thread(os.fsync, fd)
+            finally:
+                os.close(fd)
+                # A save still running must not recreate the state file later
+                if saving is not None:
+                    await asyncio.gather(saving, return_exceptions=True)
+        os.replace(part, dest)
+        if os.path.exists(state_path):
+            os.remove(state_path)
+    except (httpx.HTTPError, OSError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        if os.path.exists(part):
+            # Keep what has been downloaded so far for the next attempt
+            if segments:
+                await asyncio.to_thread(_save_download_state, state_path, url, size, validator, segments)
+            else:
+                os.remove(part)
+
+
+@app.post("/isos/download", status_code=202)
+async def download_iso(payload: ISODownloadRequest):
+    """Start downloading an ISO file from a URL as a background job."""
     if not payload.url:
         raise HTTPException(status_code=400, detail="url required")
     filename = payload.name or os.path.basename(urllib.parse.urlparse(payload.url).path) or "download.iso"
     if not filename.lower().endswith(".iso"):
         filename += ".iso"
     dest = os.path.join(ISO_DIR, filename)
-    try:
-        with urllib.request.urlopen(payload.url) as resp, open(dest, "wb") as out:
-            shutil.copyfileobj(resp, out)
-    except Exception as e:
-        if os.path.exists(dest):
-            os.remove(dest)
-        raise HTTPException(status_code=400, detail=str(e))
-    stat = os.stat(dest)
-    typ, version, arch = guess_iso_info(filename)
-    info = ISOInfo(
-        id=0,
-        name=filename,
-        size=round(stat.st_size / (1024 ** 3), 1),
-        type=typ,
-        version=version,
-        architecture=arch,
-        created=datetime.fromtimestamp(stat.st_mtime).date().isoformat(),
-        used=False,
-        path=dest,
+
+    async def work(job: Job) -> dict:
+        await _download_iso(job, payload.url, dest)
+        job.update(message="Computing checksum")
+        sha256 = await asyncio.to_thread(hash_file, dest)
+        return await asyncio.to_thread(install_iso, dest, filename, sha256)
+
+    return start_job("download_iso", f"Download {filename}", work).to_dict()
+
+
+# Uploaded data is collected into blocks of this size, which are hashed and
+# written by a worker thread while the next block is received.
+ISO_UPLOAD_BLOCK = 4 * 1024 * 1024
+
+
+async def _receive_iso_upload(request: Request) -> tuple[str, str, str]:
+    """Stream the "file" part of a multipart upload into a temporary file.
+
+    The body is parsed as it arrives, so the data is written once, straight
+    into ISO_DIR. Returns the file name, the temporary path and the SHA-256
+    of the data.
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise HTTPException(status_code=400, detail="multipart/form-data expected")
+
+    digest = hashlib.sha256()
+    headers: dict[bytes, bytes] = {}
+    header = [b"", b""]
+    filename: str | None = None
+    writing = False
+    block = bytearray()
+
+    def on_header_field(data: bytes, start: int, end: int) -> None:
+        header[0] += data[start:end]
+
+    def on_header_value(data: bytes, start: int, end: int) -> None:
+        header[1] += data[start:end]
+
+    def on_header_end() -> None:
+        headers[header[0].lower()] = header[1]
+        header[:] = [b"", b""]
+
+    def on_headers_finished() -> None:
+        nonlocal filename, writing
+        _, options = parse_options_header(headers.pop(b"content-disposition", b""))
+        headers.clear()
+        writing = filename is None and options.get(b"name") == b"file"
+        if writing:
+            filename = os.path.basename(options.get(b"filename", b"").decode(errors="replace"))
+            if not filename.lower().endswith(".iso"):
+                raise HTTPException(status_code=400, detail="invalid iso file")
+
+    def on_part_data(data: bytes, start: int, end: int) -> None:
+        if writing:
+            block.extend(data[start:end])
+
+    def on_part_end() -> None:
+        nonlocal writing
+        writing = False
+
+    def write(data: bytearray) -> None:
+        digest.update(data)
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+
+    parser = MultipartParser(
+        boundary,
+        callbacks={
+            "on_header_field": on_header_field,
+            "on_header_value": on_header_value,
+            "on_header_end": on_header_end,
+            "on_headers_finished": on_headers_finished,
+            "on_part_data": on_part_data,
+            "on_part_end": on_part_end,
+        },
     )
-    return info.dict()
+    os.makedirs(ISO_DIR, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=ISO_DIR, prefix=".upload-")
+    pending: asyncio.Future | None = None
+    try:
+        try:
+            async for chunk in request.stream():
+                parser.write(chunk)
+                if len(block) >= ISO_UPLOAD_BLOCK:
+                    if pending:
+                        await pending
+                    pending = asyncio.ensure_future(asyncio.to_thread(write, block))
+                    block = bytearray()
+            parser.finalize()
+        except BaseException:
+            if pending:
+                await asyncio.wait([pending])
+            raise
+        if pending:
+            await pending
+        await asyncio.to_thread(write, block)
+        if filename is None:
+            raise HTTPException(status_code=400, detail="file required")
+        await asyncio.to_thread(os.fsync, fd)
+    except BaseException:
+        os.close(fd)
+        os.remove(tmp)
+        raise
+    os.close(fd)
+    return filename, tmp, digest.hexdigest()
 
 
 @app.post("/isos")
-async def upload_iso(file: UploadFile = File(...)):
-    """Upload a new ISO file."""
-    filename = os.path.basename(file.filename)
-    if not filename.lower().endswith(".iso"):
-        raise HTTPException(status_code=400, detail="invalid iso file")
-    dest = os.path.join(ISO_DIR, filename)
-    with open(dest, "wb") as out:
-        while True:
-            chunk = await file.read(1024 * 1024)
-            if not chunk:
-                break
-            out.write(chunk)
-    stat = os.stat(dest)
-    typ, version, arch = guess_iso_info(filename)
-    info = ISOInfo(
-        id=0,
-        name=filename,
-        size=round(stat.st_size / (1024 ** 3), 1),
-        type=typ,
-        version=version,
-        architecture=arch,
-        created=datetime.fromtimestamp(stat.st_mtime).date().isoformat(),
-        used=False,
-        path=dest,
-    )
-    return info.dict()
+async def upload_iso(request: Request):
+    """Upload a new ISO file sent as the "file" field of a multipart form.
+
+    The file only appears under its name once it is complete. An upload
+    with the same content as an existing ISO is stored as a hard link to it.
+    """
+    filename, tmp, sha256 = await _receive_iso_upload(request)
+    try:
+        return await asyncio.to_thread(install_iso, tmp, filename, sha256)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
 
 
 @app.delete("/isos/{name}")
@@ -1301,12 +3693,135 @@ def delete_iso(name: str):
     return {"detail": "deleted"}
 
 
-@app.get("/isos/{name}/file")
-def download_iso_file(name: str):
+# Files are sent in chunks of this size, read by a worker thread.
+ISO_SEND_CHUNK = 1024 * 1024
+
+
+class FileRangeResponse(Response):
+    """Send ``length`` bytes of a file starting at ``offset``.
+
+    The data is read with pread() in a worker thread, one large chunk at a
+    time. uvicorn has no sendfile() support, so every byte passes through
+    Python.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        offset: int,
+        length: int,
+        status_code: int,
+        headers: dict[str, str],
+        media_type: str = "application/octet-stream",
+    ):
+        super().__init__(status_code=status_code, headers=headers, media_type=media_type)
+        self.path = path
+        self.offset = offset
+        self.length = length
+
+    async def __call__(self, scope, receive, send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope["method"] == "HEAD" or not self.length:
+            await send({"type": "http.response.body", "body": b""})
+            return
+        fd = os.open(self.path, os.O_RDONLY)
+        try:
+            offset = self.offset
+            end = self.offset + self.length
+            while offset < end:
+                chunk = await asyncio.to_thread(os.pread, fd, min(ISO_SEND_CHUNK, end - offset), offset)
+                if not chunk:
+                    break
+                offset += len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": offset < end})
+            if offset < end:
+                raise RuntimeError(f"{self.path} shrank while it was sent")
+        finally:
+            os.close(fd)
+
+
+def _iso_etag(name: str, stat: os.stat_result) -> str:
+    """Return the ETag of an ISO, its checksum if the catalog knows it."""
+    with _iso_catalog_lock:
+        entry = _load_iso_catalog().get(name)
+    if entry and entry["key"] == _stat_key(stat) and entry["sha256"]:
+        return f'"{entry["sha256"]}"'
+    return f'"{stat.st_ino:x}-{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def _parse_range(value: str, size: int) -> tuple[int, int] | None:
+    """Return (offset, length) for a single-range "bytes=" header.
+
+    Returns None for headers that are ignored: other units, multiple ranges
+    and invalid ranges such as "bytes=5-2". Raises 416 for a range outside
+    the file.
+    """
+    unit, _, spec = value.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, sep, last = spec.strip().partition("-")
+    if not sep or not (first or last) or not all(p.isdigit() for p in (first, last) if p):
+        return None
+    if first:
+        start = int(first)
+        end = int(last) if last else size - 1
+        if last and end < start:
+            return None
+    else:
+        start = size - int(last)
+        end = size - 1
+    start = max(start, 0)
+    end = min(end, size - 1)
+    if start > end:
+        raise HTTPException(
+            status_code=416, detail="range not satisfiable", headers={"Content-Range": f"bytes */{size}"}
+        )
+    return start, end - start + 1
+
+
+def _not_modified(request: Request, etag: str, mtime: float) -> bool:
+    match = request.headers.get("if-none-match")
+    if match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in match.split(",")]
+        return "*" in tags or etag in tags
+    since = request.headers.get("if-modified-since")
+    if since:
+        try:
+            return int(mtime) <= email.utils.parsedate_to_datetime(since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+@app.api_route("/isos/{name}/file", methods=["GET", "HEAD"])
+def download_iso_file(name: str, request: Request):
+    """Return an ISO file, honouring Range and conditional request headers."""
     path = os.path.join(ISO_DIR, name)
     if not os.path.isfile(path):
         raise HTTPException(status_code=404, detail="iso not found")
-    return FileResponse(path, filename=name, media_type="application/octet-stream")
+    stat = os.stat(path)
+    etag = _iso_etag(name, stat)
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": etag,
+        "Last-Modified": email.utils.formatdate(stat.st_mtime, usegmt=True),
+    }
+    if _not_modified(request, etag, stat.st_mtime):
+        return Response(status_code=304, headers=headers)
+    headers["Content-Disposition"] = f"attachment; filename*=utf-8''{urllib.parse.quote(name)}"
+
+    requested = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if requested and if_range and if_range.strip() not in (etag, headers["Last-Modified"]):
+        requested = None
+    byte_range = _parse_range(requested, stat.st_size) if requested else None
+    if byte_range is None:
+        headers["Content-Length"] = str(stat.st_size)
+        return FileRangeResponse(path, 0, stat.st_size, 200, headers)
+    offset, length = byte_range
+    headers["Content-Length"] = str(length)
+    headers["Content-Range"] = f"bytes {offset}-{offset + length - 1}/{stat.st_size}"
+    return FileRangeResponse(path, offset, length, 206, headers)
 
 
 class ImagePullRequest(BaseModel):
@@ -1315,88 +3830,122 @@ class ImagePullRequest(BaseModel):
     type: str = "docker"
 
 
-@app.post("/images/pull")
-def pull_image(payload: ImagePullRequest):
-    """Pull a container image via Docker or LXC."""
+def _docker_pull_progress(job: Job) -> Any:
+    """Return a docker_pull callback reporting the download progress to ``job``."""
+    layers: dict[str, tuple[int, int]] = {}
+
+    def progress(message: dict) -> None:
+        layer = message.get("id", "")
+        status = message.get("status", "")
+        detail = message.get("progressDetail") or {}
+        if status == "Downloading" and detail.get("total"):
+            layers[layer] = (detail.get("current", 0), detail["total"])
+        else:
+            if layer in layers and status in {"Download complete", "Pull complete"}:
+                layers[layer] = (layers[layer][1], layers[layer][1])
+            job.write(f"{layer}: {status}" if layer else status)
+        total = sum(t for _, t in layers.values())
+        if total:
+            job.update(sum(c for c, _ in layers.values()) * 100 / total, status)
+
+    return progress
+
+
+def _lxd_pull_progress(job: Job) -> Any:
+    """Return an lxd_wait callback reporting the download progress to ``job``."""
+
+    def progress(metadata: dict) -> None:
+        # e.g. "rootfs: 42% (12.30MB/s)"
+        status = metadata.get("download_progress", "")
+        match = re.search(r"(\d+)%", status)
+        job.update(float(match.group(1)) if match else None, status or None)
+
+    return progress
+
+
+@app.post("/images/pull", status_code=202)
+async def pull_image(payload: ImagePullRequest):
+    """Start pulling a container image via Docker or LXC as a background job."""
     if not payload.image:
         raise HTTPException(status_code=400, detail="image required")
 
     typ = (payload.type or "docker").lower()
     if typ in {"docker", "kubernetes"}:
-        if shutil.which("docker") is None:
+        if not docker_available():
             raise HTTPException(status_code=404, detail="docker not installed")
         image = payload.image
         if payload.registry:
             image = f"{payload.registry}/{image}"
-        result = subprocess.run(["docker", "pull", image], capture_output=True, text=True)
-        if result.returncode != 0:
-            raise HTTPException(status_code=400, detail=result.stderr.strip() or "failed to pull")
-        return {"detail": "pulled"}
+
+        async def work(job: Job) -> dict:
+            await docker_pull(image, _docker_pull_progress(job))
+            return {"detail": "pulled"}
+
+        return start_job("pull_image", f"Pull {image}", work).to_dict()
     if typ == "lxc":
-        if shutil.which("lxc") is None:
+        if not lxd_available():
             raise HTTPException(status_code=404, detail="lxc not installed")
         remote = payload.registry or "images"
         alias = payload.image.split("/")[0]
-        result = subprocess.run([
-            "lxc",
-            "image",
-            "copy",
-            f"{remote}:{payload.image}",
-            "local:",
-            "--alias",
-            alias,
-        ], capture_output=True, text=True)
-        if result.returncode != 0:
-            raise HTTPException(status_code=400, detail=result.stderr.strip() or "failed to pull")
-        return {"detail": "pulled"}
+
+        async def work(job: Job) -> dict:
+            job.update(message=f"Downloading {payload.image} from {remote}")
+            await lxd_request(
+                "POST",
+                "/1.0/images",
+                progress=_lxd_pull_progress(job),
+                json={
+                    "source": _lxd_image_source(payload.image, remote),
+                    "aliases": [{"name": alias}],
+                },
+            )
+            return {"detail": "pulled"}
+
+        return start_job("pull_image", f"Pull {remote}:{payload.image}", work).to_dict()
     raise HTTPException(status_code=400, detail="unknown container type")
 
 
 @app.delete("/images/{image}")
-def delete_image(image: str, type: str):
+async def delete_image(image: str, type: str):
     type_lower = type.lower()
     if type_lower in {"docker", "kubernetes"}:
-        if shutil.which("docker") is None:
+        if not docker_available():
             raise HTTPException(status_code=404, detail="docker not installed")
-        result = subprocess.run(["docker", "rmi", image], capture_output=True, text=True)
-        if result.returncode != 0:
-            raise HTTPException(status_code=400, detail=result.stderr.strip() or "failed to delete")
+        await docker_request("DELETE", f"/images/{urllib.parse.quote(image, safe='')}")
         return {"detail": "deleted"}
     if type_lower == "lxc":
-        if shutil.which("lxc") is None:
+        if not lxd_available():
             raise HTTPException(status_code=404, detail="lxc not installed")
-        result = subprocess.run(["lxc", "image", "delete", image], capture_output=True, text=True)
-        if result.returncode != 0:
-            raise HTTPException(status_code=400, detail=result.stderr.strip() or "failed to delete")
+        fingerprint = image
+        try:
+            alias = await lxd_request("GET", f"/1.0/images/aliases/{urllib.parse.quote(image, safe='')}")
+            fingerprint = alias.get("target", image)
+        except HTTPException:
+            pass
+        await lxd_request("DELETE", f"/1.0/images/{urllib.parse.quote(fingerprint, safe='')}")
         return {"detail": "deleted"}
     raise HTTPException(status_code=400, detail="unknown container type")
 
 
 @app.post("/containers")
-def create_container(payload: ContainerCreate):
+async def create_container(payload: ContainerCreate):
     """Create a new container via Docker, LXC or Kubernetes if available."""
     typ = payload.type.lower()
     if typ == "docker":
-        if shutil.which("docker") is None:
+        if not docker_available():
             raise HTTPException(status_code=404, detail="docker not installed")
-        cmd = ["docker", "run", "-d", "--name", payload.name]
-        for p in payload.ports:
-            cmd.extend(["-p", p])
-        for m in payload.mounts:
-            cmd.extend(["-v", m])
-        for e in payload.envs:
-            cmd.extend(["-e", e])
-        cmd.append(payload.image)
-        run_subprocess(cmd)
+        await docker_run(payload)
+        _container_index[payload.name] = "docker"
+        invalidate_containers()
         # Fetch fresh info about the new container
-        container_list = [c for c in get_docker_containers() if c.name == payload.name]
+        container_list = [c for c in await get_docker_containers() if c.name == payload.name]
         return container_list[0].dict() if container_list else {"detail": "created"}
 
     if typ == "lxc":
-        if shutil.which("lxc") is None:
+        if not lxd_available():
             raise HTTPException(status_code=404, detail="lxc not installed")
         try:
-            run_subprocess(["lxc", "launch", payload.image, payload.name])
+            await lxd_launch(payload.image, payload.name)
         except HTTPException as exc:
             if "Failed getting root disk" in str(exc.detail):
                 raise HTTPException(
@@ -1404,14 +3953,20 @@ def create_container(payload: ContainerCreate):
                     detail="LXD storage not configured. Run 'lxd init' to set up a default storage pool.",
                 ) from exc
             raise
-        container_list = [c for c in get_lxc_containers() if c.name == payload.name]
+        _container_index[payload.name] = "lxc"
+        invalidate_containers()
+        container_list = [c for c in await get_lxc_containers() if c.name == payload.name]
         return container_list[0].dict() if container_list else {"detail": "created"}
 
     if typ == "kubernetes":
         if shutil.which("kubectl") is None:
             raise HTTPException(status_code=404, detail="kubectl not installed")
-        run_subprocess(["kubectl", "run", payload.name, "--image", payload.image, "--restart=Never"])
-        pods = [c for c in get_k8s_pods() if c.name == payload.name]
+        await run_subprocess(
+            ["kubectl", "run", payload.name, "--image", payload.image, "--restart=Never"], timeout=COMMAND_TIMEOUT
+        )
+        _container_index[payload.name] = "k8s"
+        invalidate_containers()
+        pods = [c for c in await get_k8s_pods() if c.name == payload.name]
         return pods[0].dict() if pods else {"detail": "created"}
 
     # Fallback to in-memory creation for unknown types
@@ -1435,27 +3990,27 @@ def create_container(payload: ContainerCreate):
 
 
 @app.post("/containers/{name}/start")
-def start_container(name: str):
+async def start_container(name: str):
     """Start a container by name if possible."""
-    ctype = find_container_type(name)
+    ctype = await find_container_type(name)
     if ctype == "docker":
-        if shutil.which("docker") is None:
+        if not docker_available():
             raise HTTPException(status_code=404, detail="docker not installed")
-        result = subprocess.run(["docker", "start", name], capture_output=True, text=True)
-        if result.returncode != 0:
-            raise HTTPException(status_code=400, detail=result.stderr.strip() or "failed to start")
+        await docker_request("POST", f"/containers/{urllib.parse.quote(name, safe='')}/start")
     elif ctype == "lxc":
-        if shutil.which("lxc") is None:
+        if not lxd_available():
             raise HTTPException(status_code=404, detail="lxc not installed")
-        result = subprocess.run(["lxc", "start", name], capture_output=True, text=True)
-        if result.returncode != 0:
-            raise HTTPException(status_code=400, detail=result.stderr.strip() or "failed to start")
+        await lxd_set_state(name, "start")
     elif ctype == "k8s":
         if shutil.which("kubectl") is None:
             raise HTTPException(status_code=404, detail="kubectl not installed")
-        result = subprocess.run(["kubectl", "scale", "--replicas=1", f"deployment/{name}"], capture_output=True, text=True)
+        result = await run_command(
+            ["kubectl", "scale", "--replicas=1", f"deployment/{name}"], timeout=COMMAND_TIMEOUT
+        )
         if result.returncode != 0:
-            result = subprocess.run(["kubectl", "scale", "--replicas=1", f"statefulset/{name}"], capture_output=True, text=True)
+            result = await run_command(
+                ["kubectl", "scale", "--replicas=1", f"statefulset/{name}"], timeout=COMMAND_TIMEOUT
+            )
             if result.returncode != 0:
                 raise HTTPException(status_code=400, detail=result.stderr.strip() or "failed to start")
     elif ctype == "api":
@@ -1465,175 +4020,724 @@ def start_container(name: str):
                 break
     else:
         raise HTTPException(status_code=404, detail="container not found")
+    invalidate_containers()
     return {"detail": "started"}
 
 
-@app.post("/containers/{name}/stop")
-def stop_container(name: str):
-    """Stop a container by name if possible."""
-    ctype = find_container_type(name)
-    if ctype == "docker":
-        if shutil.which("docker") is None:
-            raise HTTPException(status_code=404, detail="docker not installed")
-        result = subprocess.run(["docker", "stop", name], capture_output=True, text=True)
-        if result.returncode != 0:
-            raise HTTPException(status_code=400, detail=result.stderr.strip() or "failed to stop")
-    elif ctype == "lxc":
-        if shutil.which("lxc") is None:
-            raise HTTPException(status_code=404, detail="lxc not installed")
-        result = subprocess.run(["lxc", "stop", name], capture_output=True, text=True)
-        if result.returncode != 0:
-            raise HTTPException(status_code=400, detail=result.stderr.strip() or "failed to stop")
-    elif ctype == "k8s":
-        if shutil.which("kubectl") is None:
-            raise HTTPException(status_code=404, detail="kubectl not installed")
-        result = subprocess.run(["kubectl", "scale", "--replicas=0", f"deployment/{name}"], capture_output=True, text=True)
-        if result.returncode != 0:
-            result = subprocess.run(["kubectl", "scale", "--replicas=0", f"statefulset/{name}"], capture_output=True, text=True)
-            if result.returncode != 0:
-                raise HTTPException(status_code=400, detail=result.stderr.strip() or "failed to stop")
-    elif ctype == "api":
-        for c in containers:
-            if c.name == name:
-                c.status = "stopped"
+@app.post("/containers/{name}/stop")
+async def stop_container(name: str):
+    """Stop a container by name if possible."""
+    ctype = await find_container_type(name)
+    if ctype == "docker":
+        if not docker_available():
+            raise HTTPException(status_code=404, detail="docker not installed")
+        await docker_request("POST", f"/containers/{urllib.parse.quote(name, safe='')}/stop")
+    elif ctype == "lxc":
+        if not lxd_available():
+            raise HTTPException(status_code=404, detail="lxc not installed")
+        await lxd_set_state(name, "stop")
+    elif ctype == "k8s":
+        if shutil.which("kubectl") is None:
+            raise HTTPException(status_code=404, detail="kubectl not installed")
+        result = await run_command(
+            ["kubectl", "scale", "--replicas=0", f"deployment/{name}"], timeout=COMMAND_TIMEOUT
+        )
+        if result.returncode != 0:
+            result = await run_command(
+                ["kubectl", "scale", "--replicas=0", f"statefulset/{name}"], timeout=COMMAND_TIMEOUT
+            )
+            if result.returncode != 0:
+                raise HTTPException(status_code=400, detail=result.stderr.strip() or "failed to stop")
+    elif ctype == "api":
+        for c in containers:
+            if c.name == name:
+                c.status = "stopped"
+                break
+    else:
+        raise HTTPException(status_code=404, detail="container not found")
+    invalidate_containers()
+    return {"detail": "stopped"}
+
+
+@app.delete("/containers/{name}")
+async def delete_container(name: str):
+    """Delete a container by name if possible."""
+    ctype = await find_container_type(name)
+    if ctype == "docker":
+        if not docker_available():
+            raise HTTPException(status_code=404, detail="docker not installed")
+        await docker_request("DELETE", f"/containers/{urllib.parse.quote(name, safe='')}")
+    elif ctype == "lxc":
+        if not lxd_available():
+            raise HTTPException(status_code=404, detail="lxc not installed")
+        await lxd_delete(name)
+    elif ctype == "k8s":
+        if shutil.which("kubectl") is None:
+            raise HTTPException(status_code=404, detail="kubectl not installed")
+        result = await run_command(["kubectl", "delete", "pod", name], timeout=COMMAND_TIMEOUT)
+        if result.returncode != 0:
+            result = await run_command(["kubectl", "delete", "deployment", name], timeout=COMMAND_TIMEOUT)
+            if result.returncode != 0:
+                result = await run_command(
+                    ["kubectl", "delete", "statefulset", name], timeout=COMMAND_TIMEOUT
+                )
+                if result.returncode != 0:
+                    raise HTTPException(status_code=400, detail=result.stderr.strip() or "failed to delete")
+    elif ctype == "api":
+        global containers
+        containers = [c for c in containers if c.name != name]
+    else:
+        raise HTTPException(status_code=404, detail="container not found")
+    _container_index.pop(name, None)
+    invalidate_containers()
+    return {"detail": "deleted"}
+
+
+# Container terminals run their exec command on a PTY whose master side is
+# read from the event loop. Output is coalesced into binary websocket frames
+# of up to TERMINAL_BUFFER_SIZE bytes. While a client is slow to receive,
+# reading pauses at that size so the shell blocks instead of the server
+# buffering without bound. Clients send input as binary frames only; text
+# frames are JSON control messages such as
+# {"type": "resize", "rows": 24, "cols": 80}.
+TERMINAL_READ_SIZE = 64 * 1024
+TERMINAL_BUFFER_SIZE = 256 * 1024
+
+
+def _pty_child_setup() -> None:
+    # Make the PTY the controlling terminal so the shell gets SIGWINCH
+    os.setsid()
+    fcntl.ioctl(0, termios.TIOCSCTTY, 0)
+
+
+async def spawn_pty(cmd: List[str], env: dict[str, str]) -> tuple[asyncio.subprocess.Process, int]:
+    """Start ``cmd`` on a new PTY and return it with the non-blocking master fd."""
+    master_fd, slave_fd = pty.openpty()
+    try:
+        process = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdin=slave_fd,
+            stdout=slave_fd,
+            stderr=slave_fd,
+            env=env,
+            preexec_fn=_pty_child_setup,
+        )
+    except BaseException:
+        os.close(master_fd)
+        raise
+    finally:
+        os.close(slave_fd)
+    os.set_blocking(master_fd, False)
+    return process, master_fd
+
+
+async def close_pty(process: asyncio.subprocess.Process, master_fd: int) -> None:
+    """Hang up the PTY of ``process`` and wait for the process to exit."""
+    if process.returncode is None:
+        try:
+            os.killpg(process.pid, signal.SIGHUP)
+        except ProcessLookupError:
+            pass
+    os.close(master_fd)
+    try:
+        await asyncio.wait_for(process.wait(), timeout=5)
+    except asyncio.TimeoutError:
+        _kill_process_group(process)
+        await process.wait()
+
+
+def set_pty_size(fd: int, rows: Any, cols: Any) -> bool:
+    try:
+        rows, cols = int(rows), int(cols)
+    except (TypeError, ValueError):
+        return False
+    if not (0 < rows < 65536 and 0 < cols < 65536):
+        return False
+    fcntl.ioctl(fd, termios.TIOCSWINSZ, struct.pack("HHHH", rows, cols, 0, 0))
+    return True
+
+
+def get_pty_size(fd: int) -> tuple[int, int]:
+    """Return (rows, cols) of a PTY, zero while no size has been set."""
+    rows, cols, _, _ = struct.unpack("HHHH", fcntl.ioctl(fd, termios.TIOCGWINSZ, b"\0" * 8))
+    return rows, cols
+
+
+def terminal_control(text: str) -> dict | None:
+    """Return the control message in a text frame, or None if it is malformed.
+
+    Input is only accepted in binary frames, so text frames are always
+    control messages and typed or pasted JSON reaches the shell unchanged.
+    """
+    try:
+        message = json.loads(text)
+    except ValueError:
+        return None
+    return message if isinstance(message, dict) else None
+
+
+async def write_pty(fd: int, data: bytes) -> None:
+    """Write all of ``data`` to a non-blocking PTY, waiting while it is full."""
+    loop = asyncio.get_running_loop()
+    view = memoryview(data)
+    while view:
+        try:
+            view = view[os.write(fd, view):]
+        except BlockingIOError:
+            writable = loop.create_future()
+            loop.add_writer(fd, writable.set_result, None)
+            try:
+                await writable
+            finally:
+                loop.remove_writer(fd)
+
+
+# Terminal sessions outlive their websocket connections. A client that
+# reconnects with ?session=<id> is attached to the running shell again and
+# first receives the last TERMINAL_SCROLLBACK bytes of output. Several
+# connections can view one session at once. A session nobody views is closed
+# after TERMINAL_IDLE_TIMEOUT seconds.
+TERMINAL_SCROLLBACK = 256 * 1024
+TERMINAL_IDLE_TIMEOUT = 600.0
+
+
+# Sessions started with ?record=true are recorded to RECORDING_DIR. Events
+# are asciicast v2 lines, [seconds, code, data], with "o" for output, "i"
+# for input and "r" for resizes. They are collected into zlib-compressed
+# blocks that are appended to "<session>.rec" behind a 4-byte length. The
+# first block holds the asciicast header. It is written with the first event,
+# so the size the client sets right after connecting is its width and height.
+# For every event block
+# "<session>.idx" gets the time of its first event and its offset in the
+# .rec file, so playback can start at any time by decoding only the blocks
+# from there. Compression and file writes run on a separate thread; the
+# terminal itself only queues the event.
+RECORDING_DIR = os.path.join(os.path.dirname(__file__), "recordings")
+RECORDING_MAGIC = b"UPXREC1\n"
+RECORDING_BLOCK_SIZE = 64 * 1024
+RECORDING_FLUSH_INTERVAL = 1.0
+RECORDING_INDEX = struct.Struct("<dQ")
+RECORDING_LENGTH = struct.Struct("<I")
+
+_recording_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="recording")
+
+
+class TerminalRecorder:
+    def __init__(self, session_id: str, container: str, user: str, rows: int = 0, cols: int = 0) -> None:
+        os.makedirs(RECORDING_DIR, exist_ok=True)
+        base = os.path.join(RECORDING_DIR, session_id)
+        self._rec = open(base + ".rec", "wb")
+        self._idx = open(base + ".idx", "wb")
+        self._started = time.monotonic()
+        self._events: list[str] = []
+        self._size = 0
+        self._block_start = 0.0
+        self._timer: asyncio.TimerHandle | None = None
+        self._loop = asyncio.get_running_loop()
+        # Output may end in the middle of a UTF-8 sequence
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._header: dict | None = {
+            "version": 2,
+            "width": cols or 80,
+            "height": rows or 24,
+            "timestamp": int(time.time()),
+            "title": container,
+            "env": {"TERM": "xterm"},
+            "user": user,
+        }
+
+    def resize(self, rows: int, cols: int) -> None:
+        if self._header is not None:
+            self._header.update(width=cols, height=rows)
+        else:
+            self.record("r", f"{cols}x{rows}")
+
+    def _write_header_once(self) -> None:
+        if self._header is not None:
+            _recording_executor.submit(self._write_header, json.dumps(self._header).encode())
+            self._header = None
+
+    def record(self, code: str, data: bytes | str) -> None:
+        if isinstance(data, bytes):
+            data = self._decoder.decode(data) if code == "o" else data.decode(errors="replace")
+        if not data:
+            return
+        self._write_header_once()
+        now = round(time.monotonic() - self._started, 6)
+        if not self._events:
+            self._block_start = now
+            self._timer = self._loop.call_later(RECORDING_FLUSH_INTERVAL, self.flush)
+        line = json.dumps([now, code, data])
+        self._events.append(line)
+        self._size += len(line)
+        if self._size >= RECORDING_BLOCK_SIZE:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._events:
+            payload = "\n".join(self._events).encode()
+            _recording_executor.submit(self._write_events, self._block_start, payload)
+            self._events = []
+            self._size = 0
+
+    def close(self) -> None:
+        self._write_header_once()
+        self.flush()
+        _recording_executor.submit(self._close_files)
+
+    def _write_block(self, payload: bytes) -> int:
+        offset = self._rec.tell()
+        data = zlib.compress(payload)
+        self._rec.write(RECORDING_LENGTH.pack(len(data)) + data)
+        return offset
+
+    def _write_header(self, header: bytes) -> None:
+        self._rec.write(RECORDING_MAGIC)
+        self._write_block(header)
+        self._rec.flush()
+
+    def _write_events(self, start: float, payload: bytes) -> None:
+        offset = self._write_block(payload)
+        # The block is complete on disk before the index points at it
+        self._rec.flush()
+        self._idx.write(RECORDING_INDEX.pack(start, offset))
+        self._idx.flush()
+
+    def _close_files(self) -> None:
+        self._rec.close()
+        self._idx.close()
+
+
+def _read_recording_block(f: Any) -> bytes | None:
+    """Return the next block of a recording, None at the end or a torn write."""
+    prefix = f.read(RECORDING_LENGTH.size)
+    if len(prefix) < RECORDING_LENGTH.size:
+        return None
+    (length,) = RECORDING_LENGTH.unpack(prefix)
+    data = f.read(length)
+    if len(data) < length:
+        return None
+    try:
+        return zlib.decompress(data)
+    except zlib.error:
+        return None
+
+
+def _recording_paths(recording_id: str) -> tuple[str, str]:
+    base = os.path.join(RECORDING_DIR, os.path.basename(recording_id))
+    if not os.path.isfile(base + ".rec"):
+        raise HTTPException(status_code=404, detail="recording not found")
+    return base + ".rec", base + ".idx"
+
+
+def _read_recording_index(path: str) -> list[tuple[float, int]]:
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return []
+    usable = len(data) - len(data) % RECORDING_INDEX.size
+    return list(RECORDING_INDEX.iter_unpack(data[:usable]))
+
+
+def _recording_info(recording_id: str) -> dict:
+    rec_path, idx_path = _recording_paths(recording_id)
+    index = _read_recording_index(idx_path)
+    with open(rec_path, "rb") as f:
+        if f.read(len(RECORDING_MAGIC)) != RECORDING_MAGIC:
+            raise HTTPException(status_code=400, detail="not a recording")
+        header = json.loads(_read_recording_block(f) or b"{}")
+        duration = 0.0
+        # The last block may be cut short, the one before it is then the last
+        for _, offset in reversed(index):
+            f.seek(offset)
+            block = _read_recording_block(f)
+            if block:
+                duration = json.loads(block.rsplit(b"\n", 1)[-1])[0]
+                break
+    return {
+        "id": os.path.basename(recording_id),
+        "container": header.get("title"),
+        "user": header.get("user"),
+        "started": header.get("timestamp"),
+        "duration": duration,
+        "size": os.path.getsize(rec_path) + os.path.getsize(idx_path),
+    }
+
+
+def _export_recording(rec_path: str, idx_path: str, start: float) -> Any:
+    """Yield the recording as asciicast v2 lines from ``start`` seconds on."""
+    index = _read_recording_index(idx_path)
+    # The last block starting at or before ``start`` holds the first event
+    pos = max(bisect.bisect_right([t for t, _ in index], start) - 1, 0)
+    with open(rec_path, "rb") as f:
+        f.seek(len(RECORDING_MAGIC))
+        header = json.loads(_read_recording_block(f) or b"{}")
+        header.pop("user", None)
+        yield json.dumps(header) + "\n"
+        if not index:
+            return
+        f.seek(index[pos][1])
+        while True:
+            block = _read_recording_block(f)
+            if block is None:
+                return
+            for line in block.split(b"\n"):
+                at, code, data = json.loads(line)
+                if at >= start:
+                    yield json.dumps([round(at - start, 6), code, data]) + "\n"
+
+
+@app.get("/recordings")
+def list_recordings():
+    recordings = []
+    if os.path.isdir(RECORDING_DIR):
+        for name in sorted(os.listdir(RECORDING_DIR)):
+            if name.endswith(".rec"):
+                try:
+                    recordings.append(_recording_info(name[:-4]))
+                except (HTTPException, OSError, ValueError):
+                    continue
+    return {"recordings": recordings}
+
+
+@app.get("/recordings/{recording_id}")
+def download_recording(recording_id: str, start: float = 0):
+    """Export a recording as an asciicast v2 file, optionally from ``start``
+    seconds into the session."""
+    rec_path, idx_path = _recording_paths(recording_id)
+    name = os.path.basename(recording_id)
+    return StreamingResponse(
+        _export_recording(rec_path, idx_path, max(start, 0)),
+        media_type="application/x-asciicast",
+        headers={"Content-Disposition": f'attachment; filename="{name}.cast"'},
+    )
+
+
+@app.delete("/recordings/{recording_id}")
+def delete_recording(recording_id: str):
+    for path in _recording_paths(recording_id):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    return {"detail": "deleted"}
+
+
+class TerminalViewer:
+    def __init__(self) -> None:
+        self.pending = bytearray()
+        self.ready = asyncio.Event()
+
+
+class TerminalSession:
+    """A shell on a PTY shared by the websocket connections viewing it.
+
+    Output is read from the event loop and queued for every viewer. Reading
+    pauses while a viewer has TERMINAL_BUFFER_SIZE bytes queued, so the
+    slowest viewer sets the pace instead of the server buffering without
+    bound.
+    """
+
+    def __init__(
+        self,
+        container: str,
+        user: str,
+        process: asyncio.subprocess.Process,
+        master_fd: int,
+        record: bool = False,
+    ) -> None:
+        self.id = secrets.token_urlsafe(16)
+        self.container = container
+        self.user = user
+        self.process = process
+        self.master_fd = master_fd
+        self.created = time.time()
+        self.viewers: set[TerminalViewer] = set()
+        self.eof = False
+        self.closed = False
+        self._scrollback: deque[bytes] = deque()
+        self._scrollback_size = 0
+        self._loop = asyncio.get_running_loop()
+        self._reading = False
+        self._idle: asyncio.TimerHandle | None = None
+        self._closing: asyncio.Task | None = None
+        self.recorder = TerminalRecorder(self.id, container, user, *get_pty_size(master_fd)) if record else None
+        self._resume()
+        self._start_idle_timer()
+
+    def _resume(self) -> None:
+        if not self._reading and not self.eof and not self.closed:
+            self._loop.add_reader(self.master_fd, self._on_readable)
+            self._reading = True
+
+    def _pause(self) -> None:
+        if self._reading:
+            self._loop.remove_reader(self.master_fd)
+            self._reading = False
+
+    def _start_idle_timer(self) -> None:
+        self._idle = self._loop.call_later(TERMINAL_IDLE_TIMEOUT, self._close_soon)
+
+    def _close_soon(self) -> None:
+        if self._closing is None:
+            self._closing = self._loop.create_task(self.close())
+
+    def _on_readable(self) -> None:
+        chunks: list[bytes] = []
+        size = 0
+        # Drain what the PTY has so it goes out as one frame
+        while size < TERMINAL_BUFFER_SIZE:
+            try:
+                data = os.read(self.master_fd, TERMINAL_READ_SIZE)
+            except BlockingIOError:
                 break
-    else:
-        raise HTTPException(status_code=404, detail="container not found")
-    return {"detail": "stopped"}
+            except OSError:
+                data = b""  # EIO once the shell has exited
+            if not data:
+                self.eof = True
+                break
+            chunks.append(data)
+            size += len(data)
+        if chunks:
+            data = b"".join(chunks)
+            self._remember(data)
+            if self.recorder:
+                self.recorder.record("o", data)
+            for viewer in self.viewers:
+                viewer.pending.extend(data)
+                viewer.ready.set()
+        if self.eof or any(len(viewer.pending) >= TERMINAL_BUFFER_SIZE for viewer in self.viewers):
+            self._pause()
+        if self.eof:
+            self._close_soon()
+
+    def _remember(self, data: bytes) -> None:
+        """Append output to the scrollback ring, dropping the oldest bytes."""
+        self._scrollback.append(data)
+        self._scrollback_size += len(data)
+        while self._scrollback_size - len(self._scrollback[0]) >= TERMINAL_SCROLLBACK:
+            self._scrollback_size -= len(self._scrollback.popleft())
+        excess = self._scrollback_size - TERMINAL_SCROLLBACK
+        if excess > 0:
+            self._scrollback[0] = self._scrollback[0][excess:]
+            self._scrollback_size -= excess
+
+    def attach(self) -> TerminalViewer:
+        """Add a viewer, starting with the scrollback."""
+        if self._idle is not None:
+            self._idle.cancel()
+            self._idle = None
+        viewer = TerminalViewer()
+        viewer.pending.extend(b"".join(self._scrollback))
+        viewer.ready.set()
+        self.viewers.add(viewer)
+        return viewer
+
+    def detach(self, viewer: TerminalViewer) -> None:
+        self.viewers.discard(viewer)
+        self.drained()
+        if not self.viewers and not self.closed and self._idle is None:
+            self._start_idle_timer()
+
+    def drained(self) -> None:
+        """Resume reading once no viewer is too far behind."""
+        if all(len(viewer.pending) < TERMINAL_BUFFER_SIZE for viewer in self.viewers):
+            self._resume()
+
+    async def write(self, data: bytes) -> None:
+        if not self.closed:
+            if self.recorder:
+                self.recorder.record("i", data)
+            await write_pty(self.master_fd, data)
+
+    def resize(self, rows: Any, cols: Any) -> None:
+        if not self.closed and set_pty_size(self.master_fd, rows, cols) and self.recorder:
+            self.recorder.resize(int(rows), int(cols))
+
+    async def close(self) -> None:
+        """End the shell. Viewers still receive the output queued for them."""
+        if self.closed:
+            return
+        self.closed = True
+        self._pause()
+        if self._idle is not None:
+            self._idle.cancel()
+        _terminal_sessions.pop(self.id, None)
+        for viewer in self.viewers:
+            viewer.ready.set()
+        if self.recorder:
+            self.recorder.close()
+        await close_pty(self.process, self.master_fd)
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "container": self.container,
+            "user": self.user,
+            "viewers": len(self.viewers),
+            "created": self.created,
+            "running": not self.closed,
+            "recording": self.recorder is not None,
+        }
 
 
-@app.delete("/containers/{name}")
-def delete_container(name: str):
-    """Delete a container by name if possible."""
-    ctype = find_container_type(name)
-    if ctype == "docker":
-        if shutil.which("docker") is None:
-            raise HTTPException(status_code=404, detail="docker not installed")
-        result = subprocess.run(["docker", "rm", name], capture_output=True, text=True)
-        if result.returncode != 0:
-            raise HTTPException(status_code=400, detail=result.stderr.strip() or "failed to delete")
-    elif ctype == "lxc":
-        if shutil.which("lxc") is None:
-            raise HTTPException(status_code=404, detail="lxc not installed")
-        result = subprocess.run(["lxc", "delete", "--force", name], capture_output=True, text=True)
-        if result.returncode != 0:
-            raise HTTPException(status_code=400, detail=result.stderr.strip() or "failed to delete")
-    elif ctype == "k8s":
-        if shutil.which("kubectl") is None:
-            raise HTTPException(status_code=404, detail="kubectl not installed")
-        result = subprocess.run(["kubectl", "delete", "pod", name], capture_output=True, text=True)
-        if result.returncode != 0:
-            result = subprocess.run(["kubectl", "delete", "deployment", name], capture_output=True, text=True)
-            if result.returncode != 0:
-                result = subprocess.run(["kubectl", "delete", "statefulset", name], capture_output=True, text=True)
-                if result.returncode != 0:
-                    raise HTTPException(status_code=400, detail=result.stderr.strip() or "failed to delete")
-    elif ctype == "api":
-        global containers
-        containers = [c for c in containers if c.name != name]
-    else:
-        raise HTTPException(status_code=404, detail="container not found")
-    return {"detail": "deleted"}
+_terminal_sessions: dict[str, TerminalSession] = {}
 
 
 @app.websocket("/containers/{name}/terminal")
-async def container_terminal(websocket: WebSocket, name: str):
-    """Provide interactive shell access to a container via websocket."""
+async def container_terminal(websocket: WebSocket, name: str, session: str | None = None, record: bool = False):
+    """Provide interactive shell access to a container via websocket.
+
+    The first frame names the session, {"type": "session", "id": ...}.
+    Connecting with that id as ``session`` attaches to the same shell again.
+    An unknown or ended session starts a new shell, which is recorded when
+    ``record`` is set. The control message {"type": "close"} ends the
+    session for all viewers.
+    """
     await websocket.accept()
-    ctype = find_container_type(name)
-    if ctype == "docker":
-        if shutil.which("docker") is None:
-            await websocket.send_text("docker not installed")
-            await websocket.close()
-            return
-        cmd = [
-            "docker",
-            "exec",
-            "-it",
-            name,
-            "/bin/sh",
-            "-c",
-            "if [ -x /bin/bash ]; then exec /bin/bash -i; else exec /bin/sh -i; fi",
-        ]
-    elif ctype == "lxc":
-        if shutil.which("lxc") is None:
-            await websocket.send_text("lxc not installed")
-            await websocket.close()
-            return
-        cmd = [
-            "lxc",
-            "exec",
-            name,
-            "--mode",
-            "interactive",
-            "--",
-            "/bin/sh",
-            "-c",
-            "if [ -x /bin/bash ]; then exec /bin/bash -i; else exec /bin/sh -i; fi",
-        ]
-    elif ctype == "k8s":
-        if shutil.which("kubectl") is None:
-            await websocket.send_text("kubectl not installed")
+    user = await authenticate_websocket(websocket)
+    if user is None:
+        await websocket.close(code=1008)
+        return
+    terminal = _terminal_sessions.get(session) if session else None
+    if terminal is not None and (terminal.container != name or terminal.user != user):
+        terminal = None
+    if terminal is None:
+        ctype = await find_container_type(name)
+        if ctype == "docker":
+            if shutil.which("docker") is None:
+                await websocket.send_text("docker not installed")
+                await websocket.close()
+                return
+            cmd = [
+                "docker",
+                "exec",
+                "-it",
+                name,
+                "/bin/sh",
+                "-c",
+                "if [ -x /bin/bash ]; then exec /bin/bash -i; else exec /bin/sh -i; fi",
+            ]
+        elif ctype == "lxc":
+            if shutil.which("lxc") is None:
+                await websocket.send_text("lxc not installed")
+                await websocket.close()
+                return
+            cmd = [
+                "lxc",
+                "exec",
+                name,
+                "--mode",
+                "interactive",
+                "--",
+                "/bin/sh",
+                "-c",
+                "if [ -x /bin/bash ]; then exec /bin/bash -i; else exec /bin/sh -i; fi",
+            ]
+        elif ctype == "k8s":
+            if shutil.which("kubectl") is None:
+                await websocket.send_text("kubectl not installed")
+                await websocket.close()
+                return
+            cmd = [
+                "kubectl",
+                "exec",
+                "-it",
+                name,
+                "--",
+                "/bin/sh",
+                "-c",
+                "if [ -x /bin/bash ]; then exec /bin/bash -i; else exec /bin/sh -i; fi",
+            ]
+        else:
             await websocket.close()
             return
-        cmd = [
-            "kubectl",
-            "exec",
-            "-it",
-            name,
-            "--",
-            "/bin/sh",
-            "-c",
-            "if [ -x /bin/bash ]; then exec /bin/bash -i; else exec /bin/sh -i; fi",
-        ]
-    else:
-        await websocket.close()
-        return
 
-    env = dict(os.environ)
-    env["PS1"] = r"\\u@\\h:\\w$ "
-    env["TERM"] = "xterm"
+        env = dict(os.environ)
+        env["PS1"] = r"\\u@\\h:\\w$ "
+        env["TERM"] = "xterm"
 
-    master_fd, slave_fd = pty.openpty()
-    process = await asyncio.create_subprocess_exec(
-        *cmd,
-        stdin=slave_fd,
-        stdout=slave_fd,
-        stderr=slave_fd,
-        env=env,
-        preexec_fn=os.setsid,
-    )
-    os.close(slave_fd)
+        process, master_fd = await spawn_pty(cmd, env)
+        terminal = TerminalSession(name, user, process, master_fd, record=record)
+        _terminal_sessions[terminal.id] = terminal
+    await websocket.send_text(json.dumps({"type": "session", "id": terminal.id}))
+    viewer = terminal.attach()
 
-    loop = asyncio.get_running_loop()
+    async def send_output() -> None:
+        while True:
+            if not viewer.pending and not terminal.closed:
+                await viewer.ready.wait()
+            viewer.ready.clear()
+            if viewer.pending:
+                frame = bytes(viewer.pending)
+                viewer.pending.clear()
+                terminal.drained()
+                await websocket.send_bytes(frame)
+            elif terminal.closed:
+                return
+
+    async def receive_input() -> None:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            data = message.get("bytes")
+            if data is None:
+                control = terminal_control(message.get("text") or "") or {}
+                if control.get("type") == "resize":
+                    terminal.resize(control.get("rows"), control.get("cols"))
+                elif control.get("type") == "close":
+                    await terminal.close()
+                continue
+            await terminal.write(data)
 
-    async def read_output():
+    tasks = [asyncio.ensure_future(send_output()), asyncio.ensure_future(receive_input())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        terminal.detach(viewer)
+        for task in tasks:
+            task.cancel()
+        # Not gather: a cancellation of this task arriving meanwhile would come
+        # back as the gather's own error, which anyio cancel scopes (and so
+        # the test client) do not take for theirs
+        await asyncio.wait(tasks)
+        for task in tasks:
+            if not task.cancelled():
+                task.exception()
         try:
-            while True:
-                data = await loop.run_in_executor(None, os.read, master_fd, 1024)
-                if not data:
-                    break
-                await websocket.send_text(data.decode(errors="ignore"))
-        finally:
-            os.close(master_fd)
+            await websocket.close()
+        except RuntimeError:
+            pass
 
-    async def read_input():
-        try:
-            while True:
-                data = await websocket.receive_text()
-                os.write(master_fd, data.encode())
 
-        except Exception:
-            pass
+@app.get("/terminals")
+async def list_terminals(request: Request):
+    """Return the terminal sessions of the requesting user."""
+    user = request.state.user
+    return {
+        "terminals": [terminal.to_dict() for terminal in _terminal_sessions.values() if terminal.user == user]
+    }
 
-    await asyncio.gather(read_output(), read_input())
-    await websocket.close()
+
+@app.delete("/terminals/{session_id}")
+async def close_terminal(session_id: str, request: Request):
+    terminal = _terminal_sessions.get(session_id)
+    # Sessions of other users are reported as missing, like unknown ones
+    if terminal is None or terminal.user != request.state.user:
+        raise HTTPException(status_code=404, detail="terminal session not found")
+    await terminal.close()
+    return {"detail": "closed"}
 
 
 @app.get("/vms")
-def list_vms():
+async def list_vms():
     existing = load_vms()
-    statuses = parse_virsh_list()
+    statuses = await vm_states()
     for vm in existing:
         vm.status = statuses.get(vm.name, vm.status)
     for idx, vm in enumerate(existing, start=1):
@@ -1641,20 +4745,33 @@ def list_vms():
     return [vm.dict() for vm in existing]
 
 
-@app.post("/vms")
-def create_vm(payload: VirtualMachineCreate):
+@app.post("/vms", status_code=202)
+async def create_vm(payload: VirtualMachineCreate):
+    """Start creating a virtual machine as a background job."""
     if shutil.which("virt-install") is None:
         raise HTTPException(status_code=404, detail="virt-install not installed")
     iso_path = os.path.join(ISO_DIR, payload.iso)
     if not os.path.isfile(iso_path):
         raise HTTPException(status_code=404, detail="iso not found")
 
+    async def work(job: Job) -> dict:
+        return await _create_vm(job, payload, iso_path)
+
+    return start_job("create_vm", f"Create VM {payload.name}", work).to_dict()
+
+
+async def _create_vm(job: Job, payload: VirtualMachineCreate, iso_path: str) -> dict:
+    sizes = payload.disks or [20]
+    steps = len(sizes) + 1
     disk_args = []
     disk_paths = []
-    for idx, size in enumerate(payload.disks or [20], start=1):
+    for idx, size in enumerate(sizes, start=1):
+        job.update((idx - 1) * 100 / steps, f"Creating disk {idx} of {len(sizes)}")
         disk_path = f"/var/lib/libvirt/images/{payload.name}_{idx}.qcow2"
         disk_paths.append(disk_path)
-        subprocess.run(["qemu-img", "create", "-f", "qcow2", disk_path, f"{size}G"], capture_output=True)
+        await run_command(
+            ["qemu-img", "create", "-f", "qcow2", disk_path, f"{size}G"], on_output=job.write
+        )
         disk_args.extend(["--disk", f"path={disk_path},size={size}"])
 
     cmd = [
@@ -1677,7 +4794,8 @@ def create_vm(payload: VirtualMachineCreate):
         "--hvm",
         "--noautoconsole",
     ]
-    result = subprocess.run(cmd, capture_output=True, text=True)
+    job.update(len(sizes) * 100 / steps, "Installing")
+    result = await run_command(cmd, on_output=job.write)
     if result.returncode != 0:
         raise HTTPException(status_code=400, detail=result.stderr.strip() or "failed to create")
 
@@ -1698,7 +4816,7 @@ def create_vm(payload: VirtualMachineCreate):
 
 
 @app.patch("/vms/{name}")
-def update_vm(name: str, payload: VirtualMachineUpdate):
+async def update_vm(name: str, payload: VirtualMachineUpdate):
     if shutil.which("virsh") is None:
         raise HTTPException(status_code=404, detail="virsh not installed")
     vms = load_vms()
@@ -1706,17 +4824,16 @@ def update_vm(name: str, payload: VirtualMachineUpdate):
     if not vm:
         raise HTTPException(status_code=404, detail="vm not found")
     if payload.cpu is not None:
-        subprocess.run(["virsh", "setvcpus", name, str(payload.cpu), "--config"], capture_output=True)
+        await virsh("setvcpus", name, str(payload.cpu), "--config")
         vm.cpu = payload.cpu
     if payload.memory is not None:
-        subprocess.run(["virsh", "setmem", name, str(payload.memory * 1024), "--config"], capture_output=True)
+        await virsh("setmem", name, str(payload.memory * 1024), "--config")
         vm.memory = payload.memory
     if payload.iso is not None:
         iso_path = os.path.join(ISO_DIR, payload.iso)
         if not os.path.isfile(iso_path):
             raise HTTPException(status_code=404, detail="iso not found")
-        subprocess.run([
-            "virsh",
+        await virsh(
             "change-media",
             name,
             "--path",
@@ -1725,45 +4842,45 @@ def update_vm(name: str, payload: VirtualMachineUpdate):
             "cdrom",
             "--config",
             "--update",
-        ], capture_output=True)
+        )
         vm.iso = payload.iso
     if payload.add_disks:
         for size in payload.add_disks:
             idx = len(vm.disks) + 1
             disk_path = f"/var/lib/libvirt/images/{vm.name}_{idx}.qcow2"
-            subprocess.run(["qemu-img", "create", "-f", "qcow2", disk_path, f"{size}G"], capture_output=True)
-            subprocess.run(["virsh", "attach-disk", name, disk_path, f"vd{chr(96+idx)}", "--config"], capture_output=True)
+            await run_command(["qemu-img", "create", "-f", "qcow2", disk_path, f"{size}G"])
+            await virsh("attach-disk", name, disk_path, f"vd{chr(96+idx)}", "--config")
             vm.disks.append(disk_path)
     save_vms(vms)
     return vm.dict()
 
 
 @app.post("/vms/{name}/start")
-def start_vm(name: str):
+async def start_vm(name: str):
     if shutil.which("virsh") is None:
         raise HTTPException(status_code=404, detail="virsh not installed")
-    result = subprocess.run(["virsh", "start", name], capture_output=True, text=True)
+    result = await virsh("start", name)
     if result.returncode != 0:
         raise HTTPException(status_code=400, detail=result.stderr.strip() or "failed to start")
     return {"detail": "started"}
 
 
 @app.post("/vms/{name}/shutdown")
-def shutdown_vm(name: str):
+async def shutdown_vm(name: str):
     if shutil.which("virsh") is None:
         raise HTTPException(status_code=404, detail="virsh not installed")
-    result = subprocess.run(["virsh", "shutdown", name], capture_output=True, text=True)
+    result = await virsh("shutdown", name)
     if result.returncode != 0:
         raise HTTPException(status_code=400, detail=result.stderr.strip() or "failed to shutdown")
     return {"detail": "shutting down"}
 
 
 @app.delete("/vms/{name}")
-def delete_vm(name: str):
+async def delete_vm(name: str):
     if shutil.which("virsh") is None:
         raise HTTPException(status_code=404, detail="virsh not installed")
-    subprocess.run(["virsh", "destroy", name], capture_output=True)
-    result = subprocess.run(["virsh", "undefine", name, "--remove-all-storage"], capture_output=True, text=True)
+    await virsh("destroy", name)
+    result = await virsh("undefine", name, "--remove-all-storage")
     if result.returncode != 0:
         raise HTTPException(status_code=400, detail=result.stderr.strip() or "failed to delete")
     vms = [vm for vm in load_vms() if vm.name != name]
@@ -1772,13 +4889,50 @@ def delete_vm(name: str):
 
 
 @app.get("/metrics")
-def metrics():
-    return collect_metrics()
+async def metrics():
+    return await latest_metrics()
+
+
+@app.get("/metrics/history")
+def metrics_history(since: float = 0.0):
+    """Return buffered samples taken after the ``since`` timestamp."""
+    return {
+        "interval": METRICS_INTERVAL,
+        "samples": [s for s in _metrics_history if s["timestamp"] > since],
+    }
+
+
+@app.websocket("/metrics/stream")
+async def metrics_stream(websocket: WebSocket):
+    """Push metric samples to the client as they are collected.
+
+    The first frame carries the full sample, every following frame only the
+    fields that changed since the previous frame.
+    """
+    await websocket.accept()
+    if await authenticate_websocket(websocket) is None:
+        await websocket.close(code=1008)
+        return
+    queue: asyncio.Queue = asyncio.Queue(maxsize=1)
+    _metrics_subscribers.add(queue)
+    try:
+        last = await latest_metrics()
+        await websocket.send_json({"type": "full", "data": last})
+        while True:
+            sample = await queue.get()
+            delta = metrics_delta(last, sample)
+            if delta:
+                await websocket.send_json({"type": "delta", "data": delta})
+            last = sample
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        _metrics_subscribers.discard(queue)
 
 
 @app.get("/network/interfaces")
-def list_network_interfaces():
-    return {"interfaces": [i.dict() for i in get_network_interfaces()]}
+async def list_network_interfaces():
+    return {"interfaces": [i.dict() for i in await get_network_interfaces()]}
 
 
 @app.get("/network/settings")
@@ -1793,8 +4947,8 @@ def update_network_settings(payload: NetworkSettingsModel):
 
 
 @app.get("/drives")
-def list_drives():
-    return {"drives": [d.dict() for d in get_drives()]}
+async def list_drives():
+    return {"drives": [d.dict() for d in await get_drives()]}
 
 
 class DriveMountRequest(BaseModel):
@@ -1815,13 +4969,13 @@ class ZFSPoolCreateRequest(BaseModel):
 
 
 @app.get("/drives/zfs")
-def list_zfs_pools():
-    return {"pools": [p.dict() for p in get_zfs_pools()]}
+async def list_zfs_pools():
+    return {"pools": [p.dict() for p in await get_zfs_pools()]}
 
 @app.get("/drives/zfs-debug")
-def zfs_debug():
+async def zfs_debug():
     zpool_path = shutil.which("zpool")
-    result = subprocess.run(["zpool", "status", "-P"], capture_output=True, text=True)
+    result = await run_command(["zpool", "status", "-P"], timeout=COMMAND_TIMEOUT)
     return {
         "zpool_path": zpool_path,
         "returncode": result.returncode,
@@ -1830,17 +4984,19 @@ def zfs_debug():
     }
 
 @app.post("/drives/mount")
-def mount_drive(req: DriveMountRequest):
+async def mount_drive(req: DriveMountRequest):
     if not os.path.exists(req.mountpoint):
         os.makedirs(req.mountpoint, exist_ok=True)
-    result = subprocess.run(["mount", req.device, req.mountpoint], capture_output=True, text=True)
+    result = await run_command(["mount", req.device, req.mountpoint], timeout=COMMAND_TIMEOUT)
+    invalidate_drives()
     if result.returncode != 0:
         raise HTTPException(status_code=400, detail=result.stderr.strip() or "failed to mount")
     return {"detail": "mounted"}
 
 
-@app.post("/drives/format")
-def format_drive(req: DriveFormatRequest):
+@app.post("/drives/format", status_code=202)
+async def format_drive(req: DriveFormatRequest):
+    """Start formatting a drive as a background job."""
     fs = req.filesystem.lower()
     if fs == "ext4":
         cmd = ["mkfs.ext4", "-F"]
@@ -1864,16 +5020,24 @@ def format_drive(req: DriveFormatRequest):
             cmd.extend(["-n", req.label])
     if fs != "zfs":
         cmd.append(req.device)
-    # Unmount the device first in case it is currently mounted
-    subprocess.run(["umount", req.device], capture_output=True)
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    if result.returncode != 0:
-        raise HTTPException(status_code=400, detail=result.stderr.strip() or "failed to format")
-    return {"detail": "formatted"}
 
+    async def work(job: Job) -> dict:
+        # Unmount the device first in case it is currently mounted
+        job.update(message=f"Unmounting {req.device}")
+        await run_command(["umount", req.device], timeout=COMMAND_TIMEOUT)
+        job.update(message=f"Creating {fs} file system")
+        result = await run_command(cmd, on_output=job.write)
+        invalidate_drives()
+        if result.returncode != 0:
+            raise HTTPException(status_code=400, detail=result.stderr.strip() or "failed to format")
+        return {"detail": "formatted"}
+
+    return start_job("format_drive", f"Format {req.device} as {fs}", work).to_dict()
 
-@app.post("/drives/zfs")
-def create_zfs_pool(req: ZFSPoolCreateRequest):
+
+@app.post("/drives/zfs", status_code=202)
+async def create_zfs_pool(req: ZFSPoolCreateRequest):
+    """Start creating a ZFS pool as a background job."""
     if shutil.which("zpool") is None:
         raise HTTPException(status_code=404, detail="zfs not installed")
     if not req.devices:
@@ -1887,10 +5051,17 @@ def create_zfs_pool(req: ZFSPoolCreateRequest):
     elif raid != "stripe":
         raise HTTPException(status_code=400, detail="invalid raid level")
     cmd.extend(req.devices)
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    if result.returncode != 0:
-        raise HTTPException(status_code=400, detail=result.stderr.strip() or "failed to create pool")
-    return {"detail": "created"}
+
+    async def work(job: Job) -> dict:
+        job.update(message=f"Creating pool {req.name}")
+        result = await run_command(cmd, on_output=job.write)
+        invalidate_drives()
+        invalidate_zfs()
+        if result.returncode != 0:
+            raise HTTPException(status_code=400, detail=result.stderr.strip() or "failed to create pool")
+        return {"detail": "created"}
+
+    return start_job("create_zfs_pool", f"Create ZFS pool {req.name}", work).to_dict()
 
 
 @app.get("/users")
@@ -1903,35 +5074,39 @@ def api_list_users(limit: int = 20, offset: int = 0):
 
 
 @app.post("/users")
-def api_create_user(payload: UserCreateModel):
+async def api_create_user(payload: UserCreateModel):
     cmd = ["useradd", "-m", "-s", payload.shell]
     if payload.groups:
         cmd.extend(["-G", ",".join(payload.groups)])
     cmd.append(payload.username)
-    result = subprocess.run(cmd, capture_output=True, text=True)
+    result = await run_command(cmd, timeout=COMMAND_TIMEOUT)
     if result.returncode != 0:
         raise HTTPException(status_code=400, detail=result.stderr.strip() or "failed to create")
     if payload.password:
-        subprocess.run(["chpasswd"], input=f"{payload.username}:{payload.password}", text=True)
+        await run_command(
+            ["chpasswd"], input=f"{payload.username}:{payload.password}", timeout=COMMAND_TIMEOUT
+        )
     return {"detail": "created"}
 
 
 @app.put("/users/{username}")
-def api_update_user(username: str, payload: UserUpdateModel):
+async def api_update_user(username: str, payload: UserUpdateModel):
     if payload.shell:
-        result = subprocess.run(["usermod", "-s", payload.shell, username], capture_output=True, text=True)
+        result = await run_command(["usermod", "-s", payload.shell, username], timeout=COMMAND_TIMEOUT)
         if result.returncode != 0:
             raise HTTPException(status_code=400, detail=result.stderr.strip() or "failed to modify")
     if payload.groups is not None:
-        result = subprocess.run(["usermod", "-G", ",".join(payload.groups), username], capture_output=True, text=True)
+        result = await run_command(
+            ["usermod", "-G", ",".join(payload.groups), username], timeout=COMMAND_TIMEOUT
+        )
         if result.returncode != 0:
             raise HTTPException(status_code=400, detail=result.stderr.strip() or "failed to modify")
     return {"detail": "updated"}
 
 
 @app.delete("/users/{username}")
-def api_delete_user(username: str):
-    result = subprocess.run(["userdel", "-r", username], capture_output=True, text=True)
+async def api_delete_user(username: str):
+    result = await run_command(["userdel", "-r", username])
     if result.returncode != 0:
         raise HTTPException(status_code=400, detail=result.stderr.strip() or "failed to delete")
     return {"detail": "deleted"}
@@ -1995,72 +5170,78 @@ def api_list_groups(limit: int = 20, offset: int = 0):
 
 
 @app.post("/groups")
-def api_create_group(payload: GroupCreateModel):
-    result = subprocess.run(["groupadd", payload.name], capture_output=True, text=True)
+async def api_create_group(payload: GroupCreateModel):
+    result = await run_command(["groupadd", payload.name], timeout=COMMAND_TIMEOUT)
     if result.returncode != 0:
         raise HTTPException(status_code=400, detail=result.stderr.strip() or "failed to create")
     if payload.members:
-        subprocess.run(["gpasswd", "-M", ",".join(payload.members), payload.name], capture_output=True)
+        await run_command(["gpasswd", "-M", ",".join(payload.members), payload.name], timeout=COMMAND_TIMEOUT)
     return {"detail": "created"}
 
 
 @app.put("/groups/{name}")
-def api_update_group(name: str, payload: GroupUpdateModel):
+async def api_update_group(name: str, payload: GroupUpdateModel):
     if payload.members is not None:
-        result = subprocess.run(["gpasswd", "-M", ",".join(payload.members), name], capture_output=True, text=True)
+        result = await run_command(
+            ["gpasswd", "-M", ",".join(payload.members), name], timeout=COMMAND_TIMEOUT
+        )
         if result.returncode != 0:
             raise HTTPException(status_code=400, detail=result.stderr.strip() or "failed to modify")
     return {"detail": "updated"}
 
 
 @app.delete("/groups/{name}")
-def api_delete_group(name: str):
-    result = subprocess.run(["groupdel", name], capture_output=True, text=True)
+async def api_delete_group(name: str):
+    result = await run_command(["groupdel", name], timeout=COMMAND_TIMEOUT)
     if result.returncode != 0:
         raise HTTPException(status_code=400, detail=result.stderr.strip() or "failed to delete")
     return {"detail": "deleted"}
 
 
 @app.get("/services")
-def api_list_services():
-    return {"services": list_systemd_services()}
+async def api_list_services():
+    return {"services": await list_systemd_services()}
 
 
 @app.post("/services/{name}/start")
-def api_start_service(name: str):
+async def api_start_service(name: str):
     if shutil.which("systemctl") is None:
         raise HTTPException(status_code=404, detail="systemctl not installed")
-    result = subprocess.run(["systemctl", "start", name], capture_output=True, text=True)
+    result = await run_command(["systemctl", "start", name])
+    invalidate_services()
     if result.returncode != 0:
         raise HTTPException(status_code=400, detail=result.stderr.strip() or "failed to start")
     return {"detail": "started"}
 
 
 @app.post("/services/{name}/stop")
-def api_stop_service(name: str):
+async def api_stop_service(name: str):
     if shutil.which("systemctl") is None:
         raise HTTPException(status_code=404, detail="systemctl not installed")
-    result = subprocess.run(["systemctl", "stop", name], capture_output=True, text=True)
+    result = await run_command(["systemctl", "stop", name])
+    invalidate_services()
     if result.returncode != 0:
         raise HTTPException(status_code=400, detail=result.stderr.strip() or "failed to stop")
     return {"detail": "stopped"}
 
 
 @app.post("/services/{name}/enable")
-def api_enable_service(name: str):
+async def api_enable_service(name: str):
     if shutil.which("systemctl") is None:
         raise HTTPException(status_code=404, detail="systemctl not installed")
-    result = subprocess.run(["systemctl", "enable", name], capture_output=True, text=True)
+    result = await run_command(["systemctl", "enable", name], timeout=COMMAND_TIMEOUT)
+    invalidate_services()
     if result.returncode != 0:
         raise HTTPException(status_code=400, detail=result.stderr.strip() or "failed to enable")
     return {"detail": "enabled"}
 
 
 @app.post("/services/{name}/disable")
-def api_disable_service(name: str):
+async def api_disable_service(name: str):
     if shutil.which("systemctl") is None:
         raise HTTPException(status_code=404, detail="systemctl not installed")
-    result = subprocess.run(["systemctl", "disable", name], capture_output=True, text=True)
+    result = await run_command(["systemctl", "disable", name], timeout=COMMAND_TIMEOUT)
+    invalidate_services()
     if result.returncode != 0:
         raise HTTPException(status_code=400, detail=result.stderr.strip() or "failed to disable")
     return {"detail": "disabled"}
@@ -2086,24 +5267,684 @@ def api_list_logs():
     return {"logs": logs}
 
 
-@app.get("/logs/{name}")
-def api_get_log(name: str, lines: int = 100):
-    safe_name = os.path.basename(name)
-    path = os.path.join(LOG_DIR, safe_name)
+# Text logs below LOG_DIR are indexed into a sqlite database so they can be
+# searched without reading them. "entries" maps every line to its file, byte
+# offset and time, and the contentless FTS5 table "lines" indexes the text
+# under the same rowid with a trigram tokenizer, so any substring of three or
+# more characters is an index lookup. The text itself is not stored: matched
+# lines are read from the log files by their offset. Rows of a contentless
+# table cannot be deleted without their text, so dropped entries leave their
+# rows behind, unreachable since entry ids are never reused, until they
+# outnumber the live ones and the index is built again. Only the background
+# task writes the index;
+# searches read what it has indexed so far. Files are indexed incrementally
+# from the offset reached last time. A file keeps its entries when log
+# rotation renames it, because files are tracked by inode together with the
+# first LOG_INDEX_HEAD bytes, which tell a reused inode from the same file.
+# Gzip-rotated logs are indexed once with streaming decompression and their
+# offsets refer to the decompressed data.
+LOG_INDEX_FILE = os.path.join(os.path.dirname(__file__), "logs.db")
+LOG_INDEX_INTERVAL = 60.0
+LOG_INDEX_BATCH = 10000
+LOG_INDEX_LINE_MAX = 4096
+LOG_INDEX_HEAD = 1024
+LOG_SEARCH_LIMIT = 1000
+# Candidate lines fetched from the index per round while filtering a search
+LOG_SEARCH_BATCH = 1000
+
+_log_index_lock = threading.Lock()
+_log_index_stop = threading.Event()
+
+_LOG_ISO_TIME = re.compile(rb"(\d{4}-\d{2}-\d{2})[T ](\d{2}:\d{2}:\d{2})(?:[.,]\d+)?(Z|[+-]\d{2}:?\d{2})?")
+_LOG_SYSLOG_TIME = re.compile(rb"([A-Z][a-z]{2}) +(\d{1,2}) (\d{2}):(\d{2}):(\d{2})")
+_MONTHS = {m: i for i, m in enumerate([b"Jan", b"Feb", b"Mar", b"Apr", b"May", b"Jun",
+                                       b"Jul", b"Aug", b"Sep", b"Oct", b"Nov", b"Dec"], start=1)}
+
+
+class _LogTimes:
+    """Parse the timestamp at the start of log lines.
+
+    Syslog timestamps have no year, so the year of the file's mtime is used,
+    minus one for months after it. Lines without a timestamp get the time of
+    the line before them.
+    """
+
+    def __init__(self, mtime: float):
+        modified = datetime.fromtimestamp(mtime)
+        self.year = modified.year
+        self.month = modified.month
+        self.last: int | None = None
+        self.prefix = b""
+
+    def __call__(self, line: bytes) -> int | None:
+        prefix = line[:32]
+        if prefix[:19] == self.prefix[:19] and self.prefix:
+            return self.last
+        match = _LOG_ISO_TIME.match(prefix)
+        try:
+            if match:
+                zone = (match.group(3) or b"").decode().replace("Z", "+00:00")
+                if len(zone) == 5:
+                    zone = zone[:3] + ":" + zone[3:]
+                text = f"{match.group(1).decode()}T{match.group(2).decode()}{zone}"
+                self.last = int(datetime.fromisoformat(text).timestamp())
+                self.prefix = prefix
+            else:
+                match = _LOG_SYSLOG_TIME.match(prefix)
+                if match and match.group(1) in _MONTHS:
+                    month = _MONTHS[match.group(1)]
+                    year = self.year - 1 if month > self.month else self.year
+                    hour, minute, second = (int(g) for g in match.groups()[2:])
+                    moment = datetime(year, month, int(match.group(2)), hour, minute, second)
+                    self.last = int(moment.timestamp())
+                    self.prefix = prefix
+        except ValueError:
+            pass
+        return self.last
+
+
+def _open_log_index() -> sqlite3.Connection:
+    conn = sqlite3.connect(LOG_INDEX_FILE, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    row = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'lines'").fetchone()
+    if row and "content" not in row[0]:
+        # Earlier versions stored a copy of every line, index everything again
+        conn.executescript("DROP TABLE lines; DROP TABLE entries; DROP TABLE IF EXISTS files;")
+    conn.executescript(
+        """
+        CREATE TABLE IF NOT EXISTS files (
+            id INTEGER PRIMARY KEY,
+            name TEXT UNIQUE NOT NULL,
+            inode INTEGER NOT NULL,
+            size INTEGER NOT NULL,
+            mtime INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            binary INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE TABLE IF NOT EXISTS entries (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            file INTEGER NOT NULL,
+            offset INTEGER NOT NULL,
+            time INTEGER
+        );
+        CREATE INDEX IF NOT EXISTS entries_file ON entries (file, offset);
+        CREATE INDEX IF NOT EXISTS entries_time ON entries (time);
+        CREATE VIRTUAL TABLE IF NOT EXISTS lines USING fts5 (line, content = '', tokenize = 'trigram');
+        """
+    )
+    if "head" not in {row[1] for row in conn.execute("PRAGMA table_info(files)")}:
+        conn.execute("ALTER TABLE files ADD COLUMN head BLOB NOT NULL DEFAULT x''")
+    return conn
+
+
+def _read_log_head(path: str) -> bytes:
+    try:
+        with open(path, "rb") as f:
+            return f.read(LOG_INDEX_HEAD)
+    except OSError:
+        return b""
+
+
+def _same_log(head: bytes, stored: bytes) -> bool:
+    """Return whether a file starting with ``head`` is the one indexed with ``stored``."""
+    length = min(len(head), len(stored))
+    return head[:length] == stored[:length]
+
+
+def _drop_log_entries(conn: sqlite3.Connection, file_id: int) -> None:
+    conn.execute("DELETE FROM entries WHERE file = ?", (file_id,))
+
+
+def _compact_log_index(conn: sqlite3.Connection) -> None:
+    """Clear the index once most of its text rows belong to dropped entries.
+
+    Every entry id ever assigned has a row in "lines", so the sequence of
+    "entries" counts them. The files are then indexed again from the start.
+    """
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'entries'").fetchone()
+    rows = row[0] if row else 0
+    live = conn.execute("SELECT count(*) FROM entries").fetchone()[0]
+    if rows - live <= max(live, LOG_INDEX_BATCH):
+        return
+    with conn:
+        conn.execute("INSERT INTO lines (lines) VALUES ('delete-all')")
+        conn.execute("DELETE FROM entries")
+        conn.execute("DELETE FROM sqlite_sequence WHERE name = 'entries'")
+        conn.execute("UPDATE files SET position = 0, size = 0, mtime = 0")
+
+
+def _index_log_file(conn: sqlite3.Connection, file_id: int, path: str, position: int, stat: os.stat_result) -> None:
+    """Index the whole lines of ``path`` after ``position``."""
+    compressed = path.endswith(".gz")
+    opener = gzip.open if compressed else open
+    times = _LogTimes(stat.st_mtime)
+    if position:
+        # Seed the time of continuation lines from the last indexed line
+        row = conn.execute(
+            "SELECT time FROM entries WHERE file = ? ORDER BY offset DESC LIMIT 1", (file_id,)
+        ).fetchone()
+        times.last = row[0] if row else None
+    with opener(path, "rb") as f:
+        if not compressed:
+            f.seek(position)
+        batch: list[tuple[int, int, int | None, str]] = []
+        row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'entries'").fetchone()
+        next_id = (row[0] if row else 0) + 1
+        for line in f:
+            if not line.endswith(b"\n") and not compressed:
+                break  # still being written
+            text = line[:LOG_INDEX_LINE_MAX].rstrip(b"\r\n")
+            if text:
+                batch.append((next_id, position, times(text), text.decode(errors="replace")))
+                next_id += 1
+            position += len(line)
+            if len(batch) >= LOG_INDEX_BATCH:
+                _store_log_lines(conn, file_id, batch, position)
+                batch = []
+                if _log_index_stop.is_set():
+                    return
+        _store_log_lines(conn, file_id, batch, position)
+
+
+def _store_log_lines(conn: sqlite3.Connection, file_id: int, batch: list, position: int) -> None:
+    with conn:
+        conn.executemany(
+            "INSERT INTO entries (id, file, offset, time) VALUES (?, ?, ?, ?)",
+            [(rowid, file_id, offset, time_) for rowid, offset, time_, _ in batch],
+        )
+        conn.executemany("INSERT INTO lines (rowid, line) VALUES (?, ?)", [(b[0], b[3]) for b in batch])
+        conn.execute("UPDATE files SET position = ? WHERE id = ?", (position, file_id))
+
+
+def _is_binary_log(path: str) -> bool:
+    try:
+        with (gzip.open if path.endswith(".gz") else open)(path, "rb") as f:
+            return b"\0" in f.read(4096)
+    except (OSError, EOFError, gzip.BadGzipFile):
+        return True
+
+
+def update_log_index() -> None:
+    """Bring the log index up to date with the files below LOG_DIR."""
+    with _log_index_lock:
+        conn = _open_log_index()
+        try:
+            _update_log_index(conn)
+        finally:
+            conn.close()
+
+
+def _update_log_index(conn: sqlite3.Connection) -> None:
+    _compact_log_index(conn)
+    current: dict[str, os.stat_result] = {}
+    for root, _, names in os.walk(LOG_DIR):
+        for name in names:
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if os.path.isfile(path):
+                current[os.path.relpath(path, LOG_DIR)] = stat
+    records = {
+        row[0]: row for row in conn.execute("SELECT id, name, inode, size, mtime, position, binary, head FROM files")
+    }
+    by_inode = {row[2]: row for row in records.values()}
+    # Files are matched to their records by inode, so files renamed by log
+    # rotation keep their entries. A file whose start differs from the
+    # indexed one reuses the inode of a deleted file and starts over.
+    claimed: dict[int, str] = {}
+    for name, stat in current.items():
+        record = by_inode.get(stat.st_ino)
+        if (
+            record
+            and record[0] not in claimed
+            and record[1].endswith(".gz") == name.endswith(".gz")
+            and _same_log(_read_log_head(os.path.join(LOG_DIR, name)), record[7])
+        ):
+            claimed[record[0]] = name
+    renamed = [(file_id, name) for file_id, name in claimed.items() if records[file_id][1] != name]
+    with conn:
+        for file_id in records.keys() - claimed.keys():
+            _drop_log_entries(conn, file_id)
+            conn.execute("DELETE FROM files WHERE id = ?", (file_id,))
+        # Park renamed records under unique names first, names may be swapped
+        for file_id, _ in renamed:
+            conn.execute("UPDATE files SET name = ? WHERE id = ?", (f"\0{file_id}", file_id))
+        for file_id, name in renamed:
+            conn.execute("UPDATE files SET name = ? WHERE id = ?", (name, file_id))
+    records = {name: (file_id, name, *records[file_id][2:]) for file_id, name in claimed.items()}
+    for name, stat in sorted(current.items()):
+        if _log_index_stop.is_set():
+            return
+        path = os.path.join(LOG_DIR, name)
+        record = records.get(name)
+        compressed = name.endswith(".gz")
+        if record:
+            file_id, _, _, size, mtime, position, binary, _ = record
+            unchanged = size == stat.st_size and mtime == stat.st_mtime_ns
+            if unchanged or binary:
+                if binary and not unchanged:
+                    conn.execute("UPDATE files SET size = ?, mtime = ? WHERE id = ?", (stat.st_size, stat.st_mtime_ns, file_id))
+                    conn.commit()
+                continue
+            if stat.st_size < size or stat.st_mtime_ns < mtime or compressed:
+                # Truncated or replaced, start over
+                with conn:
+                    _drop_log_entries(conn, file_id)
+                    conn.execute("UPDATE files SET position = 0 WHERE id = ?", (file_id,))
+                position = 0
+        else:
+            binary = _is_binary_log(path)
+            with conn:
+                file_id = conn.execute(
+                    "INSERT INTO files (name, inode, size, mtime, position, binary, head) VALUES (?, ?, ?, ?, 0, ?, ?)",
+                    (name, stat.st_ino, stat.st_size, stat.st_mtime_ns, int(binary), _read_log_head(path)),
+                ).lastrowid
+            if binary:
+                continue
+            position = 0
+        try:
+            _index_log_file(conn, file_id, path, position, stat)
+        except (OSError, EOFError, gzip.BadGzipFile) as exc:
+            print(f"failed to index {path}: {exc}")
+        with conn:
+            conn.execute(
+                "UPDATE files SET size = ?, mtime = ?, head = ? WHERE id = ?",
+                (stat.st_size, stat.st_mtime_ns, _read_log_head(path), file_id),
+            )
+
+
+async def index_logs_periodically() -> None:
+    while True:
+        try:
+            await asyncio.to_thread(update_log_index)
+        except Exception as exc:
+            print(f"log indexing failed: {exc}")
+        await asyncio.sleep(LOG_INDEX_INTERVAL)
+
+
+@lru_cache(maxsize=32)
+def _compile_log_regex(pattern: str) -> re.Pattern:
+    return re.compile(pattern)
+
+
+def _parse_log_time(value: str | None) -> int | None:
+    if value is None:
+        return None
+    try:
+        return int(float(value))
+    except ValueError:
+        pass
+    try:
+        return int(datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp())
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"invalid time: {value}")
+
+
+def _read_log_lines(name: str, offsets: list[int]) -> dict[int, str]:
+    """Read the lines starting at ``offsets`` of a log, as they were indexed."""
+    path = os.path.join(LOG_DIR, name)
+    lines: dict[int, str] = {}
+    try:
+        if name.endswith(".gz"):
+            # Offsets refer to the decompressed data, read forward in one pass
+            with gzip.open(path, "rb") as f:
+                for offset in sorted(offsets):
+                    f.seek(offset)
+                    lines[offset] = f.readline(LOG_INDEX_LINE_MAX)
+        else:
+            fd = os.open(path, os.O_RDONLY)
+            try:
+                for offset in offsets:
+                    lines[offset] = os.pread(fd, LOG_INDEX_LINE_MAX, offset)
+            finally:
+                os.close(fd)
+    except (OSError, EOFError, gzip.BadGzipFile):
+        pass
+    return {
+        offset: data.split(b"\n", 1)[0].rstrip(b"\r").decode(errors="replace")
+        for offset, data in lines.items()
+    }
+
+
+def search_logs(
+    q: str | None,
+    regex: str | None,
+    since: int | None,
+    until: int | None,
+    file: str | None,
+    limit: int,
+    before: int | None,
+) -> dict:
+    """Return up to ``limit`` matching lines, most recently indexed first.
+
+    Candidates are walked by descending entry id from ``before`` on, so a
+    page never sorts more than it returns. Their text is read from the log
+    files and checked against ``q`` and ``regex``, which also drops lines
+    that changed since they were indexed.
+    """
+    conditions: list[str] = []
+    params: list[Any] = []
+    if q and len(q) >= 3:
+        conditions.append("lines MATCH ?")
+        params.append('"' + q.replace('"', '""') + '"')
+        source = "lines JOIN entries ON entries.id = lines.rowid"
+        key = "lines.rowid"
+    else:
+        source = "entries"
+        key = "entries.id"
+    if since is not None:
+        conditions.append("entries.time >= ?")
+        params.append(since)
+    if until is not None:
+        conditions.append("entries.time < ?")
+        params.append(until)
+    if file:
+        conditions.append("files.name = ?")
+        params.append(file)
+    conditions.append(f"{key} < ?")
+    query = f"""
+        SELECT entries.id, files.name, entries.offset, entries.time
+        FROM {source}
+        JOIN files ON files.id = entries.file
+        WHERE {' AND '.join(conditions)}
+        ORDER BY {key} DESC
+        LIMIT ?
+    """
+    needle = q.lower() if q else None
+    pattern = _compile_log_regex(regex) if regex else None
+    results: list[dict] = []
+    cursor = before if before is not None else 2**63 - 1
+    conn = _open_log_index()
+    try:
+        while len(results) < limit:
+            rows = conn.execute(query, (*params, cursor, LOG_SEARCH_BATCH)).fetchall()
+            if not rows:
+                cursor = None
+                break
+            texts: dict[str, dict[int, str]] = {}
+            for name in {row[1] for row in rows}:
+                texts[name] = _read_log_lines(name, [row[2] for row in rows if row[1] == name])
+            for entry_id, name, position, time_ in rows:
+                cursor = entry_id
+                line = texts[name].get(position)
+                if line is None or (needle and needle not in line.lower()):
+                    continue
+                if pattern and not pattern.search(line):
+                    continue
+                results.append({"file": name, "offset": position, "time": time_, "line": line})
+                if len(results) == limit:
+                    break
+            if len(rows) < LOG_SEARCH_BATCH and len(results) < limit:
+                cursor = None
+    finally:
+        conn.close()
+    return {"results": results, "next": cursor}
+
+
+@app.get("/logs/search")
+async def api_search_logs(
+    q: str | None = None,
+    regex: str | None = None,
+    since: str | None = None,
+    until: str | None = None,
+    file: str | None = None,
+    limit: int = 100,
+    before: int | None = None,
+):
+    """Search the lines of all text logs below LOG_DIR, most recently indexed first.
+
+    ``q`` matches a case-insensitive substring and ``regex`` a Python regular
+    expression; ``since``/``until`` take epoch seconds or ISO timestamps.
+    Lines without a timestamp of their own carry the one of the line before.
+    The next page starts ``before`` the ``next`` value of the previous one,
+    which is null after the last page.
+    """
+    if regex:
+        try:
+            _compile_log_regex(regex)
+        except re.error as exc:
+            raise HTTPException(status_code=400, detail=f"invalid regex: {exc}")
+    limit = max(1, min(limit, LOG_SEARCH_LIMIT))
+    return await asyncio.to_thread(
+        search_logs, q, regex, _parse_log_time(since), _parse_log_time(until), file, limit, before
+    )
+
+
+# Log files are read with pread in blocks of LOG_READ_BLOCK bytes. A cursor
+# ("<inode>:<offset>") marks a position in a log. A request with a cursor
+# returns at most LOG_READ_LIMIT bytes of whole lines after it, and starts
+# over at the beginning of the file when the log was rotated or truncated.
+LOG_READ_BLOCK = 64 * 1024
+LOG_READ_LIMIT = 1024 * 1024
+# Followers re-check their log at least this often. This is the only way to
+# notice changes when inotify is unavailable.
+LOG_POLL_INTERVAL = 1.0
+
+
+def _log_path(name: str) -> str:
+    path = os.path.join(LOG_DIR, os.path.basename(name))
     if not os.path.isfile(path):
         raise HTTPException(status_code=404, detail="log not found")
+    return path
+
+
+def _parse_log_cursor(cursor: str) -> tuple[int, int]:
+    try:
+        inode, offset = (int(part) for part in cursor.split(":"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="invalid cursor")
+    return inode, max(offset, 0)
+
+
+def tail_log(path: str, lines: int) -> tuple[bytes, str]:
+    """Return the last ``lines`` lines of a log and the cursor of its end.
+
+    Blocks are read backwards from the end until enough lines were seen.
+    """
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        stat = os.fstat(fd)
+        pos = stat.st_size
+        blocks: list[bytes] = []
+        newlines = 0
+        while pos > 0 and newlines <= lines:
+            size = min(LOG_READ_BLOCK, pos)
+            pos -= size
+            block = os.pread(fd, size, pos)
+            blocks.append(block)
+            newlines += block.count(b"\n")
+        end = stat.st_size - pos
+        data = b"".join(reversed(blocks))[:end]
+    finally:
+        os.close(fd)
+    parts = data.split(b"\n")
+    # A trailing newline ends the last line, it does not start a new one
+    keep = lines + 1 if parts[-1] == b"" else lines
+    data = b"\n".join(parts[-keep:]) if keep else b""
+    return data, f"{stat.st_ino}:{stat.st_size}"
+
+
+def read_log(path: str, cursor: str, limit: int = LOG_READ_LIMIT) -> tuple[bytes, str, bool]:
+    """Return whole lines after ``cursor``, the cursor after them and whether
+    the log was rotated or truncated since ``cursor``."""
+    inode, offset = _parse_log_cursor(cursor)
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        stat = os.fstat(fd)
+        reset = stat.st_ino != inode or stat.st_size < offset
+        if reset:
+            offset = 0
+        data = os.pread(fd, min(limit, stat.st_size - offset), offset)
+    finally:
+        os.close(fd)
+    # Hold back a partial last line unless it alone fills the limit
+    cut = data.rfind(b"\n") + 1
+    if cut or len(data) < limit:
+        data = data[:cut]
+    return data, f"{stat.st_ino}:{offset + len(data)}", reset
+
+
+@app.get("/logs/{name}")
+async def api_get_log(name: str, lines: int = 100, cursor: str | None = None):
+    """Return the last ``lines`` lines of a log (all of it for 0), or the
+    lines appended after ``cursor``.
+
+    The X-Log-Cursor response header holds the cursor to continue from.
+    """
+    path = _log_path(name)
     try:
+        if cursor is not None:
+            data, cursor, reset = await asyncio.to_thread(read_log, path, cursor)
+            headers = {"X-Log-Cursor": cursor}
+            if reset:
+                headers["X-Log-Reset"] = "1"
+            return Response(data, media_type="text/plain", headers=headers)
         if lines > 0:
-            result = run_subprocess(["tail", "-n", str(lines), path])
-            content = result.stdout
+            data, cursor = await asyncio.to_thread(tail_log, path, lines)
+            return Response(data, media_type="text/plain", headers={"X-Log-Cursor": cursor})
+        stat = os.stat(path)
+        headers = {"Content-Length": str(stat.st_size), "X-Log-Cursor": f"{stat.st_ino}:{stat.st_size}"}
+        return FileRangeResponse(path, 0, stat.st_size, 200, headers, media_type="text/plain")
+    except OSError:
+        raise HTTPException(status_code=400, detail="failed to read")
+
+
+# Followed logs are watched with one inotify watch on LOG_DIR, which reports
+# writes to the files in it as well as files being created, moved or
+# deleted by log rotation. Each follower gets an event that is set when its
+# file changes. The watch is dropped again when nobody follows a log.
+_IN_MODIFY = 0x2
+_IN_MOVED_FROM = 0x40
+_IN_MOVED_TO = 0x80
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_IN_Q_OVERFLOW = 0x4000
+_INOTIFY_EVENT = struct.Struct("iIII")
+
+_log_watch_fd: int | None = None
+_log_followers: dict[str, set[asyncio.Event]] = {}
+
+
+def _start_log_watch() -> None:
+    global _log_watch_fd
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    except (OSError, AttributeError):
+        return
+    if fd < 0:
+        return
+    mask = _IN_MODIFY | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+    if libc.inotify_add_watch(fd, LOG_DIR.encode(), mask) < 0:
+        os.close(fd)
+        return
+    _log_watch_fd = fd
+    asyncio.get_running_loop().add_reader(fd, _read_log_events)
+
+
+def _stop_log_watch() -> None:
+    global _log_watch_fd
+    if _log_watch_fd is not None:
+        asyncio.get_running_loop().remove_reader(_log_watch_fd)
+        os.close(_log_watch_fd)
+        _log_watch_fd = None
+
+
+def _read_log_events() -> None:
+    try:
+        data = os.read(_log_watch_fd, 64 * 1024)
+    except BlockingIOError:
+        return
+    pos = 0
+    while pos + _INOTIFY_EVENT.size <= len(data):
+        _, mask, _, length = _INOTIFY_EVENT.unpack_from(data, pos)
+        pos += _INOTIFY_EVENT.size
+        name = data[pos : pos + length].rstrip(b"\0").decode(errors="surrogateescape")
+        pos += length
+        if mask & _IN_Q_OVERFLOW:
+            followers = [e for events in _log_followers.values() for e in events]
         else:
-            with open(path) as f:
-                content = f.read()
+            followers = _log_followers.get(name, ())
+        for event in followers:
+            event.set()
+
+
+def follow_log_changes(name: str) -> asyncio.Event:
+    """Return an event that is set whenever the log ``name`` changes."""
+    if not _log_followers and _log_watch_fd is None:
+        _start_log_watch()
+    event = asyncio.Event()
+    _log_followers.setdefault(name, set()).add(event)
+    return event
+
+
+def unfollow_log_changes(name: str, event: asyncio.Event) -> None:
+    events = _log_followers.get(name)
+    if events is not None:
+        events.discard(event)
+        if not events:
+            del _log_followers[name]
+    if not _log_followers:
+        _stop_log_watch()
+
+
+@app.websocket("/logs/{name}/follow")
+async def follow_log(websocket: WebSocket, name: str, lines: int = 100, cursor: str | None = None):
+    """Push lines appended to a log as JSON frames.
+
+    The connection starts with the last ``lines`` lines, or with the lines
+    after ``cursor`` when resuming. Every "data" frame carries the cursor
+    after its lines. A "reset" frame announces that the log was rotated or
+    truncated and is followed by the new file from its start.
+    """
+    await websocket.accept()
+    if await authenticate_websocket(websocket) is None:
+        await websocket.close(code=1008)
+        return
+    name = os.path.basename(name)
+    try:
+        path = _log_path(name)
     except HTTPException:
-        raise
-    except Exception:
-        raise HTTPException(status_code=400, detail="failed to read")
-    return Response(content, media_type="text/plain")
+        await websocket.close(code=1008, reason="log not found")
+        return
+
+    async def closed() -> None:
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+
+    changed = follow_log_changes(name)
+    disconnect = asyncio.ensure_future(closed())
+    try:
+        if cursor is None:
+            data, cursor = await asyncio.to_thread(tail_log, path, max(lines, 0))
+            await websocket.send_json({"type": "data", "data": data.decode(errors="replace"), "cursor": cursor})
+        else:
+            _parse_log_cursor(cursor)
+        while not disconnect.done():
+            changed.clear()
+            try:
+                data, cursor, reset = await asyncio.to_thread(read_log, path, cursor)
+            except OSError:
+                # Between moving the old log away and creating the new one
+                data, reset = b"", False
+            if reset:
+                await websocket.send_json({"type": "reset"})
+            if data:
+                await websocket.send_json({"type": "data", "data": data.decode(errors="replace"), "cursor": cursor})
+                continue
+            wait = asyncio.ensure_future(changed.wait())
+            await asyncio.wait({wait, disconnect}, timeout=LOG_POLL_INTERVAL, return_when=asyncio.FIRST_COMPLETED)
+            wait.cancel()
+    except HTTPException as exc:
+        await websocket.close(code=1008, reason=exc.detail)
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        disconnect.cancel()
+        unfollow_log_changes(name, changed)
 
 
 @app.get("/settings")
@@ -2111,51 +5952,63 @@ def get_settings():
     return load_settings().dict()
 
 
+def _write_hosts_entry(hostname: str) -> None:
+    with open("/etc/hosts", "r+") as f:
+        lines = f.readlines()
+        updated = False
+        for i, line in enumerate(lines):
+            if line.startswith("127.0.1.1"):
+                parts = line.split()
+                if len(parts) >= 1:
+                    lines[i] = f"127.0.1.1\t{hostname}\n"
+                    updated = True
+                    break
+        if not updated:
+            lines.append(f"127.0.1.1\t{hostname}\n")
+        f.seek(0)
+        f.writelines(lines)
+        f.truncate()
+
+
+def _write_hostname(hostname: str) -> None:
+    with open("/etc/hostname", "w") as f:
+        f.write(hostname + "\n")
+
+
+def _write_sshd_port(port: int) -> None:
+    config_path = "/etc/ssh/sshd_config"
+    lines = []
+    if os.path.exists(config_path):
+        with open(config_path) as f:
+            lines = f.readlines()
+    found = False
+    for i, line in enumerate(lines):
+        stripped = line.strip()
+        if stripped and not stripped.startswith("#") and stripped.lower().startswith("port"):
+            lines[i] = f"Port {port}\n"
+            found = True
+            break
+    if not found:
+        lines.append(f"Port {port}\n")
+    with open(config_path, "w") as f:
+        f.writelines(lines)
+
+
 @app.post("/settings")
-def update_settings(payload: SettingsModel):
-    save_settings(payload)
+async def update_settings(payload: SettingsModel):
+    await asyncio.to_thread(save_settings, payload)
     try:
-        with open("/etc/hosts", "r+") as f:
-            lines = f.readlines()
-            updated = False
-            for i, line in enumerate(lines):
-                if line.startswith("127.0.1.1"):
-                    parts = line.split()
-                    if len(parts) >= 1:
-                        lines[i] = f"127.0.1.1\t{payload.hostname}\n"
-                        updated = True
-                        break
-            if not updated:
-                lines.append(f"127.0.1.1\t{payload.hostname}\n")
-            f.seek(0)
-            f.writelines(lines)
-            f.truncate()
+        await asyncio.to_thread(_write_hosts_entry, payload.hostname)
     except Exception:
         pass
     try:
-        with open("/etc/hostname", "w") as f:
-            f.write(payload.hostname.strip() + "\n")
-        subprocess.run(["hostnamectl", "set-hostname", payload.hostname.strip()], capture_output=True)
+        await asyncio.to_thread(_write_hostname, payload.hostname.strip())
+        await run_command(["hostnamectl", "set-hostname", payload.hostname.strip()], timeout=COMMAND_TIMEOUT)
     except Exception:
         pass
     try:
-        config_path = "/etc/ssh/sshd_config"
-        lines = []
-        if os.path.exists(config_path):
-            with open(config_path) as f:
-                lines = f.readlines()
-        found = False
-        for i, line in enumerate(lines):
-            stripped = line.strip()
-            if stripped and not stripped.startswith("#") and stripped.lower().startswith("port"):
-                lines[i] = f"Port {payload.ssh_port}\n"
-                found = True
-                break
-        if not found:
-            lines.append(f"Port {payload.ssh_port}\n")
-        with open(config_path, "w") as f:
-            f.writelines(lines)
-        subprocess.run(["systemctl", "restart", "sshd"], capture_output=True)
+        await asyncio.to_thread(_write_sshd_port, payload.ssh_port)
+        await run_command(["systemctl", "restart", "sshd"])
     except Exception:
         pass
     return {"detail": "saved"}
@@ -0,0 +1,51 @@
+import asyncio
+import os
+import sys
+from contextlib import asynccontextmanager
+
+import pytest_asyncio
+import uvicorn
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@asynccontextmanager
+async def _serve(app, uds: str | None = None):
+    """Run an ASGI app with uvicorn on a unix socket or a free local port.
+
+    Yields the socket path or the base URL of the server.
+    """
+    if uds:
+        config = uvicorn.Config(app, uds=uds, log_level="warning", lifespan="off")
+    else:
+        config = uvicorn.Config(app, host="127.0.0.1", port=0, log_level="warning", lifespan="off")
+    server = uvicorn.Server(config)
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        if task.done():
+            task.result()
+        await asyncio.sleep(0.01)
+    try:
+        if uds:
+            yield uds
+        else:
+            port = server.servers[0].sockets[0].getsockname()[1]
+            yield f"http://127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        await task
+
+
+@pytest_asyncio.fixture
+async def serve():
+    """Return a factory that starts fake servers for the duration of a test."""
+    stack = []
+
+    async def start(app, uds: str | None = None) -> str:
+        context = _serve(app, uds)
+        stack.append(context)
+        return await context.__aenter__()
+
+    yield start
+    for context in reversed(stack):
+        await context.__aexit__(None, None, None)
@@ -0,0 +1,40 @@
+import base64
+
+from fastapi import FastAPI, WebSocket
+from fastapi.testclient import TestClient
+
+import main
+
+
+def _basic(user, password):
+    return "Basic " + base64.b64encode(f"{user}:{password}".encode()).decode()
+
+
+def test_login_requires_basic(monkeypatch):
+    monkeypatch.setattr(main, "_pam_authenticate", lambda user, password: (user, password) == ("alice", "secret"))
+    client = TestClient(main.app)
+    res = client.post("/auth/login", headers={"Authorization": _basic("alice", "secret")})
+    assert res.status_code == 200
+    token = res.json()["token"]
+    assert main.verify_session_token(token) == "alice"
+    # A session token must not mint its successor
+    res = client.post("/auth/login", headers={"Authorization": f"Bearer {token}"})
+    assert res.status_code == 401
+
+
+def test_websocket_token_only_in_first_message():
+    token, _ = main.create_session_token("alice")
+    app = FastAPI()
+
+    @app.websocket("/ws")
+    async def ws(websocket: WebSocket):
+        await websocket.accept()
+        await websocket.send_json({"user": await main.authenticate_websocket(websocket)})
+
+    client = TestClient(app)
+    with client.websocket_connect(f"/ws?token={token}") as socket:
+        socket.send_text("Bearer invalid")
+        assert socket.receive_json() == {"user": None}
+    with client.websocket_connect("/ws") as socket:
+        socket.send_text(f"Bearer {token}")
+        assert socket.receive_json() == {"user": "alice"}
@@ -0,0 +1,35 @@
+import asyncio
+import subprocess
+
+import pytest
+
+import main
+
+
+@pytest.mark.asyncio
+async def test_zpool_reads_do_not_wait_for_changes(monkeypatch):
+    monkeypatch.setattr(main, "_command_limits", {})
+    change = main._command_semaphore(["zpool", "create", "-f", "tank", "/dev/sdb"])
+    read = main._command_semaphore(["zpool", "status", "-P", "-p"])
+    assert change is not read
+    assert change is main._command_semaphore(["/sbin/zpool", "destroy", "tank"])
+    assert read is main._command_semaphore(["zpool", "get", "-H", "-p", "size"])
+    async with change:
+        assert change.locked()
+        assert not read.locked()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_gpu_probes_share_result(monkeypatch):
+    calls = []
+
+    async def run_command(cmd, **kwargs):
+        calls.append(cmd[0])
+        await asyncio.sleep(0.05)
+        return subprocess.CompletedProcess(cmd, 0, "NVIDIA GeForce RTX 3060\n", "")
+
+    monkeypatch.setattr(main, "_gpu_model", None)
+    monkeypatch.setattr(main, "run_command", run_command)
+    models = await asyncio.gather(*(main.get_gpu_model() for _ in range(3)))
+    assert models == ["NVIDIA GeForce RTX 3060"] * 3
+    assert calls == ["nvidia-smi"]
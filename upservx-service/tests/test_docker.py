@@ -0,0 +1,171 @@
+import base64
+import json
+
+import pytest
+import pytest_asyncio
+from fastapi import HTTPException
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+import main
+
+
+class FakeDocker:
+    """A minimal Docker Engine API that records the requests it receives."""
+
+    def __init__(self, pull_lines: list[dict]):
+        self.pull_lines = pull_lines
+        self.images: set[str] = set()
+        self.calls: list[tuple[str, str]] = []
+        self.created: list[dict] = []
+        self.registry_auth: list[str | None] = []
+        self.app = Starlette(
+            routes=[
+                Route("/containers/json", self.containers),
+                Route("/images/create", self.pull, methods=["POST"]),
+                Route("/containers/create", self.create, methods=["POST"]),
+                Route("/containers/{id}/start", self.start, methods=["POST"]),
+            ]
+        )
+
+    async def containers(self, request: Request):
+        self.calls.append(("GET", f"/containers/json?{request.url.query}"))
+        return JSONResponse(
+            [
+                {
+                    "Names": ["/web"],
+                    "State": "running",
+                    "Image": "nginx:latest",
+                    "Created": 0,
+                    "Ports": [
+                        {"IP": "0.0.0.0", "PrivatePort": 80, "PublicPort": 8080, "Type": "tcp"},
+                        {"IP": "::", "PrivatePort": 80, "PublicPort": 8080, "Type": "tcp"},
+                    ],
+                },
+                {"Names": ["/db"], "State": "exited", "Image": "postgres:16", "Created": 0, "Ports": []},
+            ]
+        )
+
+    async def pull(self, request: Request):
+        image = f"{request.query_params['fromImage']}:{request.query_params['tag']}"
+        self.calls.append(("POST", f"/images/create {image}"))
+        self.registry_auth.append(request.headers.get("X-Registry-Auth"))
+
+        async def lines():
+            for line in self.pull_lines:
+                yield json.dumps(line).encode() + b"\r\n"
+            self.images.add(image)
+
+        return StreamingResponse(lines(), media_type="application/json")
+
+    async def create(self, request: Request):
+        body = await request.json()
+        self.calls.append(("POST", f"/containers/create {request.query_params['name']}"))
+        if body["Image"] not in self.images:
+            return JSONResponse({"message": f"No such image: {body['Image']}"}, status_code=404)
+        self.created.append(body)
+        return JSONResponse({"Id": "c0ffee"}, status_code=201)
+
+    async def start(self, request: Request):
+        self.calls.append(("POST", f"/containers/{request.path_params['id']}/start"))
+        return Response(status_code=204)
+
+
+@pytest_asyncio.fixture
+async def docker(serve, tmp_path, monkeypatch):
+    async def start(pull_lines: list[dict]) -> FakeDocker:
+        fake = FakeDocker(pull_lines)
+        monkeypatch.setattr(main, "DOCKER_SOCKET", await serve(fake.app, uds=str(tmp_path / "docker.sock")))
+        return fake
+
+    monkeypatch.setattr(main, "_docker_client", None)
+    monkeypatch.setattr(main, "DOCKER_CONFIG", str(tmp_path / "config.json"))
+    yield start
+    if main._docker_client is not None:
+        await main._docker_client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_list_containers(docker):
+    fake = await docker([])
+    containers = await main.get_docker_containers()
+    assert fake.calls == [("GET", "/containers/json?all=1")]
+    assert [(c.name, c.status, c.image) for c in containers] == [
+        ("web", "running", "nginx:latest"),
+        ("db", "stopped", "postgres:16"),
+    ]
+    assert containers[0].ports == ["0.0.0.0:8080->80/tcp", ":::8080->80/tcp"]
+    assert containers[1].ports == []
+
+
+@pytest.mark.asyncio
+async def test_pull_error_mid_stream(docker):
+    await docker(
+        [
+            {"status": "Pulling from library/nginx", "id": "latest"},
+            {"status": "Downloading", "id": "a1b2", "progressDetail": {"current": 1, "total": 2}},
+            {"errorDetail": {"message": "unexpected EOF"}, "error": "unexpected EOF"},
+            {"status": "Extracting"},
+        ]
+    )
+    progress: list[dict] = []
+    with pytest.raises(HTTPException) as exc:
+        await main.docker_pull("nginx", progress.append)
+    assert exc.value.status_code == 400
+    assert exc.value.detail == "unexpected EOF"
+    assert [p["status"] for p in progress] == ["Pulling from library/nginx", "Downloading"]
+
+
+@pytest.mark.asyncio
+async def test_run_pulls_missing_image(docker):
+    fake = await docker([{"status": "Pulling from library/nginx"}, {"status": "Downloaded newer image"}])
+    payload = main.ContainerCreate(
+        name="web", type="Docker", image="nginx:latest", ports=["127.0.0.1:8080:80"], envs=["A=1"]
+    )
+    await main.docker_run(payload)
+    assert fake.calls == [
+        ("POST", "/containers/create web"),
+        ("POST", "/images/create nginx:latest"),
+        ("POST", "/containers/create web"),
+        ("POST", "/containers/c0ffee/start"),
+    ]
+    assert fake.created[0]["Env"] == ["A=1"]
+    assert fake.created[0]["ExposedPorts"] == {"80/tcp": {}}
+    assert fake.created[0]["HostConfig"]["PortBindings"] == {"80/tcp": [{"HostIp": "127.0.0.1", "HostPort": "8080"}]}
+
+
+def _decode_auth(header: str) -> dict:
+    return json.loads(base64.urlsafe_b64decode(header))
+
+
+@pytest.mark.asyncio
+async def test_pull_sends_registry_auth(docker, monkeypatch, tmp_path):
+    fake = await docker([{"status": "Downloaded newer image"}])
+    (tmp_path / "config.json").write_text(
+        json.dumps(
+            {
+                "auths": {"registry.example.com:5000": {"auth": base64.b64encode(b"bob:s3:cret").decode()}},
+                "credHelpers": {"ghcr.io": "fake"},
+            }
+        )
+    )
+    helper_calls = []
+
+    async def run_command(cmd, input=None, **kwargs):
+        helper_calls.append((cmd, input))
+        return main.subprocess.CompletedProcess(cmd, 0, json.dumps({"Username": "<token>", "Secret": "tok"}), "")
+
+    monkeypatch.setattr(main, "run_command", run_command)
+    await main.docker_pull("registry.example.com:5000/team/app:1.0")
+    await main.docker_pull("ghcr.io/org/tool")
+    await main.docker_pull("nginx")
+    assert _decode_auth(fake.registry_auth[0]) == {
+        "username": "bob",
+        "password": "s3:cret",
+        "serveraddress": "registry.example.com:5000",
+    }
+    assert _decode_auth(fake.registry_auth[1]) == {"identitytoken": "tok", "serveraddress": "ghcr.io"}
+    assert helper_calls == [(["docker-credential-fake", "get"], "ghcr.io")]
+    assert fake.registry_auth[2] is None
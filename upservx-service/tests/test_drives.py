@@ -0,0 +1,141 @@
+import asyncio
+import socket
+from types import SimpleNamespace
+
+import pytest
+
+import main
+
+MOUNTINFO = """\
+22 1 252:1 / / rw,relatime shared:1 - ext4 /dev/vda1 rw
+23 22 0:21 / /proc rw,nosuid shared:2 - proc proc rw
+31 22 0:33 /@home /home rw,relatime shared:3 - btrfs /dev/sdb2 rw,space_cache=v2,subvolid=257
+32 22 0:33 /@data /srv/my\\040data rw,relatime shared:4 - btrfs /dev/sdb2 rw,subvolid=258
+33 22 0:34 / /mnt/crypt rw,relatime shared:5 - btrfs /dev/mapper/crypt rw
+"""
+
+SYSFS = {
+    "/sys/class/block/vda1/dev": "252:1",
+    "/sys/class/block/sdb2/dev": "8:18",
+    "/sys/class/block/dm-0/dev": "253:0",
+}
+
+
+def test_mount_table_resolves_sources(tmp_path, monkeypatch):
+    path = tmp_path / "mountinfo"
+    path.write_text(MOUNTINFO)
+    monkeypatch.setattr(main, "_read_sysfs", lambda p: SYSFS.get(p, ""))
+    realpath = main.os.path.realpath
+    monkeypatch.setattr(
+        main.os.path, "realpath", lambda p: "/dev/dm-0" if p == "/dev/mapper/crypt" else realpath(p)
+    )
+    mounts, sources = main._mount_table(str(path))
+    assert mounts["252:1"] == ("/", "ext4")
+    assert mounts["0:33"] == ("/home", "btrfs")
+    assert "8:18" not in mounts
+    # The first mount of a device wins, like in lsblk's MOUNTPOINT column
+    assert sources["8:18"] == ("/home", "btrfs")
+    assert sources["253:0"] == ("/mnt/crypt", "btrfs")
+    assert sources["252:1"] == ("/", "ext4")
+    assert len(sources) == 3
+
+
+def test_mount_table_unescapes_mountpoints(tmp_path, monkeypatch):
+    path = tmp_path / "mountinfo"
+    path.write_text(MOUNTINFO.splitlines()[3] + "\n")
+    monkeypatch.setattr(main, "_read_sysfs", lambda p: SYSFS.get(p, ""))
+    mounts, sources = main._mount_table(str(path))
+    assert mounts["0:33"] == ("/srv/my data", "btrfs")
+    assert sources["8:18"] == ("/srv/my data", "btrfs")
+
+
+def disk(name: str, filesystem: str = "", probed: bool = True) -> dict:
+    return {
+        "device": f"/dev/{name}",
+        "name": name,
+        "type": "HDD",
+        "size": 1 << 30,
+        "filesystem": filesystem,
+        "mountpoint": "",
+        "probed": probed,
+    }
+
+
+@pytest.fixture
+def inventory(monkeypatch):
+    """Drive inventory with a fake scan and the watch reported as running."""
+    scans: list[list[dict]] = []
+    monkeypatch.setattr(main, "_drives_cache", None)
+    monkeypatch.setattr(main, "_drive_watch", (None, None, -1))
+    monkeypatch.setattr(main, "_scan_block_devices", lambda: scans.pop(0))
+    return scans
+
+
+@pytest.mark.asyncio
+async def test_invalidation_during_scan_is_kept(inventory, monkeypatch):
+    def scan():
+        # A uevent arrives while the scan runs
+        main.invalidate_drives()
+        return [disk("sda")]
+
+    monkeypatch.setattr(main, "_scan_block_devices", scan)
+    assert [d["name"] for d in await main._drive_inventory()] == ["sda"]
+    assert main._drives_cache is None
+    monkeypatch.setattr(main, "_scan_block_devices", lambda: [disk("sda"), disk("sdb")])
+    assert len(await main._drive_inventory()) == 2
+    assert main._drives_cache is not None
+
+
+@pytest.mark.asyncio
+async def test_block_uevents_invalidate(inventory, monkeypatch):
+    monkeypatch.setattr(main, "DRIVES_SETTLE_DELAY", 0.05)
+    kernel, watch = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+    watch.setblocking(False)
+    monkeypatch.setattr(main, "_drive_watch", (watch, None, -1))
+    loop = asyncio.get_running_loop()
+    loop.add_reader(watch.fileno(), main._on_block_uevent)
+    try:
+        inventory.extend([[disk("sda")], [disk("sda"), disk("sdb")], [disk("sdb")]])
+        assert len(await main._drive_inventory()) == 1
+        kernel.send(b"add@/devices/virtual/net/veth0\0ACTION=add\0SUBSYSTEM=net\0")
+        await asyncio.sleep(0.01)
+        assert main._drives_cache is not None
+        kernel.send(b"add@/devices/pci/block/sdb\0ACTION=add\0SUBSYSTEM=block\0DEVNAME=sdb\0")
+        await asyncio.sleep(0.01)
+        assert main._drives_cache is None
+        assert len(await main._drive_inventory()) == 2
+        # Dropped once more when udev has settled
+        await asyncio.sleep(0.1)
+        assert main._drives_cache is None
+        assert [d["name"] for d in await main._drive_inventory()] == ["sdb"]
+    finally:
+        loop.remove_reader(watch.fileno())
+        kernel.close()
+        watch.close()
+
+
+@pytest.mark.asyncio
+async def test_mount_changes_invalidate(inventory, monkeypatch):
+    polls = []
+    monkeypatch.setattr(main, "_drive_watch", (None, SimpleNamespace(poll=polls.append), -1))
+    inventory.extend([[disk("sda")], [disk("sda", "ext4")]])
+    assert (await main._drive_inventory())[0]["filesystem"] == ""
+    main._on_mounts_changed()
+    assert polls == [0]
+    assert (await main._drive_inventory())[0]["filesystem"] == "ext4"
+
+
+@pytest.mark.asyncio
+async def test_zfs_members_are_hidden(inventory, monkeypatch):
+    async def pools():
+        return [SimpleNamespace(devices=[SimpleNamespace(path="/dev/sdc1")])]
+
+    monkeypatch.setattr(main, "get_zfs_pools", pools)
+    monkeypatch.setattr(main.shutil, "which", lambda name: f"/usr/sbin/{name}")
+    # udev knows every device: members are told by their file system
+    inventory.append([disk("sda1", "ext4"), disk("sdb1", "zfs_member"), disk("sdc1")])
+    assert [d["name"] for d in await main._drive_inventory()] == ["sda1", "sdc1"]
+    # Without udev data the pool members are asked from ZFS
+    main.invalidate_drives()
+    inventory.append([disk("sda1", "ext4", probed=False), disk("sdb1", "zfs_member"), disk("sdc1", probed=False)])
+    assert [d["name"] for d in await main._drive_inventory()] == ["sda1"]
@@ -0,0 +1,112 @@
+import json
+import os
+
+import pytest
+import pytest_asyncio
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Route
+
+import main
+
+CONTENT = bytes(range(256)) * 4096 * 3  # 3 MiB
+
+
+class FakeMirror:
+    """Serves CONTENT with or without byte range support."""
+
+    def __init__(self, ranges: bool = True):
+        self.ranges = ranges
+        self.requests: list[str | None] = []
+        self.app = Starlette(routes=[Route("/disk.iso", self.iso)])
+
+    async def iso(self, request: Request):
+        header = request.headers.get("range")
+        self.requests.append(header)
+        headers = {"ETag": '"v1"'}
+        if not self.ranges or not header:
+            return Response(CONTENT, headers=headers)
+        start, _, end = header.removeprefix("bytes=").partition("-")
+        start, end = int(start), int(end)
+        headers["Content-Range"] = f"bytes {start}-{end}/{len(CONTENT)}"
+        return Response(CONTENT[start : end + 1], status_code=206, headers=headers)
+
+
+@pytest.fixture(autouse=True)
+def small_segments(monkeypatch):
+    monkeypatch.setattr(main, "ISO_DOWNLOAD_MIN_SEGMENT", 512 * 1024)
+    monkeypatch.setattr(main, "ISO_DOWNLOAD_BLOCK", 256 * 1024)
+
+
+@pytest_asyncio.fixture
+async def mirror(serve):
+    async def start(ranges: bool = True) -> tuple[FakeMirror, str]:
+        fake = FakeMirror(ranges)
+        return fake, f"{await serve(fake.app)}/disk.iso"
+
+    return start
+
+
+def read(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+@pytest.mark.asyncio
+async def test_ranged_download(mirror, tmp_path):
+    fake, url = await mirror()
+    dest = str(tmp_path / "disk.iso")
+    job = main.Job("download_iso", "test")
+    await main._download_iso(job, url, dest)
+    assert read(dest) == CONTENT
+    assert not os.path.exists(f"{dest}.part")
+    assert not os.path.exists(f"{dest}.part.json")
+    step = len(CONTENT) // 4
+    assert len(fake.requests) == 5
+    assert set(fake.requests[1:]) == {f"bytes={s}-{s + step - 1}" for s in range(0, len(CONTENT), step)}
+    assert job.progress == 100.0
+
+
+@pytest.mark.asyncio
+async def test_download_without_range_support(mirror, tmp_path):
+    fake, url = await mirror(ranges=False)
+    dest = str(tmp_path / "disk.iso")
+    await main._download_iso(main.Job("download_iso", "test"), url, dest)
+    assert read(dest) == CONTENT
+    assert fake.requests == ["bytes=0-0", None]
+    assert not os.path.exists(f"{dest}.part.json")
+
+
+@pytest.mark.asyncio
+async def test_resume_from_saved_state(mirror, tmp_path):
+    fake, url = await mirror()
+    dest = str(tmp_path / "disk.iso")
+    size = len(CONTENT)
+    half = size // 2
+    # The first segment is complete and the second one stopped halfway
+    segments = [[0, half, half], [half, size, half + 100_000]]
+    with open(f"{dest}.part", "wb") as f:
+        f.write(CONTENT[: half + 100_000])
+        f.truncate(size)
+    with open(f"{dest}.part.json", "w") as f:
+        json.dump({"url": url, "size": size, "validator": '"v1"', "segments": segments}, f)
+
+    job = main.Job("download_iso", "test")
+    await main._download_iso(job, url, dest)
+    assert read(dest) == CONTENT
+    assert fake.requests == ["bytes=0-0", f"bytes={half + 100_000}-{size - 1}"]
+    assert any(line.startswith("Resuming at") for line in job.log)
+
+
+@pytest.mark.asyncio
+async def test_stale_state_starts_over(mirror, tmp_path):
+    fake, url = await mirror()
+    dest = str(tmp_path / "disk.iso")
+    with open(f"{dest}.part", "wb") as f:
+        f.write(b"x" * len(CONTENT))
+    with open(f"{dest}.part.json", "w") as f:
+        json.dump({"url": url, "size": len(CONTENT), "validator": '"v0"', "segments": [[0, 10, 10]]}, f)
+    await main._download_iso(main.Job("download_iso", "test"), url, dest)
+    assert read(dest) == CONTENT
+    assert len(fake.requests) == 5
@@ -0,0 +1,32 @@
+import pytest
+from fastapi import HTTPException
+
+import main
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        ("bytes=0-99", (0, 100)),
+        ("bytes=100-", (100, 900)),
+        ("bytes=-100", (900, 100)),
+        ("bytes=900-5000", (900, 100)),
+        ("bytes=-5000", (0, 1000)),
+        # Ignored: the whole file is sent with 200
+        ("bytes=5-2", None),
+        ("bytes=abc-10", None),
+        ("bytes=-", None),
+        ("bytes=0-1,5-6", None),
+        ("items=0-1", None),
+    ],
+)
+def test_parse_range(header, expected):
+    assert main._parse_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=2000-3000", "bytes=-0"])
+def test_unsatisfiable_range(header):
+    with pytest.raises(HTTPException) as exc:
+        main._parse_range(header, 1000)
+    assert exc.value.status_code == 416
+    assert exc.value.headers == {"Content-Range": "bytes */1000"}
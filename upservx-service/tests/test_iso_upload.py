@@ -0,0 +1,63 @@
+import hashlib
+import os
+
+import pytest
+from starlette.requests import Request
+
+import main
+
+BOUNDARY = b"----upservxBoundary7MA4YWxk"
+
+
+def multipart(data: bytes) -> bytes:
+    return (
+        b"--" + BOUNDARY + b"\r\n"
+        b'Content-Disposition: form-data; name="note"\r\n\r\n'
+        b"not the file\r\n"
+        b"--" + BOUNDARY + b"\r\n"
+        b'Content-Disposition: form-data; name="file"; filename="../disk.iso"\r\n'
+        b"Content-Type: application/octet-stream\r\n\r\n" + data + b"\r\n"
+        b"--" + BOUNDARY + b"--\r\n"
+    )
+
+
+def upload_request(chunks: list[bytes]) -> Request:
+    messages = [{"type": "http.request", "body": chunk, "more_body": True} for chunk in chunks]
+    messages.append({"type": "http.request", "body": b"", "more_body": False})
+
+    async def receive():
+        return messages.pop(0)
+
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "path": "/isos",
+        "headers": [(b"content-type", b"multipart/form-data; boundary=" + BOUNDARY)],
+    }
+    return Request(scope, receive)
+
+
+# Data that looks like the start of a delimiter, to tempt the parser
+DATA = (os.urandom(3000) + b"\r\n--" + BOUNDARY[:-1] + b"\r\n-") * 3
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("block", [64, main.ISO_UPLOAD_BLOCK])
+async def test_boundary_split_across_reads(tmp_path, monkeypatch, block):
+    monkeypatch.setattr(main, "ISO_DIR", str(tmp_path))
+    monkeypatch.setattr(main, "ISO_UPLOAD_BLOCK", block)
+    body = multipart(DATA)
+    closing = body.rindex(b"\r\n--" + BOUNDARY)
+    # Cut the body at every position inside the closing delimiter, and into
+    # small pieces so the opening delimiters straddle reads as well
+    cuts = [closing + i for i in range(len(BOUNDARY) + 5)] + list(range(0, closing, 997))
+    for cut in cuts:
+        head, tail = body[:cut], body[cut:]
+        chunks = [head[i:i + 997] for i in range(0, len(head), 997)] + [tail]
+        filename, tmp, sha256 = await main._receive_iso_upload(upload_request(chunks))
+        with open(tmp, "rb") as f:
+            stored = f.read()
+        os.remove(tmp)
+        assert filename == "disk.iso"
+        assert stored == DATA, cut
+        assert sha256 == hashlib.sha256(DATA).hexdigest()
@@ -0,0 +1,158 @@
+import asyncio
+import json
+import socket
+
+import httpx
+import pytest
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+import main
+
+
+def pod(name: str, version: str, phase: str = "Running") -> dict:
+    return {
+        "metadata": {"name": name, "namespace": "default", "resourceVersion": version},
+        "status": {"phase": phase},
+    }
+
+
+class FakeApiServer:
+    """Serves pod lists and watches from prepared responses, in order."""
+
+    def __init__(self, lists: list[dict], watches: list[list[dict]]):
+        self.lists = lists
+        self.watches = watches
+        self.requests: list[str] = []
+        self.idle = asyncio.Event()
+        self.app = Starlette(routes=[Route("/api/v1/pods", self.pods)])
+
+    async def pods(self, request: Request):
+        params = request.query_params
+        if params.get("watch") != "1":
+            self.requests.append("list")
+            return JSONResponse(self.lists.pop(0))
+        self.requests.append(f"watch {params['resourceVersion']}")
+        events = self.watches.pop(0) if self.watches else None
+
+        async def stream():
+            if events is None:
+                # Nothing left to send: keep the watch open like the API server
+                self.idle.set()
+                await asyncio.Event().wait()
+            for event in events:
+                yield json.dumps(event).encode() + b"\n"
+
+        return StreamingResponse(stream(), media_type="application/json")
+
+
+@pytest.fixture
+def informer(monkeypatch):
+    monkeypatch.setattr(main, "_k8s_pods", {})
+    monkeypatch.setattr(main, "_k8s_names", {})
+    monkeypatch.setattr(main, "_k8s_synced", False)
+    monkeypatch.setattr(main, "_k8s_pod_list", None)
+    monkeypatch.setattr(main, "_container_index", {"db": "docker"})
+
+
+@pytest.mark.asyncio
+async def test_list_watch_and_relist_after_gone(serve, informer, monkeypatch):
+    api = FakeApiServer(
+        lists=[
+            {"metadata": {"resourceVersion": "10"}, "items": [pod("a", "5"), pod("b", "6")]},
+            {"metadata": {"resourceVersion": "20"}, "items": [pod("c", "18", "Succeeded")]},
+        ],
+        watches=[
+            [
+                {"type": "ADDED", "object": pod("c", "11", "Pending")},
+                {"type": "BOOKMARK", "object": {"metadata": {"resourceVersion": "12"}}},
+                {"type": "DELETED", "object": pod("a", "13")},
+                {"type": "ERROR", "object": {"kind": "Status", "code": 410, "reason": "Expired"}},
+            ],
+        ],
+    )
+    monkeypatch.setattr(main, "K8S_API_URL", await serve(api.app))
+    task = asyncio.create_task(main.watch_k8s_pods())
+    try:
+        await asyncio.wait_for(api.idle.wait(), 10)
+    finally:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    assert api.requests == ["list", "watch 10", "list", "watch 20"]
+    assert main.k8s_pod_exists("c") is True
+    # "b" disappeared while the watch was expired and must be dropped by the relist
+    assert main.k8s_pod_exists("b") is False
+    assert main.k8s_pod_exists("a") is False
+    assert main._container_index == {"db": "docker", "c": "k8s"}
+    pods = await main.get_k8s_pods()
+    assert [(p.name, p.status) for p in pods] == [("c", "succeeded")]
+
+
+@pytest.mark.asyncio
+async def test_watch_applies_events(serve, informer):
+    api = FakeApiServer(
+        lists=[{"metadata": {"resourceVersion": "1"}, "items": [pod("a", "1")]}],
+        watches=[
+            [
+                {"type": "MODIFIED", "object": pod("a", "2", "Failed")},
+                {"type": "ADDED", "object": pod("b", "3")},
+                {"type": "BOOKMARK", "object": {"metadata": {"resourceVersion": "7"}}},
+            ]
+        ],
+    )
+    async with httpx.AsyncClient(base_url=await serve(api.app)) as client:
+        assert await main._k8s_list(client) == "1"
+        assert await main._k8s_watch(client, "1") == "7"
+    assert sorted(main._k8s_names) == ["a", "b"]
+    assert main._k8s_pods["default/a"]["status"]["phase"] == "Failed"
+    assert main._container_index == {"db": "docker", "a": "k8s", "b": "k8s"}
+
+
+@pytest.mark.asyncio
+async def test_retries_back_off(informer, monkeypatch):
+    delays: list[float] = []
+
+    async def sleep(delay):
+        delays.append(delay)
+        if len(delays) == 8:
+            raise asyncio.CancelledError
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    monkeypatch.setattr(main, "K8S_API_URL", f"http://127.0.0.1:{port}")
+    monkeypatch.setattr(main.asyncio, "sleep", sleep)
+    with pytest.raises(asyncio.CancelledError):
+        await main.watch_k8s_pods()
+    assert delays == [30, 60, 120, 240, 480, 960, 1920, 3600]
+
+
+@pytest.mark.asyncio
+async def test_pod_events_keep_container_snapshot(serve, informer, monkeypatch):
+    calls: list[str] = []
+
+    async def docker_containers():
+        calls.append("docker")
+        return [main.Container(id=0, name="db", type="Docker", status="running", image="", cpu=0, memory=0, created="")]
+
+    async def lxc_containers():
+        calls.append("lxc")
+        return []
+
+    monkeypatch.setattr(main, "get_docker_containers", docker_containers)
+    monkeypatch.setattr(main, "get_lxc_containers", lxc_containers)
+    monkeypatch.setattr(main, "_container_snapshot", None)
+    monkeypatch.setattr(main, "_container_refresh", None)
+    api = FakeApiServer(
+        lists=[{"metadata": {"resourceVersion": "1"}, "items": [pod("a", "1")]}],
+        watches=[[{"type": "ADDED", "object": pod("b", "2")}, {"type": "DELETED", "object": pod("a", "3")}]],
+    )
+    async with httpx.AsyncClient(base_url=await serve(api.app)) as client:
+        await main._k8s_list(client)
+        assert [c.name for c in await main.discover_containers()] == ["db", "a"]
+        await main._k8s_watch(client, "1")
+    assert [c.name for c in await main.discover_containers()] == ["db", "b"]
+    assert calls == ["docker", "lxc"]
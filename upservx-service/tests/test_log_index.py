@@ -0,0 +1,125 @@
+import os
+
+import pytest
+
+import main
+
+
+@pytest.fixture
+def logs(tmp_path, monkeypatch):
+    log_dir = tmp_path / "log"
+    log_dir.mkdir()
+    monkeypatch.setattr(main, "LOG_DIR", str(log_dir))
+    monkeypatch.setattr(main, "LOG_INDEX_FILE", str(tmp_path / "logs.db"))
+    return log_dir
+
+
+def search(q=None, file=None):
+    result = main.search_logs(q, None, None, None, file, 100, None)
+    return sorted(r["line"] for r in result["results"])
+
+
+def test_incremental_index(logs):
+    path = logs / "app.log"
+    path.write_text("2026-10-01T10:00:00Z started worker\n2026-10-01T10:00:01Z worker ready\n")
+    main.update_log_index()
+    assert search("worker") == ["2026-10-01T10:00:00Z started worker", "2026-10-01T10:00:01Z worker ready"]
+    with open(path, "a") as f:
+        f.write("2026-10-01T10:00:02Z worker stopped\n")
+    main.update_log_index()
+    assert len(search("worker")) == 3
+    assert search("stopped") == ["2026-10-01T10:00:02Z worker stopped"]
+
+
+def test_search_does_not_index(logs):
+    (logs / "app.log").write_text("2026-10-01T10:00:00Z first\n")
+    main.update_log_index()
+    with open(logs / "app.log", "a") as f:
+        f.write("2026-10-01T10:00:01Z second\n")
+    (logs / "new.log").write_text("2026-10-01T10:00:02Z second\n")
+    assert search("second") == []
+    main.update_log_index()
+    assert len(search("second")) == 2
+
+
+def test_replaced_content_is_indexed_from_start(logs):
+    path = logs / "app.log"
+    path.write_text("2026-10-01T10:00:00Z alpha one\n")
+    main.update_log_index()
+    inode = os.stat(path).st_ino
+    # Rewritten in place with longer content: same inode, larger size
+    path.write_text("2026-10-02T10:00:00Z beta one\n2026-10-02T10:00:01Z beta two\n")
+    assert os.stat(path).st_ino == inode
+    main.update_log_index()
+    assert search("one") == ["2026-10-02T10:00:00Z beta one"]
+    assert search("beta") == ["2026-10-02T10:00:00Z beta one", "2026-10-02T10:00:01Z beta two"]
+
+
+def test_rotation_keeps_entries(logs):
+    path = logs / "app.log"
+    path.write_text("2026-10-01T10:00:00Z before rotation\n")
+    main.update_log_index()
+    os.rename(path, logs / "app.log.1")
+    path.write_text("2026-10-01T11:00:00Z after rotation\n")
+    main.update_log_index()
+    assert search("rotation", file="app.log.1") == ["2026-10-01T10:00:00Z before rotation"]
+    assert search("rotation", file="app.log") == ["2026-10-01T11:00:00Z after rotation"]
+
+
+def test_truncated_file_starts_over(logs):
+    path = logs / "app.log"
+    path.write_text("2026-10-01T10:00:00Z old line\n" * 3)
+    main.update_log_index()
+    path.write_text("2026-10-01T10:00:00Z new\n")
+    main.update_log_index()
+    assert search("line") == []
+    assert search("new") == ["2026-10-01T10:00:00Z new"]
+
+
+def test_index_stores_no_text(logs):
+    (logs / "app.log").write_text("2026-10-01T10:00:00Z secret payload\n")
+    main.update_log_index()
+    conn = main._open_log_index()
+    try:
+        assert conn.execute("SELECT line FROM lines").fetchall() == [(None,)]
+    finally:
+        conn.close()
+    assert search("payload") == ["2026-10-01T10:00:00Z secret payload"]
+    # The text comes from the file, lines changed since indexing do not match
+    (logs / "app.log").write_text("2026-10-01T10:00:00Z public payload\n")
+    assert search("secret") == []
+
+
+def test_search_pages_by_entry_id(logs):
+    (logs / "app.log").write_text("".join(f"2026-10-01T10:00:0{i}Z request {i}\n" for i in range(5)))
+    main.update_log_index()
+    pages = []
+    before = None
+    while True:
+        result = main.search_logs("request", None, None, None, None, 2, before)
+        pages.append([r["line"][-1] for r in result["results"]])
+        before = result["next"]
+        if before is None:
+            break
+    assert pages == [["4", "3"], ["2", "1"], ["0"]]
+    result = main.search_logs("re", r"request [13]", None, None, None, 10, None)
+    assert [r["line"][-1] for r in result["results"]] == ["3", "1"]
+    assert result["next"] is None
+
+
+def test_dropped_entries_are_compacted(logs, monkeypatch):
+    monkeypatch.setattr(main, "LOG_INDEX_BATCH", 2)
+    (logs / "old.log").write_text("2026-10-01T10:00:00Z old\n" * 6)
+    (logs / "app.log").write_text("2026-10-01T10:00:00Z kept line\n")
+    main.update_log_index()
+    os.remove(logs / "old.log")
+    # The first pass drops the entries, the second finds them outnumbering
+    # the live ones and clears the text index
+    main.update_log_index()
+    main.update_log_index()
+    conn = main._open_log_index()
+    try:
+        assert conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'entries'").fetchone() == (1,)
+    finally:
+        conn.close()
+    assert search("line") == ["2026-10-01T10:00:00Z kept line"]
@@ -0,0 +1,33 @@
+import pytest
+from fastapi import HTTPException
+
+import main
+
+
+def _fake_lxd(monkeypatch, codes):
+    answers = iter(codes)
+
+    async def lxd_request(method, path, **kwargs):
+        code = next(answers)
+        return {"status_code": code, "metadata": {"code": code}, "err": "failed" if code >= 400 else ""}
+
+    monkeypatch.setattr(main, "lxd_request", lxd_request)
+
+
+@pytest.mark.asyncio
+async def test_wait_continues_on_pending_states(monkeypatch):
+    # 105 Pending, 103 Running, 104 Cancelling are all still in flight
+    _fake_lxd(monkeypatch, [105, 103, 104, 200])
+    progress = []
+    metadata = await main.lxd_wait("/1.0/operations/x", progress.append)
+    assert metadata["status_code"] == 200
+    assert progress == [{"code": 103}]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("code", [400, 401])
+async def test_wait_fails_on_final_errors(monkeypatch, code):
+    _fake_lxd(monkeypatch, [103, code])
+    with pytest.raises(HTTPException) as exc:
+        await main.lxd_wait("/1.0/operations/x")
+    assert exc.value.detail == "failed"
@@ -0,0 +1,75 @@
+import pytest
+
+import main
+
+
+@pytest.fixture
+def index(monkeypatch):
+    monkeypatch.setattr(main, "PROCESS_INDEX_TTL", 0.0)
+    monkeypatch.setattr(main, "_process_keys", {})
+    monkeypatch.setattr(main, "_process_young", {})
+    monkeypatch.setattr(main, "_process_index", {})
+    monkeypatch.setattr(main, "_process_index_time", 0.0)
+
+
+@pytest.fixture
+def procfs(monkeypatch):
+    """Fake process table: pid -> (start time, name); records every read."""
+    table: dict[int, tuple[int, str]] = {}
+    reads: list[int] = []
+
+    def read_keys(pid):
+        reads.append(pid)
+        return (table[pid][1],)
+
+    monkeypatch.setattr(main.psutil, "pids", lambda: list(table))
+    monkeypatch.setattr(main, "_process_start", lambda pid: table[pid][0] if pid in table else None)
+    monkeypatch.setattr(main, "_read_process_keys", read_keys)
+    return table, reads
+
+
+def test_refresh_reads_only_new_pids(index, procfs):
+    table, reads = procfs
+    table.update({1: (10, "init"), 2: (20, "sshd")})
+    assert main.processes_named("sshd") == {2}
+    table[3] = (30, "cron")
+    del table[1]
+    assert main.processes_named("cron") == {3}
+    assert main.processes_named("init") == set()
+    # Known pids are not read again; the new one is, while it may still exec()
+    assert reads == [1, 2, 3, 3, 3]
+
+
+def test_wrapper_exec_is_picked_up(index, procfs, monkeypatch):
+    table, reads = procfs
+    clock = [100.0]
+    monkeypatch.setattr(main.time, "monotonic", lambda: clock[0])
+    table[1] = (10, "init")
+    assert main.processes_named("init") == {1}
+    table[50] = (500, "sh")
+    clock[0] += 1
+    assert main.processes_named("sh") == {50}
+    # The wrapper exec()s the real program: same pid and start time
+    table[50] = (500, "sleep")
+    assert main.processes_named("sleep") == {50}
+    assert main.processes_named("sh") == set()
+    # Past the exec window a miss no longer reads the process again
+    clock[0] += main.PROCESS_EXEC_WINDOW + 1
+    assert main.processes_named("sleep") == {50}
+    table[50] = (500, "sh")
+    del reads[:]
+    assert main.processes_named("sh") == set()
+    assert reads == []
+    del table[50]
+    assert main.processes_named("sleep") == set()
+
+
+def test_reused_pid_is_read_again(index, procfs):
+    table, _ = procfs
+    table[4242] = (100, "nginx")
+    assert main.processes_named("nginx") == {4242}
+    assert main.processes_named("nginx") == {4242}
+    # The pid now belongs to a process started later
+    table[4242] = (900, "sshd")
+    assert main.processes_named("nginx") == set()
+    assert main.processes_named("sshd") == {4242}
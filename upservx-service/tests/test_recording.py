@@ -0,0 +1,94 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+import main
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return 1790000000.0
+
+
+@pytest.fixture
+def clock(monkeypatch, tmp_path):
+    clock = Clock()
+    # Only main's view of time is replaced, the event loop keeps the real one
+    monkeypatch.setattr(main, "time", clock)
+    monkeypatch.setattr(main, "RECORDING_DIR", str(tmp_path))
+    monkeypatch.setattr(main, "RECORDING_BLOCK_SIZE", 100)
+    return clock
+
+
+async def record_session(clock) -> list[list]:
+    recorder = main.TerminalRecorder("s1", "web", "alice", 30, 100)
+    # The client's first resize sets the size in the header
+    recorder.resize(40, 120)
+    events = []
+    for i in range(10):
+        clock.now = float(i)
+        recorder.record("o", f"line {i}\r\n".encode())
+        events.append([float(i), "o", f"line {i}\r\n"])
+    recorder.record("i", b"exit\n")
+    recorder.resize(50, 130)
+    recorder.close()
+    events += [[9.0, "i", "exit\n"], [9.0, "r", "130x50"]]
+    await asyncio.wrap_future(main._recording_executor.submit(lambda: None))
+    return events
+
+
+def export(start: float = 0) -> tuple[dict, list[list]]:
+    rec_path, idx_path = main._recording_paths("s1")
+    lines = [json.loads(line) for line in main._export_recording(rec_path, idx_path, start)]
+    return lines[0], lines[1:]
+
+
+@pytest.mark.asyncio
+async def test_export_round_trip(clock):
+    events = await record_session(clock)
+    header, exported = export()
+    assert header == {
+        "version": 2,
+        "width": 120,
+        "height": 40,
+        "timestamp": 1790000000,
+        "title": "web",
+        "env": {"TERM": "xterm"},
+    }
+    assert exported == events
+    # Several blocks, so a later start skips whole blocks
+    assert len(main._read_recording_index(os.path.join(main.RECORDING_DIR, "s1.idx"))) > 2
+    _, exported = export(4.5)
+    assert exported == [[round(at - 4.5, 6), code, data] for at, code, data in events if at >= 4.5]
+    info = main._recording_info("s1")
+    assert (info["container"], info["user"], info["duration"]) == ("web", "alice", 9.0)
+
+
+@pytest.mark.asyncio
+async def test_truncated_recording(clock):
+    events = await record_session(clock)
+    rec_path, idx_path = main._recording_paths("s1")
+    index = main._read_recording_index(idx_path)
+    # A torn write of the last block: it is dropped, the rest still plays
+    with open(rec_path, "r+b") as f:
+        f.truncate(index[-1][1] + 6)
+    _, exported = export()
+    assert 0 < len(exported) < len(events)
+    assert exported == events[: len(exported)]
+    last = exported[-1][0]
+    assert main._recording_info("s1")["duration"] == last
+    # An index entry cut in half is ignored; the rest still seeks correctly
+    with open(idx_path, "r+b") as f:
+        f.truncate(len(index) * main.RECORDING_INDEX.size - 5)
+    assert main._read_recording_index(idx_path) == index[:-1]
+    assert main._recording_info("s1")["duration"] == last
+    _, from_middle = export(last)
+    assert from_middle == [[round(at - last, 6), code, data] for at, code, data in exported if at >= last]
@@ -0,0 +1,135 @@
+import fcntl
+import json
+import struct
+import termios
+
+import pytest
+from starlette.applications import Starlette
+from starlette.routing import Mount
+from starlette.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+import main
+
+
+@pytest.fixture
+def terminals(monkeypatch, tmp_path):
+    """A test client whose container shells are ``cat`` on a PTY.
+
+    The first text message names the user, like the token does for real,
+    and HTTP requests are made as the user in the Authorization header.
+    """
+    spawn_pty = main.spawn_pty
+
+    async def spawn_cat(cmd, env):
+        return await spawn_pty(["cat"], env)
+
+    async def authenticate(websocket):
+        return await websocket.receive_text()
+
+    async def authenticate_http(header):
+        return header
+
+    async def container_type(name):
+        return "docker"
+
+    monkeypatch.setattr(main, "spawn_pty", spawn_cat)
+    monkeypatch.setattr(main, "authenticate_websocket", authenticate)
+    monkeypatch.setattr(main, "authenticate", authenticate_http)
+    monkeypatch.setattr(main, "find_container_type", container_type)
+    monkeypatch.setattr(main.shutil, "which", lambda name: f"/usr/bin/{name}")
+    monkeypatch.setattr(main, "RECORDING_DIR", str(tmp_path / "recordings"))
+    monkeypatch.setattr(main, "_terminal_sessions", {})
+    # Mounted so main.app's lifespan, which starts the background tasks, is
+    # not run, while sessions live on in the client's event loop
+    with TestClient(Starlette(routes=[Mount("/", main.app)])) as client:
+        yield client
+        for terminal in list(main._terminal_sessions.values()):
+            client.portal.call(terminal.close)
+
+
+def read_until(websocket, expected: bytes) -> bytes:
+    received = b""
+    while expected not in received:
+        received += websocket.receive_bytes()
+    return received
+
+
+def test_text_frames_are_control_only(terminals):
+    with terminals.websocket_connect("/containers/web/terminal") as websocket:
+        websocket.send_text("alice")
+        session = json.loads(websocket.receive_text())["id"]
+        terminal = main._terminal_sessions[session]
+        # Typed JSON is input like any other, echoed by the PTY and by cat
+        websocket.send_bytes(b'{"type": "close"}\n')
+        read_until(websocket, b'{"type": "close"}\r\n{"type": "close"}\r\n')
+        websocket.send_text(json.dumps({"type": "resize", "rows": 40, "cols": 100}))
+        websocket.send_text("not a control message")
+        websocket.send_bytes(b"sync\n")
+        assert read_until(websocket, b"sync\r\nsync\r\n") == b"sync\r\nsync\r\n"
+        size = fcntl.ioctl(terminal.master_fd, termios.TIOCGWINSZ, b"\0" * 8)
+        assert struct.unpack("HHHH", size)[:2] == (40, 100)
+        assert not terminal.closed
+        websocket.send_text(json.dumps({"type": "close"}))
+        with pytest.raises(WebSocketDisconnect):
+            while True:
+                websocket.receive_bytes()
+    assert terminal.closed
+
+
+def test_reattach_replays_scrollback(terminals, monkeypatch):
+    monkeypatch.setattr(main, "TERMINAL_SCROLLBACK", 64)
+    with terminals.websocket_connect("/containers/web/terminal") as websocket:
+        websocket.send_text("alice")
+        session = json.loads(websocket.receive_text())["id"]
+        websocket.send_bytes(b"first line\n")
+        read_until(websocket, b"first line\r\nfirst line\r\n")
+        websocket.send_bytes(b"x" * 40 + b"\n")
+        read_until(websocket, b"x" * 40 + b"\r\n" + b"x" * 40 + b"\r\n")
+    # The shell keeps running without viewers
+    assert main._terminal_sessions[session].viewers == set()
+    with terminals.websocket_connect(f"/containers/web/terminal?session={session}") as websocket:
+        websocket.send_text("alice")
+        assert json.loads(websocket.receive_text()) == {"type": "session", "id": session}
+        # Only the last TERMINAL_SCROLLBACK bytes are kept
+        output = (b"first line\r\n" * 2 + (b"x" * 40 + b"\r\n") * 2)[-64:]
+        assert read_until(websocket, output) == output
+        websocket.send_bytes(b"again\n")
+        read_until(websocket, b"again\r\nagain\r\n")
+    # Another user gets a shell of their own for the same session id
+    with terminals.websocket_connect(f"/containers/web/terminal?session={session}") as websocket:
+        websocket.send_text("bob")
+        assert json.loads(websocket.receive_text())["id"] != session
+
+
+def test_sessions_are_per_user(terminals):
+    sessions = {}
+    for user in ("alice", "bob"):
+        with terminals.websocket_connect("/containers/web/terminal") as websocket:
+            websocket.send_text(user)
+            sessions[user] = json.loads(websocket.receive_text())["id"]
+    listed = terminals.get("/terminals", headers={"Authorization": "alice"}).json()["terminals"]
+    assert [t["id"] for t in listed] == [sessions["alice"]]
+    response = terminals.delete(f"/terminals/{sessions['bob']}", headers={"Authorization": "alice"})
+    assert response.status_code == 404
+    assert sessions["bob"] in main._terminal_sessions
+    response = terminals.delete(f"/terminals/{sessions['bob']}", headers={"Authorization": "bob"})
+    assert response.status_code == 200
+    assert sessions["bob"] not in main._terminal_sessions
+
+
+def test_recording_header_has_pty_size(terminals):
+    with terminals.websocket_connect("/containers/web/terminal?record=true") as websocket:
+        websocket.send_text("alice")
+        session = json.loads(websocket.receive_text())["id"]
+        websocket.send_text(json.dumps({"type": "resize", "rows": 33, "cols": 111}))
+        websocket.send_bytes(b"hello\n")
+        read_until(websocket, b"hello\r\nhello\r\n")
+        websocket.send_text(json.dumps({"type": "close"}))
+        with pytest.raises(WebSocketDisconnect):
+            while True:
+                websocket.receive_bytes()
+    main._recording_executor.submit(lambda: None).result()
+    rec_path, idx_path = main._recording_paths(session)
+    header = json.loads(next(main._export_recording(rec_path, idx_path, 0)))
+    assert (header["width"], header["height"]) == (111, 33)
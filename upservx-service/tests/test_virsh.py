@@ -0,0 +1,29 @@
+import subprocess
+
+import pytest
+
+import main
+
+
+def test_event_names_with_quotes_and_colons(monkeypatch):
+    monkeypatch.setattr(main, "_vm_states", {"web": "shut off"})
+    main._handle_vm_event("event 'lifecycle' for domain 'web': Started Booted\n")
+    main._handle_vm_event("event 'lifecycle' for domain 'bob's vm: test': Defined Added\n")
+    main._handle_vm_event("event 'lifecycle' for domain 'a': b': Suspended Paused\n")
+    assert main._vm_states == {"web": "running", "bob's vm: test": "shut off", "a': b": "paused"}
+
+
+@pytest.mark.asyncio
+async def test_one_shot_virsh_without_stdbuf(monkeypatch):
+    calls = []
+
+    async def run_command(cmd, **kwargs):
+        calls.append(cmd)
+        return subprocess.CompletedProcess(cmd, 0, " 1   web   running\n", "")
+
+    monkeypatch.setattr(main.shutil, "which", lambda name: None if name == "stdbuf" else f"/usr/bin/{name}")
+    monkeypatch.setattr(main, "run_command", run_command)
+    monkeypatch.setattr(main, "_virsh_process", None)
+    assert await main.parse_virsh_list() == {"web": "running"}
+    assert calls == [["virsh", "list", "--all"]]
+    assert main._virsh_process is None
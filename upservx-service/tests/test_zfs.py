@@ -0,0 +1,172 @@
+import os
+import subprocess
+
+import pytest
+
+import main
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "zpool")
+
+
+def fixture(name: str) -> str:
+    with open(os.path.join(FIXTURES, name)) as f:
+        return f.read()
+
+
+def tree(vdevs: list[dict]) -> list:
+    """Reduce vdevs to (name, type, state, read, write, checksum[, children])."""
+    result = []
+    for v in vdevs:
+        node = (v["name"], v["type"], v["state"], v["read"], v["write"], v["checksum"])
+        result.append(node + (tree(v["children"]),) if v["children"] else node)
+    return result
+
+
+def test_degraded_mirror():
+    [pool] = main.parse_zpool_status(fixture("degraded-mirror.txt"))
+    assert pool["name"] == "tank"
+    assert pool["state"] == "DEGRADED"
+    assert pool["status"] == (
+        "One or more devices could not be used because the label is missing or invalid.  "
+        "Sufficient replicas exist for the pool to continue functioning in a degraded state."
+    )
+    assert pool["scan"] == "scrub repaired 0B in 00:00:02 with 0 errors on Sun Oct 11 00:24:03 2026"
+    assert pool["errors"] == "No known data errors"
+    assert tree(pool["vdevs"]) == [
+        (
+            "mirror-0", "mirror", "DEGRADED", 0, 0, 0,
+            [
+                ("/dev/sda1", "disk", "ONLINE", 0, 0, 0),
+                ("9087312117865281364", "disk", "UNAVAIL", 0, 0, 0),
+            ],
+        )
+    ]
+    assert pool["vdevs"][0]["children"][1]["note"] == "was /dev/sdb1"
+    assert pool["logs"] == pool["cache"] == pool["spares"] == []
+
+
+def test_raidz2_with_vdev_classes():
+    [pool] = main.parse_zpool_status(fixture("raidz2-classes.txt"))
+    disk = "/dev/disk/by-id/ata-WDC_WD80EFZZ-68BTXN0_"
+    assert tree(pool["vdevs"]) == [
+        (
+            "raidz2-0", "raidz2", "ONLINE", 0, 0, 0,
+            [
+                (f"{disk}1", "disk", "ONLINE", 0, 0, 0),
+                (f"{disk}2", "disk", "ONLINE", 0, 0, 3),
+                (f"{disk}3", "disk", "ONLINE", 0, 0, 0),
+                (f"{disk}4", "disk", "ONLINE", 2, 0, 0),
+            ],
+        ),
+        (
+            "mirror-1", "mirror", "ONLINE", 0, 0, 0,
+            [("/dev/nvme0n1p2", "disk", "ONLINE", 0, 0, 0), ("/dev/nvme1n1p2", "disk", "ONLINE", 0, 0, 0)],
+        ),
+    ]
+    assert tree(pool["logs"]) == [
+        (
+            "mirror-2", "mirror", "ONLINE", 0, 0, 0,
+            [("/dev/nvme0n1p1", "disk", "ONLINE", 0, 0, 0), ("/dev/nvme1n1p1", "disk", "ONLINE", 0, 0, 0)],
+        )
+    ]
+    assert tree(pool["cache"]) == [("/dev/sdf1", "disk", "ONLINE", 0, 0, 0)]
+    assert tree(pool["spares"]) == [("/dev/sdg1", "disk", "AVAIL", 0, 0, 0), ("/dev/sdh1", "disk", "AVAIL", 0, 0, 0)]
+    assert pool["status"].startswith("One or more devices has experienced an unrecoverable error.  An attempt")
+    assert pool["scan"] == "scrub repaired 12288 in 01:42:17 with 0 errors on Sun Oct 11 01:42:17 2026"
+    assert pool["errors"] == "2 data errors, use '-v' for a list"
+
+
+def test_resilver_in_progress():
+    [pool] = main.parse_zpool_status(fixture("resilver.txt"))
+    assert pool["scan"] == (
+        "resilver in progress since Sat Oct 10 21:11:03 2026 "
+        "1352663040 / 2695000000 scanned at 449495552/s, 671088640 / 2695000000 issued at 223346688/s "
+        "671088640 resilvered, 24.93% done, 00:00:09 to go"
+    )
+    assert tree(pool["vdevs"]) == [
+        (
+            "mirror-0", "mirror", "DEGRADED", 0, 0, 0,
+            [
+                (
+                    "replacing-0", "replacing", "DEGRADED", 0, 0, 0,
+                    [("/dev/sdc1", "disk", "FAULTED", 0, 18, 0), ("/dev/sdd1", "disk", "ONLINE", 0, 0, 0)],
+                ),
+                ("/dev/sde1", "disk", "ONLINE", 0, 0, 0),
+            ],
+        )
+    ]
+    replacing = pool["vdevs"][0]["children"][0]["children"]
+    assert [v["note"] for v in replacing] == ["too many errors", "(resilvering)"]
+
+
+def test_file_vdevs_and_several_pools():
+    scratch, rpool = main.parse_zpool_status(fixture("file-vdevs.txt"))
+    assert scratch["name"] == "scratch"
+    assert scratch["scan"] == ""
+    assert tree(scratch["vdevs"]) == [
+        ("/var/lib/zfs/disk0", "file", "ONLINE", 0, 0, 0),
+        ("/var/lib/zfs/disk1", "file", "ONLINE", 0, 0, 0),
+    ]
+    assert rpool["name"] == "rpool"
+    assert tree(rpool["vdevs"]) == [("/dev/vda3", "disk", "ONLINE", 0, 0, 0)]
+
+
+def test_draid_with_distributed_spare():
+    [pool] = main.parse_zpool_status(fixture("draid.txt"))
+    [draid] = pool["vdevs"]
+    assert (draid["name"], draid["type"]) == ("draid2:4d:7c:1s-0", "draid2")
+    assert [v["name"] for v in draid["children"]] == [f"/dev/sd{c}" for c in "bcdefgh"]
+    assert tree(pool["spares"]) == [("draid2-0-0", "dspare", "AVAIL", 0, 0, 0)]
+
+
+@pytest.mark.parametrize(
+    "name, expected",
+    [
+        ("mirror-0", "mirror"),
+        ("raidz1-3", "raidz1"),
+        ("draid1:2d:5c:0s-0", "draid1"),
+        ("draid1-0-0", "dspare"),
+        ("spare-2", "spare"),
+        ("/dev/sda1", "disk"),
+        ("sda", "disk"),
+        ("/var/tmp/file0", "file"),
+    ],
+)
+def test_vdev_type(name, expected):
+    assert main._vdev_type(name) == expected
+
+
+@pytest.mark.asyncio
+async def test_get_zfs_pools_falls_back_to_text(monkeypatch):
+    calls = []
+
+    async def run_command(cmd, **kwargs):
+        calls.append(cmd[:3])
+        if cmd[:2] == ["zpool", "get"]:
+            out = "data\tsize\t32006247284736\ndata\tallocated\t2199023255552\ndata\tfree\t29807224029184\n"
+        elif cmd[:2] == ["zfs", "list"]:
+            out = "data\t/data\n"
+        elif "-j" in cmd:
+            return subprocess.CompletedProcess(cmd, 2, "", "invalid option 'j'\n")
+        else:
+            out = fixture("raidz2-classes.txt")
+        return subprocess.CompletedProcess(cmd, 0, out, "")
+
+    monkeypatch.setattr(main, "run_command", run_command)
+    monkeypatch.setattr(main.shutil, "which", lambda name: f"/usr/sbin/{name}")
+    monkeypatch.setattr(main, "_zfs_cache", None)
+    [pool] = await main.get_zfs_pools()
+    assert calls[-1] == ["zpool", "status", "-P"]
+    assert (pool.name, pool.type, pool.size, pool.used, pool.available) == ("data", "raidz2", 29808, 2048, 27760)
+    assert pool.mountpoint == "/data"
+    assert pool.state == "ONLINE"
+    assert len(pool.devices) == 11
+    assert pool.devices[1].path.endswith("_2")
+    assert pool.vdevs[0].children[1].checksum == 3
+    # Served from the cache until invalidated
+    count = len(calls)
+    assert (await main.get_zfs_pools())[0] is pool
+    assert len(calls) == count
+    main.invalidate_zfs()
+    await main.get_zfs_pools()
+    assert len(calls) > count
@@ -14,13 +14,15 @@ export default function LoginPage() {
 
   const handleSubmit = async (e: React.FormEvent) => {
     e.preventDefault()
-    const token = btoa(`${username}:${password}`)
+    const credentials = btoa(`${username}:${password}`)
     try {
-      const res = await fetch(apiUrl("/"), {
-        headers: { Authorization: `Basic ${token}` },
+      const res = await fetch(apiUrl("/auth/login"), {
+        method: "POST",
+        headers: { Authorization: `Basic ${credentials}` },
       })
       if (res.ok) {
-        setToken(token)
+        const data = await res.json()
+        setToken(data.token)
         router.push("/")
       } else {
         setToken(null)
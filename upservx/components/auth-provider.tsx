@@ -43,15 +43,19 @@ export function AuthProvider({ children }: { children: React.ReactNode }) {
 
         if (!hasAuth) {
           if (headers instanceof Headers) {
-            headers.set("Authorization", `Basic ${token}`)
+            headers.set("Authorization", `Bearer ${token}`)
           } else {
-            ;(headers as Record<string, string>)["Authorization"] = `Basic ${token}`
+            ;(headers as Record<string, string>)["Authorization"] = `Bearer ${token}`
           }
         }
       }
 
       init.headers = headers
-      return origFetch(input, init)
+      return origFetch(input, init).then((res) => {
+        // Session tokens expire; drop the token so the user logs in again
+        if (res.status === 401 && token) setToken(null)
+        return res
+      })
     }
     return () => {
       window.fetch = origFetch
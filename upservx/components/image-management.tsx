@@ -18,9 +18,11 @@ import {
   DialogTrigger,
 } from "@/components/ui/dialog"
 import { Disc, Download, Upload, Trash2, Plus, Container } from "lucide-react"
-import { apiUrl } from "@/lib/api"
+import { apiUrl, waitForJob } from "@/lib/api"
+import { useAuth } from "@/components/auth-provider"
 
 export function ImageManagement() {
+  const { token } = useAuth()
   const [isoFiles, setIsoFiles] = useState<
     {
       id: number
@@ -153,6 +155,8 @@ export function ImageManagement() {
 
     const xhr = new XMLHttpRequest()
     xhr.open("POST", apiUrl("/isos"))
+    // XMLHttpRequest bypasses the fetch wrapper that adds the session token
+    if (token) xhr.setRequestHeader("Authorization", `Bearer ${token}`)
     xhr.upload.onprogress = (e) => {
       if (e.lengthComputable) {
         setUploadedBytes(e.loaded)
@@ -198,10 +202,6 @@ export function ImageManagement() {
     setError(null)
     setMessage(null)
 
-    const interval = setInterval(() => {
-      setDownloadProgress((p) => Math.min(p + 5, 95))
-    }, 200)
-
     try {
       const res = await fetch(apiUrl("/isos/download"), {
         method: "POST",
@@ -209,8 +209,12 @@ export function ImageManagement() {
         body: JSON.stringify({ url: isoUrl, name: isoDownloadName || null }),
       })
       if (res.ok) {
-        const info = await res.json()
-        setIsoFiles((prev) => [...prev, info])
+        const started = await res.json()
+        const job = await waitForJob<(typeof isoFiles)[number]>(started.id, (j) => {
+          if (j.progress !== null) setDownloadProgress(j.progress)
+        })
+        const info = job.result
+        if (info) setIsoFiles((prev) => [...prev.filter((i) => i.name !== info.name), info])
         setMessage("ISO downloaded")
       } else {
         let msg = "Download error"
@@ -226,8 +230,6 @@ export function ImageManagement() {
       console.error(e)
       if (e instanceof Error) setError(e.message)
     }
-    clearInterval(interval)
-    setDownloadProgress(100)
     setIsDownloading(false)
     setIsoUrl("")
     setIsoDownloadName("")
@@ -280,10 +282,6 @@ export function ImageManagement() {
     setError(null)
     setMessage(null)
 
-    const interval = setInterval(() => {
-      setPullProgress((p) => Math.min(p + 5, 95))
-    }, 200)
-
     try {
       const res = await fetch(apiUrl("/images/pull"), {
         method: "POST",
@@ -291,6 +289,10 @@ export function ImageManagement() {
         body: JSON.stringify({ image: imageName, registry: registry || null }),
       })
       if (res.ok) {
+        const started = await res.json()
+        await waitForJob(started.id, (j) => {
+          if (j.progress !== null) setPullProgress(j.progress)
+        })
         const list = await fetch(apiUrl("/images?type=docker&full=1"))
         if (list.ok) {
           const data = await list.json()
@@ -311,8 +313,6 @@ export function ImageManagement() {
       console.error(e)
       if (e instanceof Error) setError(e.message)
     }
-    clearInterval(interval)
-    setPullProgress(100)
     setIsPulling(false)
     setImageName("")
     setRegistry("")
@@ -350,10 +350,6 @@ export function ImageManagement() {
     setError(null)
     setMessage(null)
 
-    const interval = setInterval(() => {
-      setPullProgressLxc((p) => Math.min(p + 5, 95))
-    }, 200)
-
     try {
       const res = await fetch(apiUrl("/images/pull"), {
         method: "POST",
@@ -365,6 +361,10 @@ export function ImageManagement() {
         }),
       })
       if (res.ok) {
+        const started = await res.json()
+        await waitForJob(started.id, (j) => {
+          if (j.progress !== null) setPullProgressLxc(j.progress)
+        })
         const list = await fetch(apiUrl("/images?type=lxc&full=1"))
         if (list.ok) {
           const data = await list.json()
@@ -385,8 +385,6 @@ export function ImageManagement() {
       console.error(e)
       if (e instanceof Error) setError(e.message)
     }
-    clearInterval(interval)
-    setPullProgressLxc(100)
     setIsPullingLxc(false)
     setLxcImageName("")
     setLxcRemote("")
@@ -4,14 +4,28 @@ import { useEffect, useState } from "react"
 import { Card, CardContent, CardHeader, CardTitle } from "@/components/ui/card"
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from "@/components/ui/select"
 import { ScrollArea } from "@/components/ui/scroll-area"
-import { apiUrl } from "@/lib/api"
+import { apiUrl, wsUrl } from "@/lib/api"
+import { useAuth } from "@/components/auth-provider"
 
 interface LogFile {
   name: string
   size: number
 }
 
+// Followed logs keep growing, only the newest lines stay on screen
+const MAX_LINES = 2000
+
+function trimLines(text: string): string {
+  let start = text.length
+  for (let i = 0; i <= MAX_LINES; i++) {
+    start = text.lastIndexOf("\n", start - 1)
+    if (start < 0) return text
+  }
+  return text.slice(start + 1)
+}
+
 export function Logs() {
+  const { token } = useAuth()
   const [logs, setLogs] = useState<LogFile[]>([])
   const [selected, setSelected] = useState("")
   const [content, setContent] = useState("")
@@ -33,20 +47,45 @@ export function Logs() {
   }, [])
 
   useEffect(() => {
-    if (!selected) return
-    const load = async () => {
-      try {
-        const res = await fetch(apiUrl(`/logs/${encodeURIComponent(selected)}?lines=200`))
-        if (res.ok) {
-          const text = await res.text()
-          setContent(text)
+    if (!selected || !token) return
+    let ws: WebSocket | null = null
+    let retry: ReturnType<typeof setTimeout> | null = null
+    let closed = false
+    // Resuming from the last cursor only fetches the lines missed meanwhile
+    let cursor: string | null = null
+    setContent("")
+
+    const connect = () => {
+      const params = new URLSearchParams({ lines: "200" })
+      if (cursor) params.set("cursor", cursor)
+      const socket = new WebSocket(wsUrl(`/logs/${encodeURIComponent(selected)}/follow?${params}`))
+      ws = socket
+      // The token goes in the first message, never in the URL
+      socket.onopen = () => socket.send(`Bearer ${token}`)
+      ws.onmessage = (ev) => {
+        try {
+          const frame = JSON.parse(ev.data)
+          if (frame.type === "data") {
+            cursor = frame.cursor
+            setContent((prev) => trimLines(prev + frame.data))
+          } else if (frame.type === "reset") {
+            setContent((prev) => prev + "--- log rotated ---\n")
+          }
+        } catch (err) {
+          console.error(err)
         }
-      } catch (e) {
-        console.error(e)
+      }
+      ws.onclose = () => {
+        if (!closed) retry = setTimeout(connect, 4000)
       }
     }
-    load()
-  }, [selected])
+    connect()
+    return () => {
+      closed = true
+      if (retry) clearTimeout(retry)
+      ws?.close()
+    }
+  }, [selected, token])
 
   return (
     <div className="space-y-6">
@@ -28,6 +28,9 @@ interface ZFSPool {
   available: number
   mountpoint: string
   devices: ZFSDevice[]
+  state: string
+  errors: string
+  scan: string
 }
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from "@/components/ui/card"
 import { Button } from "@/components/ui/button"
@@ -45,7 +48,7 @@ import {
   DialogTrigger,
 } from "@/components/ui/dialog"
 import { HardDrive, Usb, MemoryStickIcon as SdCard, Settings, AlertTriangle } from "lucide-react"
-import { apiUrl } from "@/lib/api"
+import { apiUrl, waitForJob } from "@/lib/api"
 
 export function StorageManagement() {
   const [drives, setDrives] = useState<Drive[]>([])
@@ -85,6 +88,7 @@ export function StorageManagement() {
   const [poolName, setPoolName] = useState("")
   const [raidLevel, setRaidLevel] = useState("mirror")
   const [poolDevices, setPoolDevices] = useState<string[]>([])
+  const [jobProgress, setJobProgress] = useState<string | null>(null)
 
   useEffect(() => {
     if (!error) return
@@ -126,12 +130,16 @@ export function StorageManagement() {
         }),
       })
       if (!res.ok) throw new Error(await res.text())
+      const started = await res.json()
+      setFormatOpen(false)
+      await waitForJob(started.id, (job) => setJobProgress(job.message || job.description))
       setMessage("Formatting complete")
       await loadDrives()
     } catch (e) {
       console.error(e)
       setError("Formatting failed")
     } finally {
+      setJobProgress(null)
       setActiveDrive(null)
       setFormatFs("")
       setFormatLabel("")
@@ -166,14 +174,18 @@ export function StorageManagement() {
         body: JSON.stringify({ name: poolName, devices: poolDevices, raid: raidLevel }),
       })
       if (!res.ok) throw new Error(await res.text())
-      setMessage("Pool created")
+      const started = await res.json()
       setPoolOpen(false)
+      await waitForJob(started.id, (job) => setJobProgress(job.message || job.description))
+      setMessage("Pool created")
       setPoolName("")
       setPoolDevices([])
       await loadDrives()
     } catch (e) {
       console.error(e)
       setError("Pool creation failed")
+    } finally {
+      setJobProgress(null)
     }
   }
 
@@ -274,6 +286,9 @@ export function StorageManagement() {
                   <div className="flex items-center gap-2 mb-2">
                     <div className="font-medium">{p.name}</div>
                     <Badge variant="outline">{p.type}</Badge>
+                    {p.state && (
+                      <Badge variant={p.state === "ONLINE" ? "secondary" : "destructive"}>{p.state}</Badge>
+                    )}
                   </div>
                   <div className="text-sm text-muted-foreground mb-2">
                     Mountpoint: {p.mountpoint || "-"}
@@ -294,6 +309,8 @@ export function StorageManagement() {
                       </span>
                     ))}
                   </div>
+                  {p.scan && <div className="text-xs text-muted-foreground mt-1">Scan: {p.scan}</div>}
+                  {p.errors && <div className="text-xs text-muted-foreground">Errors: {p.errors}</div>}
                 </div>
               ))}
             </div>
@@ -472,6 +489,11 @@ export function StorageManagement() {
           {message}
         </div>
       )}
+      {jobProgress && !error && !message && (
+        <div className="fixed top-4 right-4 z-50 bg-blue-600 text-white px-3 py-2 rounded shadow">
+          {jobProgress}
+        </div>
+      )}
     </div>
   )
 }
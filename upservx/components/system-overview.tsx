@@ -11,7 +11,25 @@ import {
 } from "@/components/ui/table"
 import { Cpu, HardDrive, MemoryStick, Activity } from "lucide-react"
 import { useEffect, useState } from "react"
-import { apiUrl } from "@/lib/api"
+import { apiUrl, wsUrl } from "@/lib/api"
+import { useAuth } from "@/components/auth-provider"
+
+// Apply a delta frame from /metrics/stream to the previous metrics state
+function mergeMetrics<T>(prev: T, delta: Record<string, unknown>): T {
+  const next = { ...(prev as Record<string, unknown>) }
+  for (const [key, value] of Object.entries(delta)) {
+    const current = next[key]
+    if (
+      value && typeof value === "object" && !Array.isArray(value) &&
+      current && typeof current === "object" && !Array.isArray(current)
+    ) {
+      next[key] = mergeMetrics(current, value as Record<string, unknown>)
+    } else {
+      next[key] = value
+    }
+  }
+  return next as T
+}
 
 export function SystemOverview() {
   const [systemStats, setSystemStats] = useState({
@@ -47,22 +65,41 @@ export function SystemOverview() {
     return undefined
   }
 
+  const { token } = useAuth()
+
   useEffect(() => {
-    const fetchMetrics = async () => {
-      try {
-        const res = await fetch(apiUrl("/metrics"))
-        if (res.ok) {
-          const data = await res.json()
-          setSystemStats(data)
+    if (!token) return
+    let ws: WebSocket | null = null
+    let retry: ReturnType<typeof setTimeout> | null = null
+    let closed = false
+
+    const connect = () => {
+      ws = new WebSocket(wsUrl("/metrics/stream"))
+      // The token goes in the first message, never in the URL
+      ws.onopen = () => ws?.send(`Bearer ${token}`)
+      ws.onmessage = (ev) => {
+        try {
+          const frame = JSON.parse(ev.data)
+          if (frame.type === "full") {
+            setSystemStats(frame.data)
+          } else if (frame.type === "delta") {
+            setSystemStats((prev) => mergeMetrics(prev, frame.data))
+          }
+        } catch (err) {
+          console.error(err)
         }
-      } catch (err) {
-        console.error(err)
+      }
+      ws.onclose = () => {
+        if (!closed) retry = setTimeout(connect, 4000)
       }
     }
-    fetchMetrics()
-    const id = setInterval(fetchMetrics, 4000)
-    return () => clearInterval(id)
-  }, [])
+    connect()
+    return () => {
+      closed = true
+      if (retry) clearTimeout(retry)
+      ws?.close()
+    }
+  }, [token])
 
   const physicalDrives = drives.reduce((acc, d) => {
     const base = d.device.replace(/^\/dev\//, "").replace(/p?\d+$/, "")
@@ -5,6 +5,7 @@ import { Card, CardContent, CardHeader, CardTitle } from "@/components/ui/card"
 import { Button } from "@/components/ui/button"
 import { X } from "lucide-react"
 import { wsUrl } from "@/lib/api"
+import { useAuth } from "@/components/auth-provider"
 import { Terminal } from "@xterm/xterm"
 import "@xterm/xterm/css/xterm.css"
 
@@ -13,46 +14,135 @@ interface TerminalEmulatorProps {
   onClose: () => void
 }
 
+// Size the terminal to fill its element, measuring a cell in the terminal font
+function fitTerminal(term: Terminal, el: HTMLElement) {
+  const probe = document.createElement("span")
+  probe.style.fontFamily = term.options.fontFamily ?? "monospace"
+  probe.style.fontSize = `${term.options.fontSize ?? 15}px`
+  probe.style.lineHeight = "normal"
+  probe.style.position = "absolute"
+  probe.style.visibility = "hidden"
+  probe.style.whiteSpace = "pre"
+  probe.textContent = "W".repeat(32)
+  el.appendChild(probe)
+  const { width, height } = probe.getBoundingClientRect()
+  probe.remove()
+  if (!width || !height) return
+  const cols = Math.max(2, Math.floor(el.clientWidth / (width / 32)))
+  const rows = Math.max(1, Math.floor(el.clientHeight / (height * (term.options.lineHeight ?? 1))))
+  if (cols !== term.cols || rows !== term.rows) term.resize(cols, rows)
+}
+
 export function TerminalEmulator({ containerName, onClose }: TerminalEmulatorProps) {
   const containerRef = useRef<HTMLDivElement>(null)
   const termRef = useRef<Terminal | null>(null)
   const wsRef = useRef<WebSocket | null>(null)
+  const { token } = useAuth()
+
+  // Closing the window ends the shell, other unmounts leave it to reattach
+  const handleClose = () => {
+    if (wsRef.current?.readyState === WebSocket.OPEN) {
+      wsRef.current.send(JSON.stringify({ type: "close" }))
+    }
+    sessionStorage.removeItem(`terminal-session:${containerName}`)
+    onClose()
+  }
 
   useEffect(() => {
     const term = new Terminal()
     termRef.current = term
-    if (containerRef.current) {
-      term.open(containerRef.current)
+    const el = containerRef.current
+    if (el) {
+      term.open(el)
+      fitTerminal(term, el)
       term.focus()
     }
 
-    const ws = new WebSocket(wsUrl(`/containers/${containerName}/terminal`))
-    wsRef.current = ws
-    ws.onmessage = (ev) => {
-      const text = (typeof ev.data === "string" ? ev.data : "").replace(/\n/g, "\r\n")
-      term.write(text)
+    // The session id survives reconnects and page reloads, so the same shell
+    // is reattached and its scrollback replayed
+    const storageKey = `terminal-session:${containerName}`
+    let ws: WebSocket | null = null
+    let retry: ReturnType<typeof setTimeout> | null = null
+    let disposed = false
+
+    const sendSize = () => {
+      if (ws?.readyState === WebSocket.OPEN) {
+        ws.send(JSON.stringify({ type: "resize", rows: term.rows, cols: term.cols }))
+      }
     }
-    ws.onclose = () => {
-      term.write("\r\n[Verbindung beendet]")
+
+    const connect = () => {
+      const params = new URLSearchParams()
+      const session = sessionStorage.getItem(storageKey)
+      if (session) params.set("session", session)
+      const socket = new WebSocket(wsUrl(`/containers/${containerName}/terminal?${params}`))
+      ws = socket
+      wsRef.current = socket
+      socket.binaryType = "arraybuffer"
+      socket.onopen = () => {
+        // The token goes in the first message, never in the URL
+        socket.send(`Bearer ${token ?? ""}`)
+        sendSize()
+      }
+      socket.onmessage = (ev) => {
+        if (typeof ev.data !== "string") {
+          term.write(new Uint8Array(ev.data))
+          return
+        }
+        try {
+          const frame = JSON.parse(ev.data)
+          if (frame.type === "session") {
+            sessionStorage.setItem(storageKey, frame.id)
+            // The scrollback of the session follows
+            term.reset()
+            return
+          }
+        } catch {
+          // Errors before the shell starts arrive as plain text
+        }
+        term.write(ev.data)
+      }
+      socket.onclose = (ev) => {
+        if (disposed) return
+        // 1000: the shell ended, 1008: not authorized
+        if (ev.code === 1000 || ev.code === 1008) {
+          sessionStorage.removeItem(storageKey)
+          term.write("\r\n[Verbindung beendet]")
+        } else {
+          term.write("\r\n[Verbindung unterbrochen, verbinde neu...]")
+          retry = setTimeout(connect, 2000)
+        }
+      }
     }
+    connect()
 
+    const encoder = new TextEncoder()
     term.onData((data) => {
-      if (ws.readyState === WebSocket.OPEN) {
-        ws.send(data)
+      if (ws?.readyState === WebSocket.OPEN) {
+        ws.send(encoder.encode(data))
       }
     })
+    term.onResize(sendSize)
+
+    const observer = new ResizeObserver(() => {
+      if (el) fitTerminal(term, el)
+    })
+    if (el) observer.observe(el)
 
     return () => {
-      ws.close()
+      disposed = true
+      if (retry) clearTimeout(retry)
+      observer.disconnect()
+      ws?.close()
       term.dispose()
     }
-  }, [containerName])
+  }, [containerName, token])
 
   return (
     <Card className="w-full max-w-5xl h-[80vh] flex flex-col">
       <CardHeader className="flex flex-row items-center justify-between space-y-0 pb-2 border-b">
         <CardTitle className="text-sm font-medium">Terminal - {containerName}</CardTitle>
-        <Button variant="ghost" size="icon" className="h-6 w-6" onClick={onClose}>
+        <Button variant="ghost" size="icon" className="h-6 w-6" onClick={handleClose}>
           <X className="h-3 w-3" />
         </Button>
       </CardHeader>
@@ -18,7 +18,7 @@ import {
   TableHeader,
   TableRow,
 } from "@/components/ui/table"
-import { apiUrl } from "@/lib/api"
+import { apiUrl, waitForJob } from "@/lib/api"
 
 export function VirtualMachines() {
   interface VMData {
@@ -99,15 +99,22 @@ export function VirtualMachines() {
         body: JSON.stringify(payload)
       })
       if (res.ok) {
-        const vm = await res.json()
         if (editing) {
+          const vm = await res.json()
           setVms(prev => prev.map(v => v.name === editing.name ? vm : v))
+          setOpen(false)
+          setEditing(null)
+          setMessage(`VM ${vmName} updated`)
         } else {
-          setVms(prev => [...prev, vm])
+          // Creation runs as a background job
+          const started = await res.json()
+          setOpen(false)
+          setMessage(`Creating VM ${vmName}...`)
+          const job = await waitForJob<VMData>(started.id)
+          const vm = job.result
+          if (vm) setVms(prev => [...prev.filter(v => v.name !== vm.name), vm])
+          setMessage(`VM ${vmName} created`)
         }
-        setOpen(false)
-        setEditing(null)
-        setMessage(`VM ${vmName} ${editing ? "updated" : "created"}`)
       } else {
         const data = await res.json().catch(() => null)
         setError(data?.detail || "Error saving")
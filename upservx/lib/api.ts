@@ -14,3 +14,64 @@ export function wsUrl(path: string): string {
   }
   return `ws://localhost:8000${path}`
 }
+
+export interface Job<T = unknown> {
+  id: string
+  kind: string
+  description: string
+  status: "queued" | "running" | "succeeded" | "failed" | "cancelled"
+  progress: number | null
+  message: string
+  log: string[]
+  log_total: number
+  result: T | null
+  error: string | null
+}
+
+// Follow a background job until it has finished. onUpdate receives the job
+// state on every change with the complete log collected so far. Resolves
+// with the finished job and rejects if the job failed or was cancelled.
+export async function waitForJob<T = unknown>(
+  id: string,
+  onUpdate?: (job: Job<T>) => void,
+): Promise<Job<T>> {
+  // Assigned from apply(), declared this way so TypeScript does not narrow it
+  let job = null as Job<T> | null
+  const log: string[] = []
+  const apply = (state: Job<T>) => {
+    log.push(...state.log)
+    job = { ...state, log: [...log] }
+    onUpdate?.(job)
+  }
+  try {
+    const res = await fetch(apiUrl(`/jobs/${id}/stream`))
+    if (res.ok && res.body) {
+      const reader = res.body.getReader()
+      const decoder = new TextDecoder()
+      let buffer = ""
+      while (true) {
+        const { done, value } = await reader.read()
+        if (done) break
+        buffer += decoder.decode(value, { stream: true })
+        const lines = buffer.split("\n")
+        buffer = lines.pop() ?? ""
+        for (const line of lines) {
+          if (line.trim()) apply(JSON.parse(line))
+        }
+      }
+    }
+  } catch (e) {
+    console.error(e)
+  }
+  // Poll if the stream ended before the job did
+  while (!job || !["succeeded", "failed", "cancelled"].includes(job.status)) {
+    if (job) await new Promise((r) => setTimeout(r, 1000))
+    const res = await fetch(apiUrl(`/jobs/${id}?log_since=${job ? job.log_total : 0}`))
+    if (!res.ok) throw new Error("job not found")
+    apply(await res.json())
+  }
+  if (job.status !== "succeeded") {
+    throw new Error(job.error || `Job ${job.status}`)
+  }
+  return job
+}